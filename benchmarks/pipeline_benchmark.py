@@ -0,0 +1,259 @@
+"""Throughput and latency benchmark of a complete ripflow pipeline.
+
+Every configuration of the sweep starts a `Ripflow` server with a synthetic
+source and a pass-through analyzer, subscribes to its output and reports one
+JSON object per line with the sustained throughput, the end-to-end latency
+percentiles and the CPU usage and resident memory of every process.
+
+Example::
+
+    python benchmarks/pipeline_benchmark.py --rate 1000 --shape 2048 \\
+        --workers 1 2 4 --serializers json binary --transports zmq shm \\
+        --output results.jsonl
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import zmq
+
+from ripflow import Ripflow
+from ripflow.analyzers import BaseAnalyzer
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.connectors.source import SyntheticSourceConnector
+from ripflow.core import SharedMemoryFactory, ZMQFactory
+from ripflow.serializers import (
+    BinarySerializer,
+    CompressedSerializer,
+    JsonSerializer,
+    Serializer,
+)
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+class PassThroughAnalyzer(BaseAnalyzer):
+    """Forward the data, optionally after spinning for `load` seconds."""
+
+    def __init__(self, load: float = 0.0) -> None:
+        self.load = load
+
+    @property
+    def n_outputs(self) -> int:
+        return 1
+
+    def run(self, data: Dict[str, Any]) -> List[Any]:
+        if self.load > 0:
+            end = time.perf_counter() + self.load
+            while time.perf_counter() < end:
+                pass
+        return [data]
+
+
+def make_serializer(name: str) -> Serializer:
+    if name == "json":
+        return JsonSerializer()
+    if name == "binary":
+        return BinarySerializer()
+    if name == "compressed":
+        return CompressedSerializer(BinarySerializer(), filter="shuffle+delta")
+    raise ValueError(f"Unknown serializer {name!r}")
+
+
+def make_comms_factory(name: str) -> ZMQFactory:
+    if name == "zmq":
+        return ZMQFactory()
+    if name == "zero_copy":
+        return ZMQFactory(zero_copy=True)
+    if name == "shm":
+        return SharedMemoryFactory()
+    raise ValueError(f"Unknown transport {name!r}")
+
+
+def process_stats(pid: int) -> Tuple[float, int]:
+    """CPU time in seconds and resident memory in bytes of a process."""
+    with open(f"/proc/{pid}/stat") as f:
+        # The command name may contain spaces, the fields follow the last ")"
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    with open(f"/proc/{pid}/statm") as f:
+        rss = int(f.read().split()[1]) * PAGE_SIZE
+    return cpu, rss
+
+
+def children(server: Ripflow) -> Dict[str, Any]:
+    processes = {"producer": server.producer}
+    processes.update({f"worker_{w.worker_id}": w for w in server.workers})
+    processes.update({f"sender_{s.idx}": s for s in server.senders})
+    return processes
+
+
+def sample(server: Ripflow) -> Dict[str, Tuple[float, int]]:
+    stats = {}
+    for name, child in children(server).items():
+        if child.is_alive():
+            try:
+                stats[name] = process_stats(child.process.pid)
+            except FileNotFoundError:
+                pass
+    return stats
+
+
+def run_config(args: argparse.Namespace, config: Dict[str, Any]) -> Dict[str, Any]:
+    serializer = make_serializer(config["serializer"])
+    log_file = os.path.join(args.log_dir, "benchmark.log")
+    server = Ripflow(
+        source_connector=SyntheticSourceConnector(
+            rate=args.rate,
+            shape=tuple(args.shape),
+            dtype=args.dtype,
+            burst=args.burst,
+            jitter=args.jitter,
+            seed=0,
+        ),
+        sink_connector=ZMQSinkConnector(port=args.port, serializer=serializer),
+        analyzer=PassThroughAnalyzer(args.load),
+        n_workers=config["n_workers"],
+        log_file_path=log_file,
+        log_level="WARNING",
+        comms_factory=make_comms_factory(config["transport"]),
+    )
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.SUBSCRIBE, b"")
+    socket.setsockopt(zmq.RCVHWM, 0)
+    socket.connect(f"tcp://127.0.0.1:{args.port}")
+    # Messages are decoded after the measurement, so that the subscriber
+    # does not become the bottleneck
+    messages: List[Tuple[float, bytes]] = []
+    try:
+        server.event_loop()
+        # Let the pipeline fill up before measuring
+        warmup_end = time.monotonic() + args.warmup
+        while time.monotonic() < warmup_end:
+            if socket.poll(100):
+                socket.recv()
+        before = sample(server)
+        start = time.monotonic()
+        end = start + args.duration
+        while time.monotonic() < end:
+            if not socket.poll(max(end - time.monotonic(), 0) * 1e3):
+                continue
+            message = socket.recv()
+            messages.append((time.time(), message))
+        elapsed = time.monotonic() - start
+        after = sample(server)
+    finally:
+        server.stop()
+        socket.close(linger=0)
+        context.term()
+        # Ripflow adds a handler per instance, do not keep the files open
+        for handler in list(server.logger.handlers):
+            server.logger.removeHandler(handler)
+            handler.close()
+
+    latencies = [
+        t_received - serializer.deserialize(message)["timestamp"]
+        for t_received, message in messages
+    ]
+    received = len(messages)
+    processes = {
+        name: {
+            "cpu": (after[name][0] - before[name][0]) / elapsed,
+            "rss": after[name][1],
+        }
+        for name in after
+        if name in before
+    }
+    result = dict(config)
+    result.update(
+        rate=args.rate,
+        shape=args.shape,
+        dtype=args.dtype,
+        burst=args.burst,
+        jitter=args.jitter,
+        load=args.load,
+        duration=elapsed,
+        received=received,
+        throughput=received / elapsed,
+        processes=processes,
+    )
+    if latencies:
+        p50, p99 = np.percentile(latencies, [50, 99])
+        result.update(
+            latency_p50=float(p50),
+            latency_p99=float(p99),
+            latency_max=float(np.max(latencies)),
+        )
+    return result
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rate", type=float, default=100.0, help="events per second")
+    parser.add_argument("--shape", type=int, nargs="+", default=[2048])
+    parser.add_argument("--dtype", default="float32")
+    parser.add_argument("--burst", type=int, default=1, help="events per burst")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument(
+        "--load", type=float, default=0.0, help="analysis time per event in seconds"
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument(
+        "--serializers",
+        nargs="+",
+        default=["json", "binary"],
+        choices=["json", "binary", "compressed"],
+    )
+    parser.add_argument(
+        "--transports",
+        nargs="+",
+        default=["zmq"],
+        choices=["zmq", "zero_copy", "shm"],
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds")
+    parser.add_argument("--port", type=int, default=5600)
+    parser.add_argument("--output", help="JSON lines file, default stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    output = open(args.output, "a") if args.output else sys.stdout
+    environment = {
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.time(),
+    }
+    with tempfile.TemporaryDirectory() as log_dir:
+        args.log_dir = log_dir
+        sweep = itertools.product(args.workers, args.serializers, args.transports)
+        for n_workers, serializer, transport in sweep:
+            config = {
+                "n_workers": n_workers,
+                "serializer": serializer,
+                "transport": transport,
+            }
+            logging.info(f"Running {config}")
+            result = run_config(args, config)
+            result["environment"] = environment
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
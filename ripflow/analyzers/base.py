@@ -18,10 +18,55 @@ class BaseAnalyzer(ABC):
     def logger(self, logger):
         self._logger = logger
 
+    def setup(self, worker_id: int) -> None:
+        """Prepare the analyzer in a worker process.
+
+        Called once in every worker process before it receives the first
+        event, and again in the new process when a worker is restarted.
+        Override it to build expensive state, e.g. FFT plans or lookup
+        tables, per process instead of in `__init__` in the main process or
+        on the first event. Large read-only data that all workers share is
+        better built once in `__init__` and wrapped in a `SharedArray`.
+
+        Parameters
+        ----------
+        worker_id : int
+            Id of the worker process
+        """
+        pass
+
+    def teardown(self) -> None:
+        """Release the resources acquired in `setup`.
+
+        Called once when a worker process exits on its own, e.g. when it
+        is retired, drained or recycled. Not called if the process is
+        terminated or killed.
+        """
+        pass
+
     @abstractmethod
     def run(self, data) -> List[Any]:
         pass
 
+    def run_batch(self, events: List[Any]) -> List[List[Any]]:
+        """Analyze a batch of events at once.
+
+        Called instead of `run` when the pipeline is configured with a
+        `batch_size` larger than one. Override it to vectorize the analysis
+        across events. The default implementation calls `run` per event.
+
+        Parameters
+        ----------
+        events : list
+            Incoming events in arrival order
+
+        Returns
+        -------
+        list
+            One list of outputs per event, as returned by `run`
+        """
+        return [self.run(data) for data in events]
+
     @abstractproperty
     def n_outputs(self) -> Any:
         pass
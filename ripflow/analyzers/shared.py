@@ -0,0 +1,77 @@
+from multiprocessing import shared_memory
+from typing import Optional
+import os
+import numpy as np
+
+
+class SharedArray(object):
+    """
+    Read-only NumPy array in shared memory, used by all worker processes
+
+    Analyzers that need large precomputed data, e.g. calibration tables,
+    background images or masks, build it once in the main process and wrap
+    it in a SharedArray. All workers map the same memory instead of holding
+    a copy each, also if the analyzer is pickled, and cannot modify it by
+    accident. The process that created the array frees the memory with
+    `close`, e.g. after the pipeline was stopped.
+
+    Parameters
+    ----------
+    array : numpy.ndarray
+        Data that is copied into a new shared memory segment
+
+    Examples
+    --------
+    >>> class Corrector(BaseAnalyzer):
+    ...     def __init__(self, path):
+    ...         super().__init__()
+    ...         self.background = SharedArray(np.load(path))
+    ...
+    ...     def run(self, data):
+    ...         return [data["data"] - self.background.array]
+    """
+
+    def __init__(self, array: np.ndarray) -> None:
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype
+        # Segments cannot be empty
+        self._shm: Optional[shared_memory.SharedMemory] = shared_memory.SharedMemory(
+            create=True, size=max(array.nbytes, 1)
+        )
+        self._owner: Optional[int] = os.getpid()
+        np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)[...] = array
+        self._view: Optional[np.ndarray] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_owner"] = None
+        state["_view"] = None
+        return state
+
+    @property
+    def array(self) -> np.ndarray:
+        """The shared data, mapped into the current process."""
+        if self._view is None:
+            if self._shm is None:
+                raise RuntimeError("Shared array is closed")
+            view: np.ndarray = np.ndarray(
+                self.shape, dtype=self.dtype, buffer=self._shm.buf
+            )
+            view.flags.writeable = False
+            self._view = view
+        return self._view
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        self._view = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views handed out in this process still reference the segment,
+            # the mapping is released together with the last of them
+            pass
+        if os.getpid() == self._owner:
+            self._shm.unlink()
+        self._shm = None
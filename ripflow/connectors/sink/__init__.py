@@ -1,2 +1,3 @@
 from .base import *
 from .zmq_sink_connector import *
+from .avro_file_sink_connector import *
@@ -0,0 +1,130 @@
+import os
+import time
+import zlib
+import avro.io
+from .base import SinkConnector
+from ...serializers import AvroSerializer
+from typing import IO, List, Optional
+
+__all__ = ["AvroFileSinkConnector"]
+
+
+class AvroFileSinkConnector(SinkConnector):
+    """Sink connector that writes Avro object container files
+
+    Messages serialized by an `AvroSerializer` are already Avro binary
+    datums, they are collected into blocks and written to the file without
+    decoding them again. The files can be read with
+    ``avro.datafile.DataFileReader`` or any other Avro implementation.
+
+    Parameters
+    ----------
+    path : str
+        Path of the output file. ``{idx}`` is replaced with the index of the
+        output, one file is written per output. Analyzers with more than one
+        output need ``{idx}`` in the path.
+    serializer : AvroSerializer
+        Serializer whose schema is stored in the file header
+    codec : str, default "null"
+        Compression of the blocks, "null" or "deflate"
+    block_records : int, default 1000
+        A block is written once it holds this many records
+    block_bytes : int, default 1 MiB
+        A block is written once it holds this many bytes
+    flush_interval : float, default 1.0
+        Maximum time in seconds a record is held back before its block is
+        written, checked by the sender at least every 100 ms
+    """
+
+    magic = b"Obj\x01"
+    codecs = ("null", "deflate")
+
+    def __init__(
+        self,
+        path: str,
+        serializer: AvroSerializer,
+        codec: str = "null",
+        block_records: int = 1000,
+        block_bytes: int = 2**20,
+        flush_interval: float = 1.0,
+    ) -> None:
+        super().__init__(serializer)
+        if codec not in self.codecs:
+            raise ValueError(f"Unsupported codec {codec!r}, use one of {self.codecs}")
+        self.path = path
+        self.codec = codec
+        self.block_records = block_records
+        self.block_bytes = block_bytes
+        self.flush_interval = flush_interval
+        self.file: Optional[IO[bytes]] = None
+
+    def check_outputs(self, n_outputs: int):
+        if n_outputs > 1 and self.path.format(idx=0) == self.path.format(idx=1):
+            raise ValueError(
+                f"The path {self.path!r} of an analyzer with {n_outputs} "
+                "outputs needs an {idx} field"
+            )
+
+    def connect_subprocess(self, idx: int):
+        """Open the file of output `idx` and write its header."""
+        assert isinstance(self.serializer, AvroSerializer)
+        self.filename = self.path.format(idx=idx)
+        file = self.file = open(self.filename, "wb")
+        self.sync_marker = os.urandom(16)
+        self._block: List[bytes] = []
+        self._block_size = 0
+        self._block_start = time.monotonic()
+        encoder = avro.io.BinaryEncoder(file)
+        encoder.write(self.magic)
+        metadata = {
+            "avro.schema": self.serializer.schema_str.encode("utf-8"),
+            "avro.codec": self.codec.encode("utf-8"),
+        }
+        encoder.write_long(len(metadata))
+        for key, value in metadata.items():
+            encoder.write_utf8(key)
+            encoder.write_long(len(value))
+            encoder.write(value)
+        encoder.write_long(0)
+        encoder.write(self.sync_marker)
+        file.flush()
+        self._logger.info(f"Sender {idx} writing Avro file {self.filename}")
+
+    def send(self, message: bytes):
+        if not self._block:
+            self._block_start = time.monotonic()
+        self._block.append(message)
+        self._block_size += len(message)
+        if (
+            len(self._block) >= self.block_records
+            or self._block_size >= self.block_bytes
+            or time.monotonic() - self._block_start >= self.flush_interval
+        ):
+            self.flush()
+
+    def poll(self):
+        if self._block and time.monotonic() - self._block_start >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the pending records as one block."""
+        if self.file is None or not self._block:
+            return
+        data = b"".join(self._block)
+        if self.codec == "deflate":
+            compressor = zlib.compressobj(wbits=-15)
+            data = compressor.compress(data) + compressor.flush()
+        encoder = avro.io.BinaryEncoder(self.file)
+        encoder.write_long(len(self._block))
+        encoder.write_long(len(data))
+        encoder.write(data)
+        encoder.write(self.sync_marker)
+        self.file.flush()
+        self._block = []
+        self._block_size = 0
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
@@ -1,3 +1,4 @@
+import copy
 import pprint
 import logging
 from typing import Optional
@@ -19,22 +20,55 @@ class SinkConnector(object):
     def logger(self, logger):
         self._logger = logger
 
+    @property
+    def multiplexed(self) -> bool:
+        """Whether all outputs share one connection in a single sender process."""
+        return False
+
     def initialize(self):
         raise NotImplementedError
 
+    def check_outputs(self, n_outputs: int):
+        """Raise a ValueError if the connector cannot send `n_outputs` outputs."""
+        pass
+
     def connect_subprocess(self, idx: int):
         raise NotImplementedError
 
+    def for_output(self, idx: int) -> "SinkConnector":
+        """Return the connector that sends the output `idx` of the analyzer.
+
+        A sender process that serves several outputs calls
+        `connect_subprocess` on one connector per output. By default these
+        are shallow copies of the configured connector.
+        """
+        return copy.copy(self)
+
+    def settle(self):
+        """Wait until the connection can deliver, called once all outputs of
+        a sender are connected and before the sender reports that it is ready.
+        """
+        pass
+
     def send(self, data: bytes):
         raise NotImplementedError
 
+    def poll(self):
+        """Called by the sender after every wait for messages, also if none
+        arrived, at least every 100 ms."""
+        pass
+
+    def close(self):
+        """Flush and release the connection, called when the sender exits."""
+        pass
+
 
 class STDOUTSinkConnector(SinkConnector):
     def __init__(self, serializer: Serializer):
         super().__init__(serializer)
         self.printer = pprint.PrettyPrinter()
 
-    def connect_subprocess(self):
+    def connect_subprocess(self, idx: int):
         pass
 
     def send(self, data):
@@ -1,7 +1,8 @@
+import time
 import zmq
 from .base import SinkConnector
 from ...serializers import Serializer
-from typing import Optional
+from typing import Any, Dict, Optional, Sequence
 
 
 class ZMQSinkConnector(SinkConnector):
@@ -14,13 +15,50 @@ class ZMQSinkConnector(SinkConnector):
         utilize port+n to open their respective sockets
     serializer : Serializer
         Serialization object for outgoing data
+    multiplex : bool, default False
+        If True, all outputs are published on a single PUB socket bound to
+        `port`, each message prefixed with the topic of its output.
+        Subscribers select outputs with ZMQ prefix subscriptions, messages
+        are only sent to clients that subscribed to them. All outputs are
+        then served by a single sender process.
+    topics : sequence of str, optional
+        Topic of each output. If given, every message is sent as a two frame
+        multipart message ``[topic, data]``, also without `multiplex`.
+        Defaults to the output index followed by a null byte in multiplex
+        mode, e.g. ``b"1\\0"``, so that the subscription to one output does
+        not also match output 10. ZMQ matches subscriptions by prefix, custom
+        topics should therefore not be prefixes of each other.
+    subscriber_grace : float, default 0.2
+        Time in seconds the sender waits after binding its sockets before it
+        reports that it is ready, once for all outputs it serves. Subscribers
+        that tried to connect before the socket was bound retry after their
+        reconnect interval, 100 ms by default, and would miss the first
+        messages otherwise.
     """
 
-    def __init__(self, port: int, serializer: Serializer) -> None:
+    def __init__(
+        self,
+        port: int,
+        serializer: Serializer,
+        multiplex: bool = False,
+        topics: Optional[Sequence[str]] = None,
+        subscriber_grace: float = 0.2,
+    ) -> None:
+        super().__init__(serializer)
         self.port = port
-        self.serializer = serializer
+        self.multiplex = multiplex
+        self.topics = topics
+        self.subscriber_grace = subscriber_grace
+        self.topic: Optional[bytes] = None
         self.socket: Optional[zmq.Socket] = None
         self.context: Optional[zmq.Context] = None
+        # Shared by the copies of the connector in a sender process: the
+        # socket of a multiplexed connector and the time of the last bind
+        self._shared: Dict[str, Any] = {}
+
+    @property
+    def multiplexed(self) -> bool:
+        return self.multiplex
 
     def connect_subprocess(self, idx: int):
         """Connect subprocess to sink connector
@@ -30,12 +68,31 @@ class ZMQSinkConnector(SinkConnector):
         idx : int
             Identifier of sender subprocess
         """
+        if self.topics is not None:
+            self.topic = self.topics[idx].encode()
+        elif self.multiplex:
+            self.topic = b"%d\0" % idx
+        if self.multiplex and self._shared:
+            self.context = self._shared["context"]
+            self.socket = self._shared["socket"]
+            return
+        port = self.port if self.multiplex else self.port + idx
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PUB)
-        self.socket.bind(f"tcp://*:{self.port+idx}")
-        self._logger.info(
-            f"Sender {idx} connected to ZMQ pub socket on port {self.port+idx}"
+        self.socket.bind(f"tcp://*:{port}")
+        self._shared.update(
+            context=self.context, socket=self.socket, bound=time.monotonic()
         )
+        self._logger.info(f"Sender {idx} connected to ZMQ pub socket on port {port}")
+
+    def settle(self):
+        """Give subscribers time to connect to the sockets bound last."""
+        bound = self._shared.pop("bound", None)
+        if bound is not None:
+            time.sleep(max(bound + self.subscriber_grace - time.monotonic(), 0))
 
     def send(self, message):
-        self.socket.send(message)
+        if self.topic is None:
+            self.socket.send(message)
+        else:
+            self.socket.send_multipart([self.topic, message])
@@ -1 +1,3 @@
 from .base import *
+from .event_builder import *
+from .synthetic_source_connector import *
@@ -0,0 +1,148 @@
+from .base import SourceConnector
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import time
+
+
+class EventBuilderSourceConnector(SourceConnector):
+    """Source connector that merges the records of several channels into events.
+
+    The wrapped connector may deliver the records of the configured channels
+    split across several calls of `get_data`. Records that belong to the same
+    event, identified by `event_field`, are collected until all channels are
+    present and passed on as a single list ordered like `channels`.
+
+    Timeouts are checked whenever the wrapped connector returns data.
+
+    Parameters
+    ----------
+    source_connector : SourceConnector
+        Connector that delivers the records of the individual channels
+    channels : list
+        Names of the channels that make up a complete event
+    timeout : float, default 1.0
+        Time in seconds to wait for the missing channels of an event
+    incomplete : str, default "drop"
+        Policy for events that are still incomplete after `timeout`. 'drop'
+        discards them, 'emit' passes them on with None for missing channels.
+    channel_field : str, default "name"
+        Record field that holds the channel name
+    event_field : str, default "macropulse"
+        Record field that identifies the event
+    max_pending : int, default 100
+        Maximum number of incomplete events. If exceeded, the oldest event is
+        handled according to `incomplete` right away.
+
+    Attributes
+    ----------
+    n_incomplete : int
+        Number of events that timed out before they were complete
+    n_late : int
+        Number of records that arrived after their event was finished
+    n_invalid : int
+        Number of records without `event_field`, which are skipped
+    """
+
+    def __init__(
+        self,
+        source_connector: SourceConnector,
+        channels: List[str],
+        timeout: float = 1.0,
+        incomplete: str = "drop",
+        channel_field: str = "name",
+        event_field: str = "macropulse",
+        max_pending: int = 100,
+    ) -> None:
+        if incomplete not in ("drop", "emit"):
+            raise ValueError(f"Invalid incomplete event policy: {incomplete}")
+        super().__init__()
+        self.source_connector = source_connector
+        self.channels = list(channels)
+        self.timeout = timeout
+        self.incomplete = incomplete
+        self.channel_field = channel_field
+        self.event_field = event_field
+        self.max_pending = max_pending
+        self._index: Dict[Any, int] = {
+            channel: i for i, channel in enumerate(self.channels)
+        }
+        self._pending: "OrderedDict[Any, Tuple[float, List[Optional[Dict]]]]" = (
+            OrderedDict()
+        )
+        self._finished: "OrderedDict[Any, None]" = OrderedDict()
+        self._ready: Deque[List[Optional[Dict]]] = deque()
+        self.n_incomplete = 0
+        self.n_late = 0
+        self.n_invalid = 0
+
+    @SourceConnector.logger.setter  # type: ignore
+    def logger(self, logger):
+        self._logger = logger
+        self.source_connector.logger = logger
+
+    def connect(self):
+        self.source_connector.connect()
+
+    def get_data(self) -> List[Optional[Dict]]:
+        """Block until the next event is built.
+
+        Returns
+        -------
+        list
+            Records of the event, one per channel in the order of `channels`
+        """
+        while not self._ready:
+            records = self.source_connector.get_data()
+            if isinstance(records, dict):
+                records = [records]
+            now = time.monotonic()
+            for record in records:
+                self._add(record, now)
+            self._expire(now)
+        return self._ready.popleft()
+
+    def _add(self, record: Dict, now: float) -> None:
+        slot = self._index.get(record.get(self.channel_field))
+        if slot is None:
+            self.logger.debug(
+                f"Ignoring record of channel {record.get(self.channel_field)}"
+            )
+            return
+        if self.event_field not in record:
+            self.n_invalid += 1
+            self.logger.debug(
+                f"Ignoring record of channel {record.get(self.channel_field)} "
+                f"without {self.event_field}"
+            )
+            return
+        key = record[self.event_field]
+        if key in self._finished:
+            self.n_late += 1
+            return
+        if key not in self._pending:
+            self._pending[key] = (now, [None] * len(self.channels))
+        records = self._pending[key][1]
+        records[slot] = record
+        if all(r is not None for r in records):
+            del self._pending[key]
+            self._finish(key)
+            self._ready.append(records)
+
+    def _expire(self, now: float) -> None:
+        while self._pending:
+            key, (t_first, records) = next(iter(self._pending.items()))
+            if now - t_first < self.timeout and len(self._pending) <= self.max_pending:
+                break
+            del self._pending[key]
+            self._finish(key)
+            self.n_incomplete += 1
+            if self.incomplete == "emit":
+                self._ready.append(records)
+            else:
+                self.logger.debug(f"Dropping incomplete event {key}")
+
+    def _finish(self, key: Any) -> None:
+        """Remember finished events to recognize late records."""
+        self._finished[key] = None
+        while len(self._finished) > 2 * self.max_pending:
+            self._finished.popitem(last=False)
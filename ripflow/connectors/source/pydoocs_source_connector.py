@@ -6,6 +6,8 @@ except ImportError:
     raise ImportError(
         "pydoocs is not installed. Please install pydoocs or add it to your PYTHONPATH"
     )
+from collections import deque
+from typing import Deque, Optional
 import time
 import numpy as np
 
@@ -20,31 +22,50 @@ class PydoocsSourceConnector(SourceConnector):
     timeout: float
         Time in seconds without data after which the connection is closed.
         Infinit if -1.
+    wait: float
+        Longest time in seconds between two polls of the DOOCS channels.
+    min_wait: float
+        Shortest time in seconds between two polls. The interval between
+        polls starts at min_wait and doubles up to wait while no data arrives.
 
+    Notes
+    -----
+    pydoocs does not expose its sockets, so the connector has to poll. To keep
+    both the added latency and the idle CPU load low, it learns the shortest
+    recent interval between events, sleeps until shortly before the next event
+    is due and then polls with an exponential backoff.
     """
 
     def __init__(
-        self, source_properties: list, timeout: float = 2, wait: float = 1e-3
+        self,
+        source_properties: list,
+        timeout: float = 2,
+        wait: float = 1e-3,
+        min_wait: float = 1e-5,
     ) -> None:
         """Construct PydoocsSourceConnector object."""
+        super().__init__()
         self.source_properties = source_properties
         self.cycles = int(1e6)
         self.connected = False
         self.timeout = timeout
         self.wait = wait
+        self.min_wait = min_wait
+        self._last_arrival: Optional[float] = None
+        self._intervals: Deque[float] = deque(maxlen=16)
 
     def connect(self) -> None:
         """Connect DOOCS zmq sockets."""
         pd.connect(self.source_properties, cycles=self.cycles)
         self.connected = True
         time.sleep(0.1)
-        self._logger.info(f"Connected to DOOCS ZMQ channels {self.source_properties}")
+        self.logger.info(f"Connected to DOOCS ZMQ channels {self.source_properties}")
 
     def disconnect(self) -> None:
         """Disconnect sockets."""
         pd.disconnect()
         self.connected = False
-        self._logger.info(f"Disconnected from DOOCS ZMQ channels")
+        self.logger.info(f"Disconnected from DOOCS ZMQ channels")
 
     def get_data(self):
         """Read incoming data.
@@ -61,22 +82,41 @@ class PydoocsSourceConnector(SourceConnector):
         TimeoutError
             No data within time specified in timeout
         """
-        out = None
-        t0 = time.time()
-        dt = 0
+        t0 = time.monotonic()
         if self.timeout == -1:
             timeout = np.inf
         else:
             timeout = self.timeout
-        while (not out) and (dt < timeout):
+        delay = self.min_wait
+        while True:
             out = pd.getdata()
-            dt = time.time() - t0
-            time.sleep(self.wait)
-        if dt > timeout:
-            # Catch the TimeoutError and log it
-            try:
-                raise TimeoutError("Source connection timed out")
-            except TimeoutError as e:
-                self._logger.exception("An error occurred: %s", e)
-                raise
-        return out
+            now = time.monotonic()
+            if out:
+                self._record_arrival(now)
+                return out
+            if now - t0 > timeout:
+                # Catch the TimeoutError and log it
+                try:
+                    raise TimeoutError("Source connection timed out")
+                except TimeoutError as e:
+                    self.logger.exception("An error occurred: %s", e)
+                    raise
+            due = self._next_due()
+            if due is not None and now < due - self.wait:
+                # Next event is not due yet, sleep until shortly before it
+                time.sleep(min(due - self.wait, t0 + timeout) - now)
+                delay = self.min_wait
+            else:
+                time.sleep(delay)
+                delay = min(2 * delay, self.wait)
+
+    def _record_arrival(self, now: float) -> None:
+        if self._last_arrival is not None:
+            self._intervals.append(now - self._last_arrival)
+        self._last_arrival = now
+
+    def _next_due(self) -> Optional[float]:
+        """Earliest time at which the next event is expected."""
+        if self._last_arrival is None or not self._intervals:
+            return None
+        return self._last_arrival + 0.9 * min(self._intervals)
@@ -0,0 +1,135 @@
+from .base import SourceConnector
+from typing import Any, Dict, List, Optional, Tuple, Union
+import time
+import numpy as np
+
+
+class SyntheticSourceConnector(SourceConnector):
+    """Source connector that generates events at a configurable rate.
+
+    Events are emitted according to an absolute schedule, so neither the
+    time spent downstream nor inaccurate sleeps add up to a drift of the
+    rate. The connector sleeps until shortly before an event is due and
+    spins for the remaining time. If it falls behind, e.g. because the
+    pipeline blocks, it emits the overdue events right away to catch up.
+
+    The payloads are generated once in `connect` and reused in turn, so the
+    connector itself costs next to nothing per event. Arrays are read-only
+    and must not be modified downstream.
+
+    Parameters
+    ----------
+    rate : float
+        Average number of events per second
+    shape : tuple of int, default ()
+        Shape of the data array of an event, () yields scalars
+    dtype : str, default "float64"
+        Data type of the generated values
+    burst : int, default 1
+        Number of events that are emitted back-to-back. Bursts are spaced
+        so that the average rate is preserved.
+    jitter : float, default 0.0
+        Standard deviation in seconds of the random offset of each event
+        (or burst) from its schedule. Offsets do not accumulate.
+    n_buffers : int, default 8
+        Number of different payloads that are cycled through
+    n_events : int, optional
+        Number of events after which the source stops delivering data.
+        By default events are generated indefinitely.
+    name : str, default "synthetic"
+        Channel name of the events
+    seed : int, optional
+        Seed of the random payloads and jitter
+    spin : float, default 2e-4
+        Time in seconds before an event is due from which on the connector
+        spins instead of sleeping
+
+    Attributes
+    ----------
+    lag : float
+        Time in seconds by which the last event was emitted too late
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        shape: Union[int, Tuple[int, ...]] = (),
+        dtype: str = "float64",
+        burst: int = 1,
+        jitter: float = 0.0,
+        n_buffers: int = 8,
+        n_events: Optional[int] = None,
+        name: str = "synthetic",
+        seed: Optional[int] = None,
+        spin: float = 2e-4,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        super().__init__()
+        self.rate = rate
+        self.shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.burst = burst
+        self.jitter = jitter
+        self.n_buffers = n_buffers
+        self.n_events = n_events
+        self.name = name
+        self.seed = seed
+        self.spin = spin
+        self.type = {0: "FLOAT", 1: "A_FLOAT", 2: "IMAGE"}.get(len(self.shape), "ARRAY")
+        self.lag = 0.0
+
+    def connect(self):
+        rng = np.random.default_rng(self.seed)
+        self._payloads: List[Any] = []
+        for _ in range(self.n_buffers):
+            if np.issubdtype(self.dtype, np.integer):
+                info = np.iinfo(self.dtype)
+                values = rng.integers(
+                    info.min, info.max, self.shape, dtype=self.dtype, endpoint=True
+                )
+            else:
+                values = rng.standard_normal(self.shape).astype(self.dtype)
+            if self.shape:
+                values.flags.writeable = False
+                self._payloads.append(values)
+            else:
+                self._payloads.append(values.item())
+        self._rng = rng
+        self._n = 0
+        self._offset = 0.0
+        self._start = time.monotonic()
+        self.logger.info(
+            f"Synthetic source emitting {self.shape} {self.dtype} at {self.rate} Hz"
+        )
+
+    def get_data(self) -> Dict[str, Any]:
+        while self.n_events is not None and self._n >= self.n_events:
+            time.sleep(1)  # Nothing left to generate
+        if self._n % self.burst == 0 and self.jitter > 0:
+            self._offset = self._rng.normal(0, self.jitter)
+        due = self._start + self._n // self.burst * self.burst / self.rate
+        due += self._offset
+        self._wait(due)
+        n = self._n
+        self._n += 1
+        return {
+            "data": self._payloads[n % self.n_buffers],
+            "type": self.type,
+            "timestamp": time.time(),
+            "macropulse": n,
+            "miscellaneous": {},
+            "name": self.name,
+        }
+
+    def _wait(self, due: float) -> None:
+        """Return at time `due`, sleeping for as long as it is safe."""
+        now = time.monotonic()
+        if due - now > self.spin:
+            time.sleep(due - now - self.spin)
+        now = time.monotonic()
+        while now < due:
+            now = time.monotonic()
+        self.lag = now - due
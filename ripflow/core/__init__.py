@@ -1 +1,8 @@
 from .ripflow import Ripflow
+from .utils import CommsFactory, SharedMemoryFactory, ZMQFactory
+from .ordering import ReorderPolicy
+from .flow_control import BackpressurePolicy
+from .supervisor import AutoscalePolicy
+from .watchdog import WatchdogPolicy
+from .errors import DiskDeadLetterQueue, ErrorPolicy, ZMQDeadLetterQueue
+from .routing import RoutingPolicy
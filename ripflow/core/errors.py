@@ -0,0 +1,210 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, Optional, Tuple, Type
+import os
+import pickle
+import time
+import zmq
+
+# Event metadata, event data, stage that failed and the error
+DeadLetter = Tuple[Dict[str, Any], Any, str, str]
+
+
+class DeadLetterQueue(ABC):
+    """
+    Destination of the events a worker failed to process.
+
+    Every failing event is put with its metadata, the input of the analyzer,
+    the stage that failed ("analysis" or "serialize") and the error, so that
+    it can be inspected and replayed later. Queues are opened in each worker
+    process.
+    """
+
+    def open(self) -> None:
+        """Prepare the queue in the worker process."""
+
+    @abstractmethod
+    def put(self, meta: Dict[str, Any], data: Any, stage: str, error: str) -> None:
+        pass
+
+    def close(self) -> None:
+        """Release the resources of the queue in the worker process."""
+
+
+class DiskDeadLetterQueue(DeadLetterQueue):
+    """
+    Spool failing events to a directory, one pickle file per event.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the spool, created if it does not exist
+    max_events : int, default 1000
+        Number of events kept in the spool. The oldest events are removed
+        to make room for new ones.
+    """
+
+    def __init__(self, directory: str, max_events: int = 1000):
+        if max_events < 1:
+            raise ValueError("max_events must be at least 1")
+        self._directory = directory
+        self._max_events = max_events
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def max_events(self):
+        return self._max_events
+
+    def open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+    def put(self, meta: Dict[str, Any], data: Any, stage: str, error: str) -> None:
+        # Time first, so that names sort in the order events failed
+        name = f"{time.time_ns():020d}_{os.getpid()}.pkl"
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump((meta, data, stage, error), f)
+        # Workers share the spool, readers never see a partial file
+        os.replace(path + ".tmp", path)
+        files = self._files()
+        for old in files[: max(len(files) - self.max_events, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except FileNotFoundError:
+                # Removed by another worker at the same time
+                pass
+
+    def replay(self, remove: bool = True) -> Iterator[DeadLetter]:
+        """Yield the spooled events, oldest first.
+
+        Parameters
+        ----------
+        remove : bool, default True
+            Remove each event from the spool once it was yielded
+
+        Yields
+        ------
+        tuple
+            Metadata, data, failed stage and error of an event. The data can
+            be fed to a pipeline again, e.g. through ``TestSourceConnector``.
+        """
+        for name in self._files():
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "rb") as f:
+                    letter = pickle.load(f)
+            except FileNotFoundError:
+                continue
+            yield letter
+            if remove:
+                os.remove(path)
+
+    def __len__(self) -> int:
+        return len(self._files())
+
+    def _files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(f for f in os.listdir(self.directory) if f.endswith(".pkl"))
+
+
+class ZMQDeadLetterQueue(DeadLetterQueue):
+    """
+    Push failing events to a ZMQ socket.
+
+    The workers connect a PUSH socket to `address` and send each event as
+    a pickled tuple of metadata, data, failed stage and error, which can be
+    received with ``recv_pyobj`` from a bound PULL socket. Events are
+    discarded if `hwm` events are waiting to be received.
+
+    Parameters
+    ----------
+    address : str
+        Address the receiving socket is bound to
+    hwm : int, default 1000
+        High water mark of the socket
+    """
+
+    def __init__(self, address: str, hwm: int = 1000):
+        self._address = address
+        self._hwm = hwm
+        self._context: Optional[zmq.Context] = None
+        self._socket: Optional[zmq.Socket] = None
+
+    @property
+    def address(self):
+        return self._address
+
+    def open(self) -> None:
+        self._context = zmq.Context()
+        self._socket = self._context.socket(zmq.PUSH)
+        self._socket.setsockopt(zmq.SNDHWM, self._hwm)
+        self._socket.setsockopt(zmq.LINGER, 1000)
+        self._socket.connect(self.address)
+
+    def put(self, meta: Dict[str, Any], data: Any, stage: str, error: str) -> None:
+        if self._socket is None:
+            raise RuntimeError("Dead letter queue is not open")
+        try:
+            self._socket.send_pyobj((meta, data, stage, error), flags=zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        if self._context is not None:
+            self._context.term()
+            self._context = None
+
+
+class ErrorPolicy:
+    """
+    How a worker handles an event whose analysis or serialization fails.
+
+    The event is logged, counted and put into the dead letter queue, the
+    senders are told to skip it, and the worker continues with the next
+    event. The worker only exits, to be restarted by the supervisor, if the
+    error is fatal or too many events fail in a row.
+
+    Parameters
+    ----------
+    max_consecutive_errors : int, default 3
+        Number of events that fail in a row after which the worker exits
+    fatal : tuple of exception types, default (MemoryError, zmq.ZMQError)
+        Errors after which the worker exits immediately
+    dead_letter : DeadLetterQueue, optional
+        Where failing events are kept for later replay. By default they are
+        discarded.
+    """
+
+    def __init__(
+        self,
+        max_consecutive_errors: int = 3,
+        fatal: Tuple[Type[BaseException], ...] = (MemoryError, zmq.ZMQError),
+        dead_letter: Optional[DeadLetterQueue] = None,
+    ):
+        if max_consecutive_errors < 1:
+            raise ValueError("max_consecutive_errors must be at least 1")
+        self._max_consecutive_errors = max_consecutive_errors
+        self._fatal = fatal
+        self._dead_letter = dead_letter
+
+    @property
+    def max_consecutive_errors(self):
+        return self._max_consecutive_errors
+
+    @property
+    def fatal(self):
+        return self._fatal
+
+    @property
+    def dead_letter(self):
+        return self._dead_letter
+
+    def is_fatal(self, error: BaseException) -> bool:
+        """Whether the worker has to exit after `error`."""
+        return isinstance(error, self.fatal)
@@ -0,0 +1,263 @@
+from collections import deque
+from math import ceil
+from typing import Any, Callable, Deque, Dict, Optional
+import logging
+import threading
+import time
+import zmq
+
+# Socket queue length of hops whose receiving thread enforces the depth, the
+# sockets only buffer messages until the thread moves them to its queue
+DRAINED_SOCKET_DEPTH = 16
+
+# Markers an outbox holds back while the queue is full, the receiver gives
+# up on the gaps of markers beyond that after its reorder timeout
+MAX_PENDING_MARKERS = 10000
+
+
+class BackpressurePolicy:
+    """
+    Behaviour of a pipeline hop when the receiving processes fall behind.
+
+    Parameters
+    ----------
+    mode : str, default "block"
+        'block' - the sending process waits until there is room in the queue.
+        'drop_newest' - messages that do not fit into the queue are discarded.
+        'drop_oldest' - the receiving process discards the oldest queued
+        messages to make room for new ones.
+        'keep_latest' - only the most recent message is kept, same as
+        'drop_oldest' with a depth of 1.
+    depth : int, default 1000
+        Number of messages queued per connection
+    """
+
+    MODES = ("block", "drop_newest", "drop_oldest", "keep_latest")
+
+    def __init__(self, mode: str = "block", depth: int = 1000):
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid backpressure mode: {mode}")
+        if depth < 1:
+            raise ValueError("Queue depth must be at least 1")
+        self._mode = mode
+        self._depth = 1 if mode == "keep_latest" else depth
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def blocking(self) -> bool:
+        """Whether the sending side waits for room in the queue."""
+        return self._mode == "block"
+
+    @property
+    def drains(self) -> bool:
+        """Whether the receiving side drops the oldest queued messages."""
+        return self._mode in ("drop_oldest", "keep_latest")
+
+    def socket_options(self) -> Dict[int, Any]:
+        """ZMQ options that limit the queues of the hop's sockets."""
+        depth = DRAINED_SOCKET_DEPTH if self.drains else self._depth
+        return {zmq.SNDHWM: depth, zmq.RCVHWM: depth}
+
+
+class DropCounter(object):
+    """
+    Counts dropped events and reports them to the log at a limited rate.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        Logger to report drops to
+    name : str
+        Name of the process and hop in the log messages
+    interval : float, default 10
+        Minimum time in seconds between two log messages
+    """
+
+    def __init__(self, logger: logging.Logger, name: str, interval: float = 10.0):
+        self.logger = logger
+        self.name = name
+        self.interval = interval
+        self.total = 0
+        self._reported = 0
+        self._last_report = time.monotonic()
+
+    def count(self, n: int = 1) -> None:
+        self.total += n
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self.logger.warning(
+                f"{self.name} dropped {self.total - self._reported} events "
+                f"in the last {now - self._last_report:.0f} s ({self.total} in total)"
+            )
+            self._reported = self.total
+            self._last_report = now
+
+
+class Outbox(object):
+    """
+    Send side of a pipeline hop.
+
+    Markers, messages that tell the receiver about events that were dropped
+    on purpose, must not be dropped themselves. They are queued while there
+    is no room and sent by `flush`.
+
+    Parameters
+    ----------
+    policy : BackpressurePolicy
+        Policy of the hop
+    send : callable
+        Function that sends a message, called with the message and ZMQ flags
+    drops : DropCounter
+        Counter for messages that were dropped because the queue was full
+    marker : callable, optional
+        Returns the marker to send in place of a dropped message
+    """
+
+    def __init__(
+        self,
+        policy: BackpressurePolicy,
+        send: Callable[[Any, int], None],
+        drops: DropCounter,
+        marker: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.policy = policy
+        self._send = send
+        self.drops = drops
+        self.marker = marker
+        self.markers: Deque[Any] = deque(maxlen=MAX_PENDING_MARKERS)
+
+    def send(self, msg: Any) -> bool:
+        """Send a message, returns False if it was dropped."""
+        if self.policy.blocking:
+            self._send(msg, 0)
+            return True
+        try:
+            self._send(msg, zmq.NOBLOCK)
+            return True
+        except zmq.Again:
+            self.drops.count()
+            if self.marker is not None:
+                self.markers.append(self.marker(msg))
+            return False
+
+    def mark(self, marker: Any) -> None:
+        """Queue a marker, it is sent by the next `flush`."""
+        self.markers.append(marker)
+
+    def flush(self) -> int:
+        """Send queued markers while there is room, return how many were sent."""
+        flags = 0 if self.policy.blocking else zmq.NOBLOCK
+        n = 0
+        while self.markers:
+            try:
+                self._send(self.markers[0], flags)
+            except zmq.Again:
+                break
+            self.markers.popleft()
+            n += 1
+        return n
+
+
+class Inbox(object):
+    """
+    Receive side of a pipeline hop.
+
+    For the 'drop_oldest' and 'keep_latest' policies, a background thread
+    keeps moving messages from the socket into a bounded local queue and
+    discards the oldest ones on overflow, so that the queue holds the most
+    recent messages even while the process is busy. Discarded messages are
+    counted and passed to `on_drop` in the thread that calls `get`.
+
+    Parameters
+    ----------
+    policy : BackpressurePolicy
+        Policy of the hop
+    socket : zmq.Socket
+        Socket to receive from, not to be used by anyone else afterwards
+    recv : callable
+        Function that receives a message from the socket
+    drops : DropCounter
+        Counter for messages that were discarded
+    on_drop : callable, optional
+        Called with every discarded message
+    on_idle : callable, optional
+        Called with the socket when no message arrived while waiting, from
+        the thread that receives from it, e.g. to send on the socket
+    """
+
+    def __init__(
+        self,
+        policy: BackpressurePolicy,
+        socket: zmq.Socket,
+        recv: Callable[[zmq.Socket], Any],
+        drops: DropCounter,
+        on_drop: Optional[Callable[[Any], None]] = None,
+        on_idle: Optional[Callable[[zmq.Socket], None]] = None,
+    ):
+        self.policy = policy
+        self.socket = socket
+        self._recv = recv
+        self.drops = drops
+        self.on_drop = on_drop
+        self.on_idle = on_idle
+        self.queue: Deque[Any] = deque()
+        self._dropped: Deque[Any] = deque()
+        self._thread: Optional[threading.Thread] = None
+        if policy.drains:
+            self._ready = threading.Condition()
+            self._closed = threading.Event()
+            self._thread = threading.Thread(target=self._drain, daemon=True)
+            self._thread.start()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Return the next message, or None if none arrived within timeout.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Time in seconds to wait for a message, forever if None
+        """
+        if self._thread is None:
+            if not self.socket.poll(None if timeout is None else ceil(timeout * 1e3)):
+                if self.on_idle is not None:
+                    self.on_idle(self.socket)
+                return None
+            return self._recv(self.socket)
+        with self._ready:
+            if self._ready.wait_for(lambda: self.queue, timeout):
+                msg = self.queue.popleft()
+            else:
+                msg = None
+            dropped, self._dropped = self._dropped, deque()
+        if dropped:
+            self.drops.count(len(dropped))
+            if self.on_drop is not None:
+                for item in dropped:
+                    self.on_drop(item)
+        return msg
+
+    def close(self) -> None:
+        """Stop the background thread, the socket can be closed afterwards."""
+        if self._thread is not None:
+            self._closed.set()
+            self._thread.join()
+
+    def _drain(self) -> None:
+        while not self._closed.is_set():
+            if not self.socket.poll(100):
+                if self.on_idle is not None:
+                    self.on_idle(self.socket)
+                continue
+            msg = self._recv(self.socket)
+            with self._ready:
+                self.queue.append(msg)
+                if len(self.queue) > self.policy.depth:
+                    self._dropped.append(self.queue.popleft())
+                self._ready.notify()
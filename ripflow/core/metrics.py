@@ -0,0 +1,350 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+import zmq
+from .tracing import LatencyHistogram
+
+# Metric name and sorted label pairs
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+DESCRIPTIONS = {
+    "ripflow_events_received_total": (
+        "counter",
+        "Events received by a process, per hop",
+    ),
+    "ripflow_events_sent_total": ("counter", "Events sent by a process, per hop"),
+    "ripflow_events_dropped_total": (
+        "counter",
+        "Events discarded by a process, per reason",
+    ),
+    "ripflow_errors_total": ("counter", "Errors in the main routine of a process"),
+    "ripflow_event_errors_total": (
+        "counter",
+        "Events whose analysis or serialization failed, per stage",
+    ),
+    "ripflow_restarts_total": ("counter", "Restarts of a process by the supervisor"),
+    "ripflow_watchdog_kills_total": (
+        "counter",
+        "Processes killed because they were stuck in a stage",
+    ),
+    "ripflow_recycles_total": ("counter", "Workers replaced by a new process"),
+    "ripflow_queue_depth": (
+        "gauge",
+        "Estimated number of events queued in a hop, sent minus received",
+    ),
+    "ripflow_analysis_seconds": ("histogram", "Time spent in the analyzer per call"),
+}
+
+
+def key(name: str, **labels: Any) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter(object):
+    """A value that only goes up."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, n: float = 1) -> None:
+        self.value += n
+
+
+class Metrics(object):
+    """
+    Counters and histograms of a single child process.
+
+    Counters are cumulative over the lifetime of the process, the collector
+    takes care of processes that restart and count from zero again. Metrics
+    are registered once and updated through the returned objects, so that
+    counting an event costs no more than an addition.
+
+    Parameters
+    ----------
+    process : str
+        Name of the process, added as label to all metrics
+    """
+
+    def __init__(self, process: str):
+        self.process = process
+        self.counters: Dict[Key, Counter] = {}
+        self.histograms: Dict[Key, LatencyHistogram] = {}
+        self._sources: Dict[Key, Callable[[], float]] = {}
+
+    def counter(self, name: str, **labels: Any) -> Counter:
+        k = key(name, process=self.process, **labels)
+        return self.counters.setdefault(k, Counter())
+
+    def histogram(self, name: str, **labels: Any) -> LatencyHistogram:
+        k = key(name, process=self.process, **labels)
+        return self.histograms.setdefault(k, LatencyHistogram())
+
+    def track(self, name: str, source: Callable[[], float], **labels: Any) -> None:
+        """Report the value of a counter that is kept elsewhere."""
+        self._sources[key(name, process=self.process, **labels)] = source
+
+    def snapshot(self) -> Tuple[Dict[Key, float], Dict[Key, LatencyHistogram]]:
+        counters = {k: c.value for k, c in list(self.counters.items())}
+        for k, source in list(self._sources.items()):
+            counters[k] = source()
+        histograms = {}
+        for k, histogram in list(self.histograms.items()):
+            copy = LatencyHistogram(histogram.per_decade)
+            copy.merge(histogram)
+            histograms[k] = copy
+        return counters, histograms
+
+
+class MetricsReporter(object):
+    """
+    Pushes the metrics of a child process to the collector.
+
+    A background thread sends a snapshot every `interval` seconds, so that
+    idle processes report as well. Sending never blocks.
+
+    Parameters
+    ----------
+    metrics : Metrics
+        Metrics of the process
+    context : zmq.Context
+        Context to create the PUSH socket in
+    comms_factory : CommsFactory
+        Factory that creates the socket
+    comms_config : dict
+        Configuration of the PUSH socket
+    interval : float, default 1.0
+        Time in seconds between two pushes
+    """
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        context: Any,
+        comms_factory: Any,
+        comms_config: Dict[str, Any],
+        interval: float = 1.0,
+    ):
+        self.metrics = metrics
+        self.interval = interval
+        self._context = context
+        self._comms_factory = comms_factory
+        self._comms_config = comms_config
+        # Tells the collector apart from a previous run of the same process
+        self._incarnation = (os.getpid(), time.time())
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._report, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Send a last snapshot and close the socket."""
+        self._stop.set()
+        self._thread.join()
+
+    def _report(self) -> None:
+        socket = self._comms_factory.create_socket(self._context, **self._comms_config)
+        try:
+            while True:
+                stopping = self._stop.wait(self.interval)
+                counters, histograms = self.metrics.snapshot()
+                try:
+                    socket.send_pyobj(
+                        (self.metrics.process, self._incarnation, counters, histograms),
+                        flags=zmq.NOBLOCK,
+                    )
+                except zmq.Again:
+                    pass
+                if stopping:
+                    break
+        finally:
+            socket.close(linger=100)
+
+
+class MetricsCollector(object):
+    """
+    Collects the metrics of all child processes in the main process.
+
+    The metrics are served in the Prometheus text format, by `text` and, if a
+    port is given, over HTTP on ``http://<host>:<port>/metrics``.
+
+    Parameters
+    ----------
+    address : str
+        ZMQ address to bind the PULL socket to
+    logger : logging.Logger
+        Logger for errors of the collector threads
+    port : int, optional
+        Port of the HTTP endpoint
+    host : str, default "127.0.0.1"
+        Interface the HTTP endpoint listens on, "" for all interfaces
+    """
+
+    def __init__(
+        self,
+        address: str,
+        logger: logging.Logger,
+        port: Optional[int] = None,
+        host: str = "127.0.0.1",
+    ):
+        self.address = address
+        self.logger = logger
+        self.port = port
+        self.host = host
+        self._lock = threading.Lock()
+        # Latest snapshot and totals of previous runs, per process
+        self._current: Dict[str, Any] = {}
+        self._base: Dict[str, Tuple[Dict[Key, float], Dict[Key, LatencyHistogram]]] = {}
+        self._local: Dict[Key, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._collect, daemon=True)
+        self._thread.start()
+        if self.port is not None:
+            collector = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = collector.text().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            self.logger.info(f"Metrics served on {self.host or '*'}:{self.port}")
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def inc(self, name: str, n: float = 1, **labels: Any) -> None:
+        """Count an event of the main process, e.g. a restart."""
+        with self._lock:
+            k = key(name, **labels)
+            self._local[k] = self._local.get(k, 0) + n
+
+    def totals(self) -> Tuple[Dict[Key, float], Dict[Key, LatencyHistogram]]:
+        """Counters and histograms summed over all runs of every process."""
+        histograms: Dict[Key, LatencyHistogram] = {}
+        with self._lock:
+            counters = dict(self._local)
+            snapshots = list(self._base.values()) + [
+                (c, h) for _, c, h in self._current.values()
+            ]
+            for run_counters, run_histograms in snapshots:
+                for k, value in run_counters.items():
+                    counters[k] = counters.get(k, 0) + value
+                for k, histogram in run_histograms.items():
+                    histograms.setdefault(k, LatencyHistogram()).merge(histogram)
+        return counters, histograms
+
+    def queue_depths(self, counters: Dict[Key, float]) -> Dict[Key, float]:
+        """Estimate the events queued per hop from the counters."""
+        depths: Dict[Key, float] = {}
+        for (name, pairs), value in counters.items():
+            labels = dict(pairs)
+            hop = labels.get("hop")
+            if name == "ripflow_events_sent_total" and hop != "sink":
+                sign = 1
+            elif name == "ripflow_events_received_total" and hop != "source":
+                sign = -1
+            elif (
+                name == "ripflow_events_dropped_total"
+                and labels.get("side") == "receive"
+            ):
+                # Discarded from the local queue of the receiver
+                sign = -1
+            else:
+                continue
+            k = key("ripflow_queue_depth", hop=hop)
+            depths[k] = depths.get(k, 0) + sign * value
+        return {k: max(v, 0) for k, v in depths.items()}
+
+    def text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        counters, histograms = self.totals()
+        counters.update(self.queue_depths(counters))
+        lines: List[str] = []
+        for name, (kind, description) in DESCRIPTIONS.items():
+            samples = sorted((k, v) for k, v in counters.items() if k[0] == name)
+            hists = sorted((k, h) for k, h in histograms.items() if k[0] == name)
+            if not samples and not hists:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (_, labels), value in samples:
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+            for (_, labels), histogram in hists:
+                lines.extend(_histogram_lines(name, labels, histogram))
+        return "\n".join(lines) + "\n"
+
+    def _collect(self) -> None:
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        socket.bind(self.address)
+        try:
+            while not self._stop.is_set():
+                if not socket.poll(100):
+                    continue
+                process, incarnation, counters, histograms = socket.recv_pyobj()
+                with self._lock:
+                    previous = self._current.get(process)
+                    if previous is not None and previous[0] != incarnation:
+                        # The process was restarted and counts from zero again
+                        base = self._base.setdefault(process, ({}, {}))
+                        for k, value in previous[1].items():
+                            base[0][k] = base[0].get(k, 0) + value
+                        for k, histogram in previous[2].items():
+                            base[1].setdefault(k, LatencyHistogram()).merge(histogram)
+                    self._current[process] = (incarnation, counters, histograms)
+        except Exception as e:
+            self.logger.error(f"Error in metrics collector: {e}")
+        finally:
+            socket.close(linger=0)
+            context.term()
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _histogram_lines(
+    name: str, labels: Tuple[Tuple[str, str], ...], histogram: LatencyHistogram
+) -> List[str]:
+    lines = []
+    cumulative = 0
+    # Two buckets per decade are enough for the exposition
+    step = max(histogram.per_decade // 2, 1)
+    for i, edge in enumerate(histogram.edges):
+        cumulative += histogram.counts[i]
+        if i % step == 0:
+            lines.append(f"{name}_bucket{_labels(labels, le=f'{edge:g}')} {cumulative}")
+    lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {histogram.count}')
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:g}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    return lines
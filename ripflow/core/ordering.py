@@ -0,0 +1,142 @@
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+
+class ReorderPolicy:
+    """
+    Configuration of the ordering stage in the senders.
+
+    Parameters
+    ----------
+    window : int, default 64
+        Maximum number of messages held back while waiting for a missing one.
+        When the window is full, the missing message is given up on.
+    timeout : float, default 1.0
+        Time in seconds after which a missing message is considered lost.
+    """
+
+    def __init__(self, window: int = 64, timeout: float = 1.0):
+        self._window = window
+        self._timeout = timeout
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+
+class ReorderBuffer(object):
+    """
+    Bounded buffer that releases messages in sequence order.
+
+    Messages are identified by the epoch of the producer that emitted them and
+    a sequence number within this epoch. Epochs increase with every producer
+    run, messages of an earlier epoch than the current one are late. A `None`
+    item marks a sequence number that was dropped on purpose upstream; it
+    advances the buffer without being released.
+
+    A new epoch starts at sequence number 0. A fresh buffer may also join a
+    stream that is already running, so for the first epoch it waits for
+    message 0 as for any other gap and otherwise starts at the lowest
+    sequence number it received.
+
+    Parameters
+    ----------
+    policy : ReorderPolicy
+        Window size and timeout of the buffer
+
+    Attributes
+    ----------
+    skipped : int
+        Number of sequence numbers that were given up on
+    late : int
+        Number of messages discarded because they arrived after their
+        sequence number had been skipped or after a newer epoch
+    """
+
+    def __init__(self, policy: ReorderPolicy):
+        self.policy = policy
+        self._epoch: Any = None
+        self._next: int = 0
+        # Whether `_next` is known, only not yet for the first epoch
+        self._started = False
+        # Insertion ordered, the first entry is the oldest pending message
+        self._pending: Dict[int, Tuple[float, Any]] = {}
+        self.skipped = 0
+        self.late = 0
+
+    def push(
+        self, epoch: Any, seq: int, item: Any, now: Optional[float] = None
+    ) -> List[Any]:
+        """Add a message and return all messages that are ready to be sent."""
+        now = time.monotonic() if now is None else now
+        if self._epoch is not None and epoch < self._epoch:
+            # Still in transit from a producer run that was replaced
+            if item is not None:
+                self.late += 1
+            return []
+        released = []
+        if epoch != self._epoch:
+            # A restarted producer starts counting from zero again
+            released = self.flush()
+            self._started = self._epoch is not None
+            self._next = 0
+            self._epoch = epoch
+        if self._started and seq < self._next:
+            if item is not None:
+                self.late += 1
+            return released
+        self._pending[seq] = (now, item)
+        return released + self.poll(now)
+
+    def poll(self, now: Optional[float] = None) -> List[Any]:
+        """Return messages that became ready, giving up on expired gaps."""
+        now = time.monotonic() if now is None else now
+        if not self._started and self._pending:
+            if 0 not in self._pending and not self._expired(now):
+                return []
+            self._next = min(self._pending)
+            self._started = True
+        released = []
+        while self._pending:
+            if self._next in self._pending:
+                _, item = self._pending.pop(self._next)
+                self._next += 1
+                if item is not None:
+                    released.append(item)
+                continue
+            if not self._expired(now):
+                break
+            first = min(self._pending)
+            self.skipped += first - self._next
+            self._next = first
+        return released
+
+    def _expired(self, now: float) -> bool:
+        """Whether the window is full or the oldest message waited too long."""
+        oldest, _ = next(iter(self._pending.values()))
+        return (
+            len(self._pending) > self.policy.window
+            or now - oldest >= self.policy.timeout
+        )
+
+    def next_deadline(self) -> Optional[float]:
+        """Monotonic time at which the oldest pending gap expires."""
+        if not self._pending:
+            return None
+        oldest, _ = next(iter(self._pending.values()))
+        return oldest + self.policy.timeout
+
+    def flush(self) -> List[Any]:
+        """Release all pending messages in order, regardless of gaps."""
+        released = [
+            item for _, (_, item) in sorted(self._pending.items()) if item is not None
+        ]
+        if self._pending:
+            self._next = max(self._pending) + 1
+            self._started = True
+        self._pending.clear()
+        return released
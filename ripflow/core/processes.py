@@ -1,12 +1,39 @@
 from ripflow.analyzers import BaseAnalyzer
 from ripflow.connectors.sink import SinkConnector
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from ripflow.connectors.source import SourceConnector
+from .errors import ErrorPolicy
+from .flow_control import BackpressurePolicy, DropCounter, Inbox, Outbox
+from .metrics import Metrics, MetricsReporter
+from .ordering import ReorderBuffer, ReorderPolicy
+from .routing import ANNOUNCE_INTERVAL, BYE, LEAVE_TIMEOUT, READY
+from .routing import KeyedRouter, Router, RoutingPolicy
+from .tracing import Tracer, stamp
 from .utils import CommsFactory
 from .utils import Child
+from .watchdog import RECYCLE_EXIT_CODE, WatchdogPolicy, rss
 import zmq
 
+from math import ceil
 import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import sys
+import time
+
+# Time in seconds after which an idle process checks whether it should retire
+# or drain
+RETIRE_POLL = 0.1
+
+
+class _Interrupted(BaseException):
+    """Raised in the producer to stop waiting for the source connector."""
+
+
+class _Terminated(BaseException):
+    """Raised in the sender to stop waiting for messages when terminated."""
 
 
 class Producer(Child):
@@ -16,6 +43,15 @@ class Producer(Child):
     ----------
     server : MiddleLayerAnalyzer
         Server object to connect to
+    tracing : bool, default False
+        If True, events carry the times at which they pass the stages of the
+        pipeline in their metadata
+    metrics_comms_config : dict, optional
+        If given, the counters of the producer are pushed to the metrics
+        collector through a socket with this configuration
+    routing : RoutingPolicy, optional
+        If given and the socket is a ROUTER socket, events are sent to the
+        worker that owns their key instead of round-robin
     """
 
     def __init__(
@@ -24,25 +60,100 @@ class Producer(Child):
         comms_factory: CommsFactory,
         comms_config: Dict[str, Any],
         source_connector: SourceConnector,
+        backpressure: Optional[BackpressurePolicy] = None,
+        tracing: bool = False,
+        metrics_comms_config: Optional[Dict[str, Any]] = None,
+        routing: Optional[RoutingPolicy] = None,
     ) -> None:
         """Construct producer object"""
         super().__init__(logger, comms_factory)
         self.source_connector = source_connector
         self.comms_config = comms_config
+        self.backpressure = backpressure or BackpressurePolicy()
+        self.tracing = tracing
+        self.metrics_comms_config = metrics_comms_config
+        self.routing = routing
+        self.name = "producer"
+        self._waiting = False
+
+    def drain(self) -> None:
+        """Stop reading from the source, pass on the events sent so far."""
+        super().drain()
+        if self.is_alive():  # type: ignore
+            # Source connectors may block indefinitely, interrupt them
+            os.kill(self.process.pid, signal.SIGUSR1)  # type: ignore
 
     def main_routine(self):
         """Listen for incoming events."""
+        signal.signal(signal.SIGUSR1, self._interrupt)
         self.context = self.comms_factory.create_context()
         self.source_connector.connect()
         self.input_socket = self._connect_producer()
+        if self.comms_config["socket_type"] == zmq.ROUTER:
+            router = Router(
+                self.input_socket, self.comms_factory.send_object, self.logger
+            )
+            if self.routing is not None:
+                router = KeyedRouter(
+                    self.routing,
+                    self.input_socket,
+                    self.comms_factory.send_object,
+                    self.logger,
+                )
+            send = router.send
+        else:
+            send = lambda obj, flags: self.comms_factory.send_object(
+                self.input_socket, obj, flags
+            )
+        outbox = Outbox(self.backpressure, send, DropCounter(self.logger, "Producer"))
+        metrics = Metrics(self.name)
+        received = metrics.counter("ripflow_events_received_total", hop="source")
+        sent = metrics.counter("ripflow_events_sent_total", hop="input")
+        errors = metrics.counter("ripflow_errors_total")
+        _track_drops(metrics, outbox.drops, hop="input", side="send")
+        reporter = _start_reporter(self, metrics, self.metrics_comms_config)
+        self.ready.set()
+        # Events are numbered per producer run, the epoch tells runs apart.
+        # Dropped events do not use up a number.
+        epoch = time.time()
+        seq = 0
         while True:
             try:
+                if self.draining.is_set():
+                    raise _Interrupted()
+                self.heartbeat.enter("source")
+                self._waiting = True
                 data = self.source_connector.get_data()
-                self.input_socket.send_pyobj(data)
+                self._waiting = False
+                received.inc()
+                meta = {"epoch": epoch, "seq": seq, "t_ingest": time.monotonic()}
+                if self.tracing:
+                    meta["trace"] = {"receive": meta["t_ingest"]}
+                    stamp(meta, "enqueue")
+                self.heartbeat.enter("send", seq)
+                if outbox.send((meta, data)):
+                    seq += 1
+                    sent.inc()
+            except _Interrupted:
+                self._waiting = False
+                if reporter is not None:
+                    reporter.stop()
+                # Closing waits until the workers took the queued events
+                self.comms_factory.cleanup(self.context, [self.input_socket])
+                self.logger.info("Producer drained")
+                break
             except Exception as e:
                 self.logger.error(f"Error in producer main_routine: {e}")
+                errors.inc()
+                if reporter is not None:
+                    reporter.stop()
                 break
 
+    def _interrupt(self, signum, frame) -> None:
+        # An event that was already read is sent before the producer exits
+        if self._waiting:
+            raise _Interrupted()
+
     def _connect_producer(self):
         socket = self.comms_factory.create_socket(self.context, **self.comms_config)
         return socket
@@ -59,6 +170,15 @@ class Worker(Child):
         sink_connector: SinkConnector,
         n_senders: int,
         worker_id: int = 0,
+        batch_size: int = 1,
+        batch_timeout: float = 0.01,
+        input_backpressure: Optional[BackpressurePolicy] = None,
+        output_backpressure: Optional[BackpressurePolicy] = None,
+        max_age: Optional[float] = None,
+        routes: Optional[List[int]] = None,
+        metrics_comms_config: Optional[Dict[str, Any]] = None,
+        watchdog: Optional[WatchdogPolicy] = None,
+        errors: Optional[ErrorPolicy] = None,
     ) -> None:
         """
         Initialize the Worker object.
@@ -72,6 +192,28 @@ class Worker(Child):
             sink_connector (SinkConnector): The sink connector object for connecting to sinks.
             n_senders (int): The number of senders.
             worker_id (int, optional): The ID of the worker. Defaults to 0.
+            batch_size (int, optional): Maximum number of events that are handed to
+                `analyzer.run_batch` at once. Defaults to 1, which calls `analyzer.run`.
+            batch_timeout (float, optional): Time in seconds to wait for a batch to
+                fill up after its first event arrived. Defaults to 0.01.
+            input_backpressure (BackpressurePolicy, optional): Policy of the hop from
+                the producer. Defaults to blocking.
+            output_backpressure (BackpressurePolicy, optional): Policy of the hops to
+                the senders. Defaults to blocking.
+            max_age (float, optional): Time in seconds since the producer received
+                an event after which it is discarded instead of being analyzed or
+                serialized. Defaults to None, which keeps all events.
+            routes (list of int, optional): Index of the sender that serves each
+                output of the analyzer. Defaults to one sender per output.
+            metrics_comms_config (dict, optional): Configuration of the socket
+                through which the counters of the worker are pushed to the
+                metrics collector. Defaults to None, which does not report them.
+            watchdog (WatchdogPolicy, optional): If it sets `max_events` or
+                `max_rss`, the worker finishes the events it received and exits
+                to be replaced by a new process when it exceeds them.
+            errors (ErrorPolicy, optional): How events whose analysis or
+                serialization fails are handled. Defaults to skipping them and
+                exiting after 3 failures in a row.
         """
         super().__init__(logger, comms_factory)
         self.input_comms_config = input_comms_config
@@ -80,31 +222,401 @@ class Worker(Child):
         self.sink_connector = sink_connector
         self.n_senders = n_senders
         self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.input_backpressure = input_backpressure or BackpressurePolicy()
+        self.output_backpressure = output_backpressure or BackpressurePolicy()
+        self.max_age = max_age
+        self.routes = routes if routes is not None else list(range(n_senders))
+        self.metrics_comms_config = metrics_comms_config
+        self.watchdog = watchdog
+        self.errors = errors or ErrorPolicy()
+        self.name = f"worker_{worker_id}"
+        # Whether the producer routes events to the worker by its identity
+        self._routed = input_comms_config["socket_type"] == zmq.DEALER
+        self._next_announce = 0.0
         self.output_sockets: List[zmq.Socket] = list()
+        self.outboxes: List[Outbox] = list()
+        # Set by the supervisor to scale down, shared with the process
+        self.retiring = multiprocessing.Event()
 
     def main_routine(self):
         self.context = self.comms_factory.create_context()
+        self.metrics = Metrics(self.name)
+        self.received = self.metrics.counter(
+            "ripflow_events_received_total", hop="input"
+        )
+        self.sent = [
+            self.metrics.counter("ripflow_events_sent_total", hop=f"output_{idx}")
+            for idx in range(self.n_senders)
+        ]
+        errors = self.metrics.counter("ripflow_errors_total")
+        self.analysis_time = self.metrics.histogram("ripflow_analysis_seconds")
+        self.event_errors = {
+            stage: self.metrics.counter("ripflow_event_errors_total", stage=stage)
+            for stage in ("analysis", "serialize")
+        }
+        self._consecutive_errors = 0
+        dead_letter = self.errors.dead_letter
+        if dead_letter is not None:
+            dead_letter.open()
         self._connect_worker()
+        self.serializers = [
+            self.sink_connector.serializer.for_output(idx)
+            for idx in range(len(self.routes))
+        ]
+        self.expired = DropCounter(self.logger, f"Worker {self.worker_id} (max_age)")
+        _track_drops(self.metrics, self.inbox.drops, hop="input", side="receive")
+        _track_drops(self.metrics, self.outboxes[0].drops, hop="output", side="send")
+        _track_drops(self.metrics, self.expired, reason="max_age")
+        reporter = _start_reporter(self, self.metrics, self.metrics_comms_config)
+        try:
+            self.analyzer.setup(self.worker_id)
+        except Exception as e:
+            self.logger.error(f"Worker {self.worker_id}: setup failed: {e!r}")
+            errors.inc()
+            self._shut_down(reporter)
+            return
+        self._join()
+        self.ready.set()
         self.logger.info(f"Worker {self.worker_id} launched")
+        self._next_rss_check = time.monotonic()
         while True:
             try:
-                data = self.input_socket.recv_pyobj()
-                data = self.analyzer.run(data)
-                for idx in range(self.n_senders):
-                    prop = data[idx]
-                    msg = self.sink_connector.serializer.serialize(prop)
-                    self.output_sockets[idx].send(msg)
+                worn_out = self._worn_out()
+                if self.retiring.is_set() or worn_out:
+                    self._drain()
+                    self._shut_down(reporter)
+                    if worn_out:
+                        self.logger.info(f"Worker {self.worker_id} recycled")
+                        sys.exit(RECYCLE_EXIT_CODE)
+                    self.logger.info(f"Worker {self.worker_id} retired")
+                    break
+                events = self._receive_batch()
+                if events:
+                    self._process(events)
+                    continue
+                # Idle, pass on markers that did not fit into the queues
+                self._flush_markers()
+                if self.draining.is_set():
+                    # Idle after the producer exited, all events are passed on
+                    self._shut_down(reporter)
+                    self.logger.info(f"Worker {self.worker_id} drained")
+                    break
             except Exception as e:
                 self.logger.error(f"Error in worker main_routine: {e}")
-                self.comms_factory.cleanup(
-                    self.context, self.output_sockets + [self.input_socket]
+                errors.inc()
+                self._shut_down(reporter)
+                break
+
+    def _shut_down(self, reporter: Optional[MetricsReporter]) -> None:
+        """Tear down the analyzer and close all sockets before exiting."""
+        if reporter is not None:
+            reporter.stop()
+        try:
+            self.analyzer.teardown()
+        except Exception as e:
+            self.logger.error(f"Worker {self.worker_id}: teardown failed: {e!r}")
+        if self.errors.dead_letter is not None:
+            self.errors.dead_letter.close()
+        self.inbox.close()
+        self.comms_factory.cleanup(
+            self.context, self.output_sockets + [self.input_socket]
+        )
+
+    def retire(self) -> None:
+        """Ask the worker to finish the events it received and exit."""
+        self.retiring.set()
+
+    def _worn_out(self) -> bool:
+        """Whether the worker should be replaced by a new process."""
+        if self.watchdog is None:
+            return False
+        max_events = self.watchdog.max_events
+        if max_events is not None and self.received.value >= max_events:
+            return True
+        if self.watchdog.max_rss is not None:
+            now = time.monotonic()
+            if now >= self._next_rss_check:
+                self._next_rss_check = now + 1.0
+                return rss() > self.watchdog.max_rss
+        return False
+
+    def _process(self, events: List[Tuple[Dict[str, Any], Any]]) -> None:
+        """Analyze a batch of events and send the results to the senders."""
+        if self.max_age is not None:
+            events = self._discard_expired(events)
+            if not events:
+                return
+        self.heartbeat.enter("analysis", events[0][0]["seq"])
+        for meta, _ in events:
+            stamp(meta, "analysis_start")
+        start = time.perf_counter()
+        results = self._analyze(events)
+        self.analysis_time.record(time.perf_counter() - start)
+        for meta, _ in events:
+            stamp(meta, "analysis_end")
+        self._flush_markers()
+        for event, data in zip(events, results):
+            meta = event[0]
+            if data is None:
+                continue
+            if _expired(meta, self.max_age):
+                self.expired.count()
+                self._skip(meta)
+                continue
+            self.heartbeat.enter("serialize", meta["seq"])
+            try:
+                msgs = [
+                    self.serializers[idx].serialize(data[idx])
+                    for idx in range(len(self.routes))
+                ]
+            except Exception as e:
+                self._failed(event, "serialize", e)
+                continue
+            self._consecutive_errors = 0
+            stamp(meta, "serialize")
+            header = pickle.dumps(meta)
+            self.heartbeat.enter("send", meta["seq"])
+            for idx, sender in enumerate(self.routes):
+                if self.outboxes[sender].send([b"%d" % idx, header, msgs[idx]]):
+                    self.sent[sender].inc()
+        for event in events:
+            self.comms_factory.release(event)
+
+    def _analyze(self, events: List[Tuple[Dict[str, Any], Any]]) -> List[Any]:
+        """Return the outputs of the analyzer per event, None if it failed."""
+        analyze = self.analyzer.run
+        if self.batch_size > 1:
+            try:
+                return self._run_batch([data for _, data in events])
+            except Exception as e:
+                if self.errors.is_fatal(e) or len(events) == 1:
+                    self._failed(events[0], "analysis", e)
+                    return [None]
+            # Find the events that fail by analyzing them one at a time
+            analyze = lambda data: self._run_batch([data])[0]
+        results: List[Any] = []
+        for event in events:
+            try:
+                results.append(analyze(event[1]))
+            except Exception as e:
+                self._failed(event, "analysis", e)
+                results.append(None)
+        return results
+
+    def _run_batch(self, batch: List[Any]) -> List[Any]:
+        """Call `analyzer.run_batch`, raise if it lost or added events."""
+        results = self.analyzer.run_batch(batch)
+        if len(results) != len(batch):
+            raise ValueError(
+                f"run_batch returned {len(results)} results for " f"{len(batch)} events"
+            )
+        return results
+
+    def _failed(
+        self, event: Tuple[Dict[str, Any], Any], stage: str, error: Exception
+    ) -> None:
+        """Put aside an event that raised `error` and carry on with the next.
+
+        Raises the error again if it is fatal or too many events failed in a
+        row, which makes the worker exit to be restarted by the supervisor.
+        """
+        meta, data = event
+        if self.errors.is_fatal(error):
+            raise error
+        self.event_errors[stage].inc()
+        self.logger.error(
+            f"Worker {self.worker_id}: {stage} of event {meta['seq']} failed: "
+            f"{error!r}"
+        )
+        dead_letter = self.errors.dead_letter
+        if dead_letter is not None:
+            try:
+                dead_letter.put(meta, data, stage, repr(error))
+            except Exception as e:
+                self.logger.error(
+                    f"Worker {self.worker_id}: dead letter queue failed: {e!r}"
+                )
+        self._skip(meta)
+        self._consecutive_errors += 1
+        if self._consecutive_errors >= self.errors.max_consecutive_errors:
+            raise RuntimeError(
+                f"{self._consecutive_errors} events failed in a row"
+            ) from error
+
+    def _drain(self) -> None:
+        """Leave the input hop and process the events that already arrived.
+
+        The worker tells the producer that it leaves and receives events
+        until the producer answered that it routes no more events to it, so
+        that no event is lost when the socket is disconnected. A PUSH socket
+        cannot be told, from a PULL socket the events that are still in
+        transit at that moment are lost.
+        """
+        self.inbox.close()
+        events = [e for e in self.inbox.queue if not isinstance(e, bytes)]
+        self.inbox.queue.clear()
+        if self._routed:
+            events += self._leave()
+        else:
+            while self.input_socket.poll(0):
+                events.append(self.comms_factory.recv_object(self.input_socket))
+        address = self.input_comms_config.get("connect_address")
+        if address is not None:
+            self.input_socket.disconnect(address)
+        self.received.inc(len(events))
+        for i in range(0, len(events), self.batch_size):
+            batch = events[i : i + self.batch_size]
+            for meta, _ in batch:
+                stamp(meta, "dequeue")
+            self._process(batch)
+        self._flush_markers()
+
+    def _leave(self) -> List[Tuple[Dict[str, Any], Any]]:
+        """Say goodbye to the producer, return the events it still routed
+        to the worker before it answered."""
+        socket = self.input_socket
+        token = os.urandom(8)
+        events: List[Tuple[Dict[str, Any], Any]] = []
+        said_bye = False
+        deadline = time.monotonic() + LEAVE_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # The producer is busy elsewhere or gone. It reads BYE before
+                # it routes the next event.
+                self.logger.warning(
+                    f"Worker {self.worker_id}: producer did not answer, leaving"
                 )
+                return events
+            wanted = zmq.POLLIN if said_bye else zmq.POLLIN | zmq.POLLOUT
+            ready = socket.poll(ceil(remaining * 1e3), wanted)
+            if ready & zmq.POLLOUT and not said_bye:
+                socket.send_multipart([BYE, token])
+                said_bye = True
+            if ready & zmq.POLLIN:
+                event = self.comms_factory.recv_object(socket)
+                if event == token:
+                    return events
+                if not isinstance(event, bytes):
+                    events.append(event)
+
+    def _receive_batch(self) -> List[Tuple[Dict[str, Any], Any]]:
+        """Wait for the next event and collect up to `batch_size` events.
+
+        Returns an empty list after `RETIRE_POLL` seconds without events, so
+        that a request to retire is noticed while the worker is idle.
+        """
+        self.heartbeat.enter("idle")
+        first = self._next_event(RETIRE_POLL)
+        if first is None:
+            return []
+        events = [first]
+        self.received.inc()
+        stamp(events[0][0], "dequeue")
+        deadline = time.monotonic() + self.batch_timeout
+        while len(events) < self.batch_size:
+            event = self._next_event(max(deadline - time.monotonic(), 0))
+            if event is None:
                 break
+            self.received.inc()
+            stamp(event[0], "dequeue")
+            events.append(event)
+        return events
+
+    def _join(self) -> None:
+        """Ask the producer for events, once the worker can analyze them."""
+        if not self._routed:
+            return
+        if self.input_backpressure.drains:
+            # The receiving thread owns the socket, it announces the worker
+            # the next time it is idle
+            self._next_announce = 0.0
+            return
+        self.input_socket.send(READY)
+        self._next_announce = time.monotonic() + ANNOUNCE_INTERVAL
+
+    def _announce(self, socket: zmq.Socket) -> None:
+        """Repeat READY while idle, a restarted producer does not know the
+        workers that are already connected."""
+        now = time.monotonic()
+        if now < self._next_announce:
+            return
+        try:
+            socket.send(READY, zmq.NOBLOCK)
+        except zmq.Again:
+            # Not connected yet or the producer has not read the previous
+            # announcements, try again when idle next time
+            return
+        self._next_announce = now + ANNOUNCE_INTERVAL
+
+    def _next_event(self, timeout: float) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """Return the next event, None if none arrived within timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            event = self.inbox.get(max(deadline - time.monotonic(), 0))
+            # The producer may answer the goodbye of an earlier process of
+            # this worker after it was restarted, and events whose shared
+            # memory was reused by a restarted producer arrive as STALE
+            if not isinstance(event, bytes):
+                return event
+
+    def _discard_expired(
+        self, events: List[Tuple[Dict[str, Any], Any]]
+    ) -> List[Tuple[Dict[str, Any], Any]]:
+        """Drop the events that are older than `max_age`, return the rest."""
+        fresh = []
+        for event in events:
+            if _expired(event[0], self.max_age):
+                self.expired.count()
+                self._drop(event)
+            else:
+                fresh.append(event)
+        return fresh
+
+    def _drop(self, event: Tuple[Dict[str, Any], Any]) -> None:
+        """Discard an event that was not analyzed."""
+        if isinstance(event, bytes):
+            return
+        self._skip(event[0])
+        self.comms_factory.release(event)
+
+    def _skip(self, meta: Dict[str, Any]) -> None:
+        """Tell the senders that an event was dropped on purpose."""
+        header = pickle.dumps(dict(meta, dropped=True))
+        for outbox in self.outboxes:
+            # An empty output frame addresses all outputs of the sender
+            outbox.mark([b"", header, b""])
+        self._flush_markers()
+
+    def _flush_markers(self) -> None:
+        """Send the markers of dropped events that are held back."""
+        for sender, outbox in enumerate(self.outboxes):
+            if outbox.markers:
+                self.sent[sender].inc(outbox.flush())
 
     def _connect_worker(self):
-        self.input_socket = self.comms_factory.create_socket(
-            self.context, **self.input_comms_config
+        config = self.input_comms_config
+        if self._routed:
+            # The producer routes events by the identity of the socket. Only
+            # announcements are sent, which are void once the worker exits.
+            options = dict(config.get("options", {}))
+            options[zmq.IDENTITY] = self.name.encode()
+            options[zmq.LINGER] = 0
+            config = dict(config, options=options)
+        self.input_socket = self.comms_factory.create_socket(self.context, **config)
+        # Announced by `_join` once the analyzer is set up
+        self._next_announce = float("inf")
+        self.inbox = Inbox(
+            self.input_backpressure,
+            self.input_socket,
+            self.comms_factory.recv_object,
+            DropCounter(self.logger, f"Worker {self.worker_id}"),
+            on_drop=self._drop,
+            on_idle=self._announce if self._routed else None,
         )
+        output_drops = DropCounter(self.logger, f"Worker {self.worker_id} output")
         base_config = self.output_comms_config.copy()
         for idx in range(self.n_senders):
             # Modify the specific configuration for each sender
@@ -115,6 +627,16 @@ class Worker(Child):
             config[address_key] = config[address_key] + f"_{idx}"
             socket = self.comms_factory.create_socket(self.context, **config)
             self.output_sockets.append(socket)
+            self.outboxes.append(
+                Outbox(
+                    self.output_backpressure,
+                    lambda frames, flags, socket=socket: socket.send_multipart(
+                        frames, flags=flags, copy=False
+                    ),
+                    output_drops,
+                    marker=_dropped_marker,
+                )
+            )
 
 
 class Sender(Child):
@@ -133,6 +655,26 @@ class Sender(Child):
         The sender id.
     sink_connector : SinkConnector
         The sink connector object for sending messages to the sink.
+    ordering : ReorderPolicy, optional
+        If given, messages are sent in the order in which the producer
+        received the events instead of the order in which workers finish them.
+    backpressure : BackpressurePolicy, optional
+        Policy of the hop from the workers. Defaults to blocking.
+    max_age : float, optional
+        Time in seconds since the producer received an event after which its
+        messages are discarded instead of being sent. By default all messages
+        are sent.
+    outputs : list of int, optional
+        Outputs of the analyzer that are served by this sender. All of them
+        arrive through a single input socket, each one gets its own copy of
+        the sink connector. Defaults to the output with the sender id.
+    trace_comms_config : dict, optional
+        If given, the stage latencies of traced events are recorded and
+        pushed to the trace collector through a socket with this
+        configuration.
+    metrics_comms_config : dict, optional
+        If given, the counters of the sender are pushed to the metrics
+        collector through a socket with this configuration.
 
     Attributes
     ----------
@@ -151,11 +693,33 @@ class Sender(Child):
         comms_config: Dict[str, Any],
         idx: int,
         sink_connector: SinkConnector,
+        ordering: Optional[ReorderPolicy] = None,
+        backpressure: Optional[BackpressurePolicy] = None,
+        max_age: Optional[float] = None,
+        outputs: Optional[List[int]] = None,
+        trace_comms_config: Optional[Dict[str, Any]] = None,
+        metrics_comms_config: Optional[Dict[str, Any]] = None,
     ) -> None:
         super().__init__(logger, comms_factory)
         self.idx = idx
         self.comms_config = comms_config
         self.sink_connector = sink_connector
+        self.ordering = ordering
+        self.backpressure = backpressure or BackpressurePolicy()
+        self.max_age = max_age
+        self.outputs = outputs if outputs is not None else [idx]
+        self.sink_connectors: Dict[int, SinkConnector] = {}
+        self.reorder_buffers: Dict[int, ReorderBuffer] = {}
+        self.trace_comms_config = trace_comms_config
+        self.tracer: Optional[Tracer] = None
+        self.metrics_comms_config = metrics_comms_config
+        self.name = f"sender_{idx}"
+        # Messages released by the reorder buffers while draining the inbox
+        self._released: List[Tuple[int, Dict[str, Any], bytes]] = []
+        # Whether the last wait for messages timed out
+        self._idle = False
+        self._waiting = False
+        self._terminated = False
 
     def main_routine(self) -> None:
         """
@@ -167,21 +731,214 @@ class Sender(Child):
             The sender id.
         """
         self.context = self.comms_factory.create_context()
+        self.metrics = Metrics(self.name)
+        self.received = self.metrics.counter(
+            "ripflow_events_received_total", hop=f"output_{self.idx}"
+        )
+        sent = self.metrics.counter("ripflow_events_sent_total", hop="sink")
+        errors = self.metrics.counter("ripflow_errors_total")
         self._connect_sender()
-        self.sink_connector.connect_subprocess(self.idx)
+        for output in self.outputs:
+            sink_connector = self.sink_connector.for_output(output)
+            sink_connector.connect_subprocess(output)
+            self.sink_connectors[output] = sink_connector
+        for sink_connector in self.sink_connectors.values():
+            sink_connector.settle()
+        self.expired = DropCounter(self.logger, f"Sender {self.idx} (max_age)")
         self.logger.info(f"Sender {self.idx} launched")
+        if self.ordering:
+            for output in self.outputs:
+                self.reorder_buffers[output] = ReorderBuffer(self.ordering)
+        sockets = [self.input_socket]
+        if self.trace_comms_config is not None:
+            trace_socket = self.comms_factory.create_socket(
+                self.context, **self.trace_comms_config
+            )
+            sockets.append(trace_socket)
+            self.tracer = Tracer(trace_socket, self.name)
+        _track_drops(
+            self.metrics, self.inbox.drops, hop=f"output_{self.idx}", side="receive"
+        )
+        _track_drops(self.metrics, self.expired, reason="max_age")
+        self.metrics.track(
+            "ripflow_events_dropped_total", self._skipped, reason="reorder_timeout"
+        )
+        reporter = _start_reporter(self, self.metrics, self.metrics_comms_config)
+        # Terminated senders close their sink connectors, which write out the
+        # data they buffer
+        signal.signal(signal.SIGTERM, self._terminate)
+        self.ready.set()
         while True:
             try:
-                msg = self.input_socket.recv()
-                self.sink_connector.send(msg)
+                if self._terminated:
+                    raise _Terminated()
+                self._waiting = True
+                ready = self._receive()
+                self._waiting = False
+                drained = self.draining.is_set() and self._idle
+                if drained:
+                    # The workers have exited, nothing fills the gaps anymore
+                    for output, buffer in self.reorder_buffers.items():
+                        ready += [(output, *entry) for entry in buffer.flush()]
+                for output, meta, msg in ready:
+                    if _expired(meta, self.max_age):
+                        self.expired.count()
+                        continue
+                    stamp(meta, "sink_start")
+                    self.heartbeat.enter("sink", meta["seq"])
+                    self.sink_connectors[output].send(msg)
+                    sent.inc()
+                    if self.tracer is not None and "trace" in meta:
+                        stamp(meta, "send")
+                        self.tracer.record(meta["trace"])
+                for sink_connector in self.sink_connectors.values():
+                    sink_connector.poll()
+                if self.tracer is not None:
+                    self.tracer.poll()
+                self.heartbeat.enter("idle")
+                if drained:
+                    self._close(reporter, sockets)
+                    self.logger.info(f"Sender {self.idx} drained")
+                    break
+            except _Terminated:
+                self._waiting = False
+                self._close(reporter, sockets)
+                self.logger.info(f"Sender {self.idx} terminated")
+                break
             except Exception as e:
                 self.logger.error(f"Error in sender main_routine: {e}")
-                self.comms_factory.cleanup(self.context, [self.input_socket])
+                errors.inc()
+                self._close(reporter, sockets)
                 break
 
+    def _terminate(self, signum, frame) -> None:
+        # Messages that were already received are sent before the sender exits
+        self._terminated = True
+        if self._waiting:
+            raise _Terminated()
+
+    def _close(self, reporter: Optional[MetricsReporter], sockets: List[Any]) -> None:
+        if reporter is not None:
+            reporter.stop()
+        for sink_connector in self.sink_connectors.values():
+            sink_connector.close()
+        self.inbox.close()
+        self.comms_factory.cleanup(self.context, sockets)
+
+    def _receive(self) -> List[Tuple[int, Dict[str, Any], bytes]]:
+        """Wait for the next message or gap timeout, return what is ready."""
+        if not self.reorder_buffers:
+            frames = self.inbox.get(self._wake_up(None))
+            self._idle = frames is None
+            if frames is None:
+                return []
+            self.received.inc()
+            output, header, msg = frames
+            meta = pickle.loads(header)
+            if meta.get("dropped"):
+                return []
+            stamp(meta, "sender_receive")
+            return [(int(output), meta, msg)]
+        deadlines = [
+            deadline
+            for deadline in (
+                buffer.next_deadline() for buffer in self.reorder_buffers.values()
+            )
+            if deadline is not None
+        ]
+        timeout = None
+        if deadlines:
+            timeout = max(min(deadlines) - time.monotonic(), 0)
+        skipped = self._skipped()
+        frames = self.inbox.get(self._wake_up(timeout))
+        self._idle = frames is None
+        ready, self._released = self._released, []
+        if frames is None:
+            for output, buffer in self.reorder_buffers.items():
+                ready += [(output, *entry) for entry in buffer.poll()]
+        else:
+            self.received.inc()
+            ready += self._reorder(frames)
+        if self._skipped() > skipped:
+            self.logger.warning(
+                f"Sender {self.idx}: gave up on "
+                f"{self._skipped() - skipped} missing events"
+            )
+        return ready
+
+    def _wake_up(self, timeout: Optional[float]) -> float:
+        """Limit the time to wait for messages so that traces are pushed and
+        a request to drain is noticed."""
+        interval = RETIRE_POLL
+        if self.tracer is not None:
+            interval = min(interval, self.tracer.interval)
+        if timeout is None:
+            return interval
+        return min(timeout, interval)
+
+    def _skipped(self) -> int:
+        return sum(buffer.skipped for buffer in self.reorder_buffers.values())
+
+    def _reorder(
+        self, frames: List[bytes], dropped: bool = False
+    ) -> List[Tuple[int, Dict[str, Any], bytes]]:
+        """Pass a message to the reorder buffers, None marks it as dropped."""
+        tag, header, msg = frames
+        meta = pickle.loads(header)
+        stamp(meta, "sender_receive")
+        item = None if dropped or meta.get("dropped") else (meta, msg)
+        # Markers without an output apply to all outputs of this sender
+        outputs = [int(tag)] if tag else self.outputs
+        ready = []
+        for output in outputs:
+            released = self.reorder_buffers[output].push(
+                meta["epoch"], meta["seq"], item
+            )
+            ready += [(output, *entry) for entry in released]
+        return ready
+
     def _connect_sender(self):
         """Connect sender to processed data stream"""
         config = self.comms_config.copy()
         address_key = "bind_address" if "bind_address" in config else "connect_address"
         config[address_key] = config[address_key] + f"_{self.idx}"
         self.input_socket = self.comms_factory.create_socket(self.context, **config)
+        self.inbox = Inbox(
+            self.backpressure,
+            self.input_socket,
+            lambda socket: socket.recv_multipart(),
+            DropCounter(self.logger, f"Sender {self.idx}"),
+            on_drop=self._on_drop,
+        )
+
+    def _on_drop(self, frames: List[bytes]) -> None:
+        if self.reorder_buffers:
+            self._released.extend(self._reorder(frames, dropped=True))
+
+
+def _dropped_marker(frames: List[bytes]) -> List[bytes]:
+    """Marker that tells a sender about an output message that was dropped."""
+    tag, header, _ = frames
+    return [tag, pickle.dumps(dict(pickle.loads(header), dropped=True)), b""]
+
+
+def _track_drops(metrics: Metrics, drops: DropCounter, **labels: str) -> None:
+    """Report the total of a drop counter as metric."""
+    labels.setdefault("reason", "backpressure")
+    metrics.track("ripflow_events_dropped_total", lambda: drops.total, **labels)
+
+
+def _start_reporter(
+    child: Any, metrics: Metrics, comms_config: Optional[Dict[str, Any]]
+) -> Optional[MetricsReporter]:
+    """Push the metrics of a child to the collector, if it is configured."""
+    if comms_config is None:
+        return None
+    return MetricsReporter(metrics, child.context, child.comms_factory, comms_config)
+
+
+def _expired(meta: Dict[str, Any], max_age: Optional[float]) -> bool:
+    """Whether an event is older than `max_age` seconds."""
+    if max_age is None or "t_ingest" not in meta:
+        return False
+    return time.monotonic() - meta["t_ingest"] > max_age
@@ -1,14 +1,25 @@
 from ripflow.analyzers import BaseAnalyzer
 from ripflow.connectors.sink import SinkConnector
 from ripflow.connectors.source import SourceConnector
+from .errors import ErrorPolicy
+from .flow_control import BackpressurePolicy
+from .ordering import ReorderPolicy
+from .routing import RoutingPolicy
 from .processes import Producer, Sender, Worker
-from .supervisor import RestartPolicy
+from .supervisor import AutoscalePolicy, RestartPolicy
 from .supervisor import Supervisor
-from .utils import ZMQFactory
+from .metrics import MetricsCollector
+from .tracing import TraceCollector
+from .watchdog import WatchdogPolicy
+from .utils import CommsFactory, ZMQFactory
+from typing import Any, Dict, Optional
 import zmq
 import logging
 import sys
 
+# Time in milliseconds after which a socket retries to connect
+RECONNECT_IVL = 10
+
 
 class Ripflow(object):
     """_summary_
@@ -27,6 +38,79 @@ class Ripflow(object):
         Path to log file
     log_level : str, default 'INFO'
         Logging level options: 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
+    comms_factory : CommsFactory, optional
+        Factory for the inter-process transport. Defaults to ``ZMQFactory()``,
+        use ``ZMQFactory(zero_copy=True)`` to send NumPy arrays without
+        pickling their data. ``SharedMemoryFactory()`` passes large arrays
+        through a shared memory ring on the local host.
+    batch_size : int, default 1
+        Maximum number of events a worker passes to ``analyzer.run_batch`` at
+        once. With the default of 1, ``analyzer.run`` is called per event.
+    batch_timeout : float, default 0.01
+        Time in seconds a worker waits for a batch to fill up
+    ordering : ReorderPolicy, optional
+        If given, the senders restore the order in which events entered the
+        pipeline, holding back at most ``ordering.window`` messages for at
+        most ``ordering.timeout`` seconds while waiting for a missing one.
+        By default messages are sent in the order workers finish them.
+    input_backpressure : BackpressurePolicy, optional
+        What happens when the workers fall behind the producer: block the
+        producer (default), drop the newest or the oldest events, or keep only
+        the latest one, with a bounded queue depth per connection.
+    output_backpressure : BackpressurePolicy, optional
+        Same for the hop from the workers to the senders
+    max_age : float, optional
+        Time in seconds after which an event that is still in the pipeline is
+        discarded. Workers check the age before analysis and serialization,
+        senders before sending. Discarded events are counted and reported in
+        the log. By default events are processed regardless of their age.
+    sender_pool : int, optional
+        Number of sender processes shared by all outputs of the analyzer.
+        Each sender receives the outputs assigned to it through a single
+        socket and publishes every output with its own copy of the sink
+        connector. By default one sender process is started per output, or
+        a single one if the sink connector is multiplexed.
+    tracing : bool, default False
+        If True, every event records when it passes the stages of the
+        pipeline: receive and enqueue in the producer, dequeue, analysis
+        start and end and serialization in the worker, and receive and send in
+        the sender. The senders collect the time spent in each stage in
+        histograms that can be queried with `latency_stats`.
+    metrics_port : int, optional
+        If given, all processes report their counters once per second and
+        the metrics are served in the Prometheus text format on
+        ``http://<host>:<metrics_port>/metrics``: events received, sent and
+        dropped per process, errors, restarts, the time spent in the
+        analyzer and the estimated number of events queued in each hop.
+    metrics_host : str, default "127.0.0.1"
+        Interface the metrics endpoint listens on, "" for all interfaces
+    autoscale : AutoscalePolicy, optional
+        If given, the supervisor adds workers when the analysis time times
+        the arrival rate of events exceeds the target utilization of the
+        workers or events queue up, and retires workers when they are mostly
+        idle. Retired workers finish the events they received before they
+        exit. `n_workers` is the initial number of workers, limited to the
+        bounds of the policy. Requires collecting metrics, which are also
+        served if `metrics_port` is given.
+    watchdog : WatchdogPolicy, optional
+        If given, processes that spend longer than the timeout of a stage
+        on one event, e.g. in ``analyzer.run`` or in the sink connector, are
+        killed and restarted. Workers can also be replaced by a new process
+        after a number of events or above a memory limit, to contain leaks
+        in the analyzer.
+    errors : ErrorPolicy, optional
+        What happens when the analysis or serialization of an event raises an
+        exception. The event is logged, counted and skipped, optionally after
+        putting it into a dead letter queue for later replay. By default the
+        worker is only restarted after 3 events failed in a row or on a
+        ``MemoryError`` or ``zmq.ZMQError``.
+    routing : RoutingPolicy, optional
+        If given, the producer sends all events with the same key to the
+        same worker, so that analyzers can keep per-key state such as
+        running backgrounds in memory. Keys are assigned to workers by
+        consistent hashing, when a worker crashes, retires or is added only
+        its keys move to other workers. By default events are distributed
+        round-robin.
     """
 
     def __init__(
@@ -37,6 +121,21 @@ class Ripflow(object):
         n_workers: int = 2,
         log_file_path: str = "server.log",
         log_level: str = "INFO",
+        comms_factory: Optional[CommsFactory] = None,
+        batch_size: int = 1,
+        batch_timeout: float = 0.01,
+        ordering: Optional[ReorderPolicy] = None,
+        input_backpressure: Optional[BackpressurePolicy] = None,
+        output_backpressure: Optional[BackpressurePolicy] = None,
+        max_age: Optional[float] = None,
+        sender_pool: Optional[int] = None,
+        tracing: bool = False,
+        metrics_port: Optional[int] = None,
+        metrics_host: str = "127.0.0.1",
+        autoscale: Optional[AutoscalePolicy] = None,
+        watchdog: Optional[WatchdogPolicy] = None,
+        errors: Optional[ErrorPolicy] = None,
+        routing: Optional[RoutingPolicy] = None,
     ) -> None:
         """Construct main server object"""
         # Map string log level to logging constant
@@ -75,41 +174,104 @@ class Ripflow(object):
         # Parameters of comm layer
         self.source_socket_address = "ipc://source"
         self.sender_socket_address = "ipc://sender"
+        self.trace_socket_address = "ipc://trace"
+        self.metrics_socket_address = "ipc://metrics"
 
-        self.comms_factory = ZMQFactory()
+        self.comms_factory = (
+            comms_factory if comms_factory is not None else ZMQFactory()
+        )
+        self.input_backpressure = input_backpressure or BackpressurePolicy()
+        self.output_backpressure = output_backpressure or BackpressurePolicy()
+        # Workers announce themselves to the producer, which addresses them by
+        # identity, learns when they are gone and stops routing to a worker
+        # before it leaves
         self.producer_comms_config = {
-            "socket_type": zmq.PUSH,
+            "socket_type": zmq.ROUTER,
             "bind_address": self.source_socket_address,
+            "options": {
+                **self.input_backpressure.socket_options(),
+                zmq.ROUTER_MANDATORY: 1,
+                zmq.ROUTER_HANDOVER: 1,
+            },
         }
+        # Workers connect before the other side is bound, retry soon
         self.worker_input_comms_config = {
-            "socket_type": zmq.PULL,
+            "socket_type": zmq.DEALER,
             "connect_address": self.source_socket_address,
+            "options": {
+                **self.input_backpressure.socket_options(),
+                zmq.RECONNECT_IVL: RECONNECT_IVL,
+            },
         }
         self.worker_output_comms_config = {
             "socket_type": zmq.PUSH,
             "connect_address": self.sender_socket_address,
+            "options": {
+                **self.output_backpressure.socket_options(),
+                zmq.RECONNECT_IVL: RECONNECT_IVL,
+            },
         }
         self.sender_comms_config = {
             "socket_type": zmq.PULL,
             "bind_address": self.sender_socket_address,
+            "options": self.output_backpressure.socket_options(),
         }
 
+        self.trace_collector: Optional[TraceCollector] = None
+        self.trace_comms_config: Optional[Dict[str, Any]] = None
+        if tracing:
+            self.trace_collector = TraceCollector(
+                self.trace_socket_address, self.logger
+            )
+            self.trace_comms_config = {
+                "socket_type": zmq.PUSH,
+                "connect_address": self.trace_socket_address,
+                "options": {zmq.SNDHWM: 100, zmq.LINGER: 0},
+            }
+
+        self.metrics_collector: Optional[MetricsCollector] = None
+        self.metrics_comms_config: Optional[Dict[str, Any]] = None
+        if metrics_port is not None or autoscale is not None:
+            self.metrics_collector = MetricsCollector(
+                self.metrics_socket_address,
+                self.logger,
+                port=metrics_port,
+                host=metrics_host,
+            )
+            self.metrics_comms_config = {
+                "socket_type": zmq.PUSH,
+                "connect_address": self.metrics_socket_address,
+                "options": {zmq.SNDHWM: 100, zmq.LINGER: 0},
+            }
+
         # Process registries
         self.n_workers = n_workers
-        self.n_senders = analyzer.n_outputs
-        self.workers = [
-            Worker(
-                logger=self.logger,
-                comms_factory=self.comms_factory,
-                input_comms_config=self.worker_input_comms_config,
-                output_comms_config=self.worker_output_comms_config,
-                analyzer=self.analyzer,
-                sink_connector=self.sink_connector,
-                n_senders=self.n_senders,
-                worker_id=i,
+        self.n_outputs = analyzer.n_outputs
+        sink_connector.check_outputs(self.n_outputs)
+        self.n_senders = self.n_outputs
+        if sink_connector.multiplexed:
+            # All outputs go through one connection of one process
+            if sender_pool not in (None, 1):
+                raise ValueError("A multiplexed sink connector needs sender_pool=1")
+            sender_pool = 1
+        if sender_pool is not None:
+            if sender_pool < 1:
+                raise ValueError("sender_pool must be at least 1")
+            self.n_senders = min(sender_pool, self.n_outputs)
+        # Index of the sender process that publishes each output
+        self.routes = [idx % self.n_senders for idx in range(self.n_outputs)]
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.max_age = max_age
+        self.autoscale = autoscale
+        self.watchdog = watchdog
+        self.errors = errors
+        if autoscale is not None:
+            self.n_workers = min(
+                max(n_workers, autoscale.min_workers), autoscale.max_workers
             )
-            for i in range(self.n_workers)
-        ]
+        self._next_worker_id = 0
+        self.workers = [self._create_worker() for _ in range(self.n_workers)]
         self.senders = [
             Sender(
                 logger=self.logger,
@@ -117,6 +279,12 @@ class Ripflow(object):
                 comms_config=self.sender_comms_config,
                 sink_connector=self.sink_connector,
                 idx=i,
+                ordering=ordering,
+                backpressure=self.output_backpressure,
+                max_age=max_age,
+                outputs=[idx for idx, sender in enumerate(self.routes) if sender == i],
+                trace_comms_config=self.trace_comms_config,
+                metrics_comms_config=self.metrics_comms_config,
             )
             for i in range(self.n_senders)
         ]
@@ -125,26 +293,132 @@ class Ripflow(object):
             comms_factory=self.comms_factory,
             comms_config=self.producer_comms_config,
             source_connector=self.source_connector,
+            backpressure=self.input_backpressure,
+            tracing=tracing,
+            metrics_comms_config=self.metrics_comms_config,
+            routing=routing,
         )
 
         # Supervisor definition
         self.restart_policy = RestartPolicy(
-            n_restart=3, restart_delay=5, reset_window=60
-        )  # Restart policy for processes
+            n_restart=3, restart_delay=0.1, reset_window=60, backoff=4.0, max_delay=5
+        )  # Restart policy for processes, retried after 0.1, 0.4 and 1.6 s
         self.supervisor = Supervisor(
-            logger=self.logger
+            logger=self.logger, metrics=self.metrics_collector
         )  # Supervisor for managing processes
         # Add processes to supervisor, will be started in order
         for sender in self.senders:
-            self.supervisor.add_process(sender, self.restart_policy)
+            self.supervisor.add_process(sender, self.restart_policy, watchdog)
         for worker in self.workers:
-            self.supervisor.add_process(worker, self.restart_policy)
-        self.supervisor.add_process(self.producer, self.restart_policy)
+            self.supervisor.add_process(worker, self.restart_policy, watchdog)
+        self.supervisor.add_process(self.producer, self.restart_policy, watchdog)
 
     def event_loop(self):
         """Start main event loop"""
-        self.supervisor.start_all_processes(delay=0.3)
+        if self.trace_collector is not None:
+            self.trace_collector.start()
+        if self.metrics_collector is not None:
+            self.metrics_collector.start()
+        # Workers and senders find each other regardless of the order in
+        # which they bind and connect. The producer starts reading from the
+        # source once they are ready to take events.
+        self.supervisor.start_stages(
+            [self.senders + list(self.workers), [self.producer]]
+        )
         self.supervisor.monitor_processes()
+        if self.autoscale is not None:
+            self.supervisor.autoscale(
+                self.autoscale,
+                self.workers,
+                self._create_worker,
+                self.restart_policy,
+                self.watchdog,
+            )
 
-    def stop(self):
+    def _create_worker(self) -> Worker:
+        """Return a new worker with the next free id."""
+        worker = Worker(
+            logger=self.logger,
+            comms_factory=self.comms_factory,
+            input_comms_config=self.worker_input_comms_config,
+            output_comms_config=self.worker_output_comms_config,
+            analyzer=self.analyzer,
+            sink_connector=self.sink_connector,
+            n_senders=self.n_senders,
+            worker_id=self._next_worker_id,
+            batch_size=self.batch_size,
+            batch_timeout=self.batch_timeout,
+            input_backpressure=self.input_backpressure,
+            output_backpressure=self.output_backpressure,
+            max_age=self.max_age,
+            routes=self.routes,
+            metrics_comms_config=self.metrics_comms_config,
+            watchdog=self.watchdog,
+            errors=self.errors,
+        )
+        self._next_worker_id += 1
+        return worker
+
+    def latency_stats(self, per_process: bool = False) -> Dict[str, Any]:
+        """
+        Latency of the pipeline stages since the event loop was started.
+
+        Requires ``tracing=True``. The senders push their statistics once
+        per second.
+
+        Parameters
+        ----------
+        per_process : bool, default False
+            If True, return the statistics separately for every sender
+
+        Returns
+        -------
+        dict
+            For every stage the number of events and the mean, p50, p90,
+            p99 and maximum time in seconds spent in it
+        """
+        if self.trace_collector is None:
+            raise RuntimeError("Latency statistics require tracing=True")
+        return self.trace_collector.snapshot(per_process)
+
+    def metrics(self) -> str:
+        """
+        Runtime metrics of all processes in the Prometheus text format.
+
+        Requires ``metrics_port``. This is what the HTTP endpoint serves.
+
+        Returns
+        -------
+        str
+            Counters summed over restarts of the processes, the analysis
+            time histograms and the estimated queue depth per hop
+        """
+        if self.metrics_collector is None:
+            raise RuntimeError("Metrics require a metrics_port")
+        return self.metrics_collector.text()
+
+    def stop(self, drain: bool = False, timeout: float = 5.0):
+        """Stop the pipeline.
+
+        Parameters
+        ----------
+        drain : bool, default False
+            If True, the producer stops reading from the source, the workers
+            finish the events that were sent to them and the senders pass on
+            all messages before the processes exit. Otherwise the processes
+            are terminated right away and queued events are lost. Senders
+            still close their sink connectors, which write out buffered data.
+        timeout : float, default 5.0
+            Time in seconds the pipeline has to drain, processes that are
+            still running afterwards are terminated
+        """
+        if drain:
+            self.supervisor.drain(
+                [[self.producer], list(self.workers), self.senders], timeout
+            )
         self.supervisor.stop()
+        if self.trace_collector is not None:
+            self.trace_collector.stop()
+        if self.metrics_collector is not None:
+            self.metrics_collector.stop()
+        self.comms_factory.close()
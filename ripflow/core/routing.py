@@ -0,0 +1,283 @@
+from bisect import bisect, insort
+from typing import Any, Callable, Dict, List, Set, Union
+import errno
+import hashlib
+import logging
+import zmq
+
+# Control messages a worker sends to the producer when it joins and leaves.
+# BYE is followed by a token, which the producer sends back once it stopped
+# routing events to the worker.
+READY = b"READY"
+BYE = b"BYE"
+
+# Time in seconds a leaving worker waits for the producer to answer BYE
+LEAVE_TIMEOUT = 1.0
+
+# Time in seconds after which an idle worker announces itself again, so that
+# a restarted producer learns about it
+ANNOUNCE_INTERVAL = 1.0
+
+# Time in milliseconds the producer waits for room in the queue of the worker
+# that owns a key before it tries again
+FULL_POLL = 1
+
+
+class RoutingPolicy:
+    """
+    Which worker an event is sent to.
+
+    Events with the same key always go to the same worker as long as the
+    set of workers does not change, so that analyzers can keep per-key state
+    in memory. Keys are mapped to workers by consistent hashing: when a
+    worker crashes, retires or is added, only the keys of that worker move.
+
+    Parameters
+    ----------
+    key : str or callable
+        Field of the event data whose value is the key, or a function that
+        returns the key of the data of an event. Events without a key are
+        spread over the workers.
+    virtual_nodes : int, default 64
+        Number of points of every worker on the hash ring. More points
+        spread the keys more evenly.
+    """
+
+    def __init__(self, key: Union[str, Callable[[Any], Any]], virtual_nodes: int = 64):
+        if virtual_nodes < 1:
+            raise ValueError("virtual_nodes must be at least 1")
+        self._key = key
+        self._virtual_nodes = virtual_nodes
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def virtual_nodes(self):
+        return self._virtual_nodes
+
+    def key_of(self, data: Any) -> Any:
+        """Return the key of an event, None if it has none."""
+        if callable(self.key):
+            return self.key(data)
+        if isinstance(data, dict):
+            return data.get(self.key)
+        return None
+
+
+class HashRing(object):
+    """
+    Consistent hash ring that maps keys to nodes.
+
+    Every node is placed on the ring at `virtual_nodes` points. A key
+    belongs to the node of the first point at or after the hash of the key,
+    so adding or removing a node only moves keys from or to that node.
+    """
+
+    def __init__(self, virtual_nodes: int = 64) -> None:
+        self.virtual_nodes = virtual_nodes
+        self._points: List[int] = []
+        self._owners: Dict[int, bytes] = {}
+        self._nodes: Set[bytes] = set()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: bytes) -> bool:
+        return node in self._nodes
+
+    def add(self, node: bytes) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for point in self._node_points(node):
+            if point not in self._owners:
+                self._owners[point] = node
+                insort(self._points, point)
+
+    def remove(self, node: bytes) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        for point in self._node_points(node):
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.remove(point)
+
+    def get(self, key: Any) -> bytes:
+        """Return the node that owns `key`."""
+        if not self._points:
+            raise LookupError("The hash ring is empty")
+        idx = bisect(self._points, _hash(str(key).encode()))
+        return self._owners[self._points[idx % len(self._points)]]
+
+    def _node_points(self, node: bytes) -> List[int]:
+        return [_hash(node + b"#%d" % i) for i in range(self.virtual_nodes)]
+
+
+class Router(object):
+    """
+    Sends events through a ROUTER socket to the workers, round-robin.
+
+    Workers connect with a DEALER socket whose identity is their name and
+    announce themselves with `READY`. A worker leaves with `BYE` and a
+    token: the producer stops routing to it and sends the token back, which
+    reaches the worker after all events that were routed to it. Workers
+    that are gone without saying goodbye are dropped when the socket
+    reports that they are no longer connected. Restarted workers join
+    again. Like a PUSH socket, the router skips workers whose queue is full.
+
+    Parameters
+    ----------
+    socket : zmq.Socket
+        ROUTER socket with ``ROUTER_MANDATORY`` set
+    send_object : callable
+        Sends the event itself, after the identity frame
+    logger : logging.Logger
+        Logger for workers that join and leave
+    """
+
+    def __init__(
+        self,
+        socket: zmq.Socket,
+        send_object: Callable[[zmq.Socket, Any, int], None],
+        logger: logging.Logger,
+    ) -> None:
+        self.socket = socket
+        self.send_object = send_object
+        self.logger = logger
+        self.nodes: List[bytes] = []
+        self._cursor = 0
+
+    def send(self, obj: Any, flags: int = 0) -> None:
+        """Send an event, raises zmq.Again if it cannot be sent right now."""
+        while True:
+            self.poll(0)
+            if not self.nodes:
+                if flags & zmq.NOBLOCK:
+                    raise zmq.Again()
+                # Wait for a worker to join
+                self.poll(100)
+                continue
+            for node in self._candidates(obj):
+                try:
+                    self.socket.send(node, zmq.NOBLOCK | zmq.SNDMORE)
+                except zmq.Again:
+                    # The queue of this worker is full
+                    continue
+                except zmq.ZMQError as e:
+                    if e.errno != errno.EHOSTUNREACH:
+                        raise
+                    self._leave(node, "disconnected")
+                    break
+                self.send_object(self.socket, obj, 0)
+                self._cursor = self.nodes.index(node) + 1
+                return
+            else:
+                if flags & zmq.NOBLOCK:
+                    raise zmq.Again()
+                # Workers may leave while the event waits
+                self._wait_for_room()
+
+    def poll(self, timeout: int) -> None:
+        """Handle the control messages of the workers."""
+        while self.socket.poll(timeout):
+            node, msg, *token = self.socket.recv_multipart()
+            if msg == READY:
+                self._join(node)
+            elif msg == BYE:
+                self._leave(node, "left")
+                self._acknowledge(node, token[0] if token else b"")
+            timeout = 0
+
+    def _wait_for_room(self) -> None:
+        """Wait until a worker has room in its queue or sent a message."""
+        # With ROUTER_MANDATORY the socket is writable if any worker has room
+        self.socket.poll(100, zmq.POLLIN | zmq.POLLOUT)
+
+    def _candidates(self, obj: Any) -> List[bytes]:
+        """Workers to try for an event, in order of preference."""
+        start = self._cursor % len(self.nodes)
+        return self.nodes[start:] + self.nodes[:start]
+
+    def _join(self, node: bytes) -> None:
+        if node not in self.nodes:
+            self.nodes.append(node)
+            self.logger.info(
+                f"Producer: {node.decode()} joined, routing to "
+                f"{len(self.nodes)} workers"
+            )
+
+    def _leave(self, node: bytes, reason: str) -> None:
+        if node in self.nodes:
+            self.nodes.remove(node)
+            self.logger.info(
+                f"Producer: {node.decode()} {reason}, routing to "
+                f"{len(self.nodes)} workers"
+            )
+
+    def _acknowledge(self, node: bytes, token: bytes) -> None:
+        """Tell a leaving worker that no more events are routed to it."""
+        try:
+            self.socket.send(node, zmq.NOBLOCK | zmq.SNDMORE)
+        except zmq.ZMQError:
+            # Gone or stuck, the worker stops waiting for the answer itself
+            return
+        self.send_object(self.socket, token, 0)
+
+
+class KeyedRouter(Router):
+    """
+    Sends events through a ROUTER socket to the worker that owns their key.
+
+    Workers join and leave as with `Router`, and are placed on a hash ring.
+    An event waits for room in the queue of the worker that owns its key
+    instead of going to another worker.
+
+    Parameters
+    ----------
+    policy : RoutingPolicy
+        Selects the key of an event
+    socket : zmq.Socket
+        ROUTER socket with ``ROUTER_MANDATORY`` set
+    send_object : callable
+        Sends the event itself, after the identity frame
+    logger : logging.Logger
+        Logger for changes of the ring
+    """
+
+    def __init__(
+        self,
+        policy: RoutingPolicy,
+        socket: zmq.Socket,
+        send_object: Callable[[zmq.Socket, Any, int], None],
+        logger: logging.Logger,
+    ) -> None:
+        super().__init__(socket, send_object, logger)
+        self.policy = policy
+        self.ring = HashRing(policy.virtual_nodes)
+
+    def _candidates(self, obj: Any) -> List[bytes]:
+        meta, data = obj
+        key = self.policy.key_of(data)
+        if key is None:
+            key = meta["seq"]
+        return [self.ring.get(key)]
+
+    def _wait_for_room(self) -> None:
+        # Other workers may have room while the owner of the key has none
+        self.poll(FULL_POLL)
+
+    def _join(self, node: bytes) -> None:
+        self.ring.add(node)
+        super()._join(node)
+
+    def _leave(self, node: bytes, reason: str) -> None:
+        self.ring.remove(node)
+        super()._leave(node, reason)
+
+
+def _hash(value: bytes) -> int:
+    """Hash that is stable across processes, unlike the builtin hash."""
+    return int.from_bytes(hashlib.md5(value).digest()[:8], "big")
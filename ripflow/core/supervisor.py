@@ -1,17 +1,61 @@
 from ripflow.core.utils import Child
+from ripflow.core.metrics import MetricsCollector, key
+from ripflow.core.watchdog import RECYCLE_EXIT_CODE, WatchdogPolicy
 import logging
-from typing import Dict
+import math
+import os
+from typing import Callable, Dict, List, Optional, Sequence
 
 import time
-from datetime import datetime, timedelta
-from threading import Thread, Event
+from multiprocessing import Pipe
+from multiprocessing.connection import wait
+from threading import Event, RLock, Thread
+
+# Time in seconds between two checks whether a starting process exited
+READY_POLL = 0.01
 
 
 class RestartPolicy:
-    def __init__(self, n_restart: int, restart_delay: int, reset_window: int):
+    """
+    How often and how soon a crashed process is restarted.
+
+    The n-th restart within the reset window is delayed by
+    ``restart_delay * backoff ** (n - 1)`` seconds, at most `max_delay`.
+    Once a process used up its restarts, the next restart waits until the
+    reset window is over, unless `give_up` is set.
+
+    Parameters
+    ----------
+    n_restart : int
+        Number of restarts within `reset_window`
+    restart_delay : float
+        Delay in seconds of the first restart
+    reset_window : float
+        Time in seconds after which the restart count is reset
+    backoff : float, default 2.0
+        Factor by which the delay grows with every restart
+    max_delay : float, default 60.0
+        Upper bound of the delay in seconds
+    give_up : bool, default False
+        If True, a process that used up its restarts is not restarted again
+        and no longer supervised
+    """
+
+    def __init__(
+        self,
+        n_restart: int,
+        restart_delay: float,
+        reset_window: float,
+        backoff: float = 2.0,
+        max_delay: float = 60.0,
+        give_up: bool = False,
+    ):
         self._n_restart = n_restart
         self._restart_delay = restart_delay
         self._reset_window = reset_window
+        self._backoff = backoff
+        self._max_delay = max_delay
+        self._give_up = give_up
 
     @property
     def n_restart(self):
@@ -25,38 +69,248 @@ class RestartPolicy:
     def reset_window(self):
         return self._reset_window
 
+    @property
+    def backoff(self):
+        return self._backoff
+
+    @property
+    def max_delay(self):
+        return self._max_delay
+
+    @property
+    def give_up(self):
+        return self._give_up
+
+    def delay(self, restart_count: int) -> float:
+        """Delay of the restart after `restart_count` previous restarts."""
+        return min(self.restart_delay * self.backoff**restart_count, self.max_delay)
+
+
+class AutoscalePolicy:
+    """
+    When to add or retire workers.
+
+    The load is the number of workers that would be busy all the time, the
+    arrival rate of events times the mean analysis time per event. Workers
+    are added when the load exceeds `target_utilization` per worker or more
+    than `max_backlog` events wait for a worker. A worker is retired when the
+    utilization is below `scale_down_utilization`, nothing is queued and the
+    remaining workers would still stay below the target, so that the
+    pipeline does not oscillate between two sizes. A retired worker asks
+    the producer to stop sending it events and finishes the ones that were
+    already on their way before it exits, so no event is lost.
+
+    Parameters
+    ----------
+    min_workers : int, default 1
+        Lower bound of the number of workers
+    max_workers : int, optional
+        Upper bound of the number of workers, the number of CPUs by default
+    target_utilization : float, default 0.7
+        Fraction of the time a worker should be busy
+    scale_down_utilization : float, default 0.4
+        Utilization below which a worker is retired
+    max_backlog : int, default 100
+        Number of queued events above which a worker is added
+    cooldown : float, default 10.0
+        Time in seconds after a change before the next decision
+    interval : float, default 5.0
+        Time in seconds between two decisions. The load is averaged over
+        this interval, so it should span several metrics reports.
+    drain_timeout : float, default 10.0
+        Time in seconds a retired worker has to finish its events before it
+        is terminated
+    """
+
+    def __init__(
+        self,
+        min_workers: int = 1,
+        max_workers: Optional[int] = None,
+        target_utilization: float = 0.7,
+        scale_down_utilization: float = 0.4,
+        max_backlog: int = 100,
+        cooldown: float = 10.0,
+        interval: float = 5.0,
+        drain_timeout: float = 10.0,
+    ):
+        if max_workers is None:
+            max_workers = max(os.cpu_count() or 1, min_workers)
+        if not 1 <= min_workers <= max_workers:
+            raise ValueError("Need 1 <= min_workers <= max_workers")
+        if not 0 < scale_down_utilization < target_utilization:
+            raise ValueError("Need 0 < scale_down_utilization < target_utilization")
+        self._min_workers = min_workers
+        self._max_workers = max_workers
+        self._target_utilization = target_utilization
+        self._scale_down_utilization = scale_down_utilization
+        self._max_backlog = max_backlog
+        self._cooldown = cooldown
+        self._interval = interval
+        self._drain_timeout = drain_timeout
+
+    @property
+    def min_workers(self):
+        return self._min_workers
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    @property
+    def target_utilization(self):
+        return self._target_utilization
+
+    @property
+    def scale_down_utilization(self):
+        return self._scale_down_utilization
+
+    @property
+    def max_backlog(self):
+        return self._max_backlog
+
+    @property
+    def cooldown(self):
+        return self._cooldown
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def drain_timeout(self):
+        return self._drain_timeout
+
+    def desired_workers(self, n_workers: int, load: float, backlog: float) -> int:
+        """
+        Number of workers for the observed load and backlog.
+
+        Parameters
+        ----------
+        n_workers : int
+            Current number of workers
+        load : float
+            Arrival rate times mean analysis time per event
+        backlog : float
+            Number of events waiting for a worker
+        """
+        if n_workers < self.min_workers:
+            return self.min_workers
+        utilization = load / n_workers
+        if utilization > self.target_utilization or backlog > self.max_backlog:
+            needed = math.ceil(load / self.target_utilization)
+            return min(max(needed, n_workers + 1), self.max_workers)
+        if (
+            n_workers > self.min_workers
+            # The backlog is approximate, it only keeps the pipeline from
+            # shrinking while it catches up. Retiring is safe regardless.
+            and backlog < 1
+            and utilization < self.scale_down_utilization
+            and load / (n_workers - 1) < self.target_utilization
+        ):
+            return n_workers - 1
+        return min(n_workers, self.max_workers)
+
 
 class Supervisor(object):
-    def __init__(self, logger: logging.Logger):
+    """
+    Starts child processes and restarts them when they exit unexpectedly.
+
+    A single monitor thread waits on the sentinels of all processes, so an
+    exit is noticed right away. Restarts are scheduled according to the
+    restart policy of the process and never block the monitor. Processes
+    with a watchdog policy are killed and restarted when their heartbeat
+    shows that they are stuck in a stage, and workers that exit to be
+    recycled are relaunched at once without using up their restarts.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        Logger for lifecycle messages
+    metrics : MetricsCollector, optional
+        If given, restarts are counted and workers can be autoscaled
+    """
+
+    def __init__(
+        self, logger: logging.Logger, metrics: Optional[MetricsCollector] = None
+    ):
         self._processes: Dict[Child, Dict] = (
             {}
         )  # Stores Child processes with their policies and metadata
+        self._lock = RLock()
         self.logger = logger
+        self.metrics = metrics  # Counts restarts, if given
+        self._monitor: Optional[Thread] = None
+        self._monitor_stop = Event()
+        # Wakes up the monitor when the set of processes changes
+        self._wakeup_receiver, self._wakeup_sender = Pipe(duplex=False)
+        self._autoscaler: Optional[Thread] = None
+        self._autoscaler_stop = Event()
 
-    def add_process(self, process: Child, policy: RestartPolicy):
+    def add_process(
+        self,
+        process: Child,
+        policy: RestartPolicy,
+        watchdog: Optional[WatchdogPolicy] = None,
+    ):
         """
         Adds a process to the supervisor with a specified restart policy.
         """
-        self._processes[process] = {
-            "policy": policy,
-            "restart_count": 0,
-            "last_restart": None,
-            "reset_timer": datetime.now(),
-            "thread": None,  # Placeholder for the monitoring thread
-            "stop_event": Event(),  # Event to signal the monitoring thread to stop
-        }
+        with self._lock:
+            self._processes[process] = {
+                "policy": policy,
+                "watchdog": watchdog,
+                "restart_count": 0,
+                "last_restart": None,
+                "reset_timer": time.monotonic(),
+                "restart_at": None,  # Set while a restart is scheduled
+                "retire_deadline": None,  # Set while the process drains
+            }
+        self._wake_up()
 
     def start_all_processes(self, delay: float = 0):
         """
         Starts all managed child processes.
         """
-        for process in self._processes.keys():
+        for process in list(self._processes.keys()):
             self.start_process(process)
             time.sleep(delay)
 
+    def start_stages(self, stages: Sequence[Sequence[Child]], timeout: float = 10.0):
+        """
+        Starts processes stage by stage.
+
+        The processes of a stage are launched together. The next stage is
+        launched once all of them reported that they are ready, or after
+        `timeout` seconds.
+
+        Parameters
+        ----------
+        stages : sequence of sequences of Child
+            Processes in the order in which they have to be ready
+        timeout : float, default 10.0
+            Time in seconds to wait for the processes of a stage
+        """
+        for stage in stages:
+            for process in stage:
+                self.start_process(process)
+            deadline = time.monotonic() + timeout
+            for process in stage:
+                if not self._wait_ready(process, deadline):
+                    self.logger.warning(
+                        f"Supervisor: Process {process} is not ready "
+                        f"after {timeout} s."
+                    )
+
+    def _wait_ready(self, process: Child, deadline: float) -> bool:
+        """Wait until a process is ready, give up if it exits."""
+        while not process.ready.wait(READY_POLL):
+            if time.monotonic() >= deadline or not process.is_alive():  # type: ignore
+                return False
+        return True
+
     def start_process(self, process: Child):
         """
-        Starts a single child process and initializes its monitoring thread.
+        Starts a single child process.
         """
         # Ensure the process isn't already running
         if not process.is_alive():  # type: ignore
@@ -64,79 +318,352 @@ class Supervisor(object):
             self.logger.info(f"Supervisor: Process {process} started.")
         else:
             self.logger.info(f"Supervisor: Process {process} is already running.")
+        self._wake_up()
 
     def _reset_restart_count(self, process: Child):
         """
         Resets the restart count for a process based on the reset_window.
         """
         process_info = self._processes[process]
-        if datetime.now() >= process_info["reset_timer"]:
+        if time.monotonic() >= process_info["reset_timer"]:
             process_info["restart_count"] = 0
-            process_info["reset_timer"] = datetime.now() + timedelta(
-                seconds=process_info["policy"].reset_window
+            process_info["reset_timer"] = (
+                time.monotonic() + process_info["policy"].reset_window
             )
 
     def restart_process(self, process: Child):
         """
-        Attempts to restart a process according to its restart policy.
+        Schedules the restart of a process according to its restart policy.
+
+        A process that used up its restarts within the reset window is
+        restarted once the window is over, or given up if the policy says so.
         """
-        process_info = self._processes[process]
-        policy = process_info["policy"]
+        with self._lock:
+            process_info = self._processes[process]
+            policy = process_info["policy"]
 
+            self._reset_restart_count(process)
+
+            if process_info["restart_count"] < policy.n_restart:
+                delay = policy.delay(process_info["restart_count"])
+                process_info["restart_at"] = time.monotonic() + delay
+                self.logger.info(
+                    f"Supervisor: Restarting process {process} in {delay:.2f} s."
+                )
+            elif policy.give_up:
+                # No longer supervised
+                del self._processes[process]
+                self.logger.error(
+                    f"Process {process} reached maximum restart limit, giving up."
+                )
+            else:
+                # Try again once the restart count is reset
+                process_info["restart_at"] = process_info["reset_timer"]
+                self.logger.error(
+                    f"Process {process} reached maximum restart limit, restarting "
+                    f"in {process_info['reset_timer'] - time.monotonic():.0f} s."
+                )
+        self._wake_up()
+
+    def _launch_scheduled(self, process: Child):
+        process_info = self._processes[process]
+        process_info["restart_at"] = None
         self._reset_restart_count(process)
+        process.launch()  # type: ignore
+        process_info["restart_count"] += 1
+        process_info["last_restart"] = time.monotonic()
+        self._count("ripflow_restarts_total", process)
+        self.logger.info(
+            f"Process {process} restarted. Count: {process_info['restart_count']}"
+        )
 
-        if process_info["restart_count"] < policy.n_restart:
-            time.sleep(policy.restart_delay)  # Wait before restarting
-            process.launch()  # type: ignore
-            process_info["restart_count"] += 1
-            process_info["last_restart"] = datetime.now()
-            self.logger.info(
-                f"Process {process} restarted. Count: {process_info['restart_count']}"
-            )
-        else:
-            self.logger.info(f"Process {process} reached maximum restart limit.")
+    def _count(self, name: str, process: Child):
+        if self.metrics is not None:
+            self.metrics.inc(name, process=getattr(process, "name", str(process)))
 
     def stop_process(self, process: Child):
         """
         Stops a given process.
         """
+        with self._lock:
+            # No longer supervised, its exit is not a crash
+            self._processes.pop(process, None)
+        self._wake_up()
         process.stop()  # type: ignore
-        if process in self._processes:
-            process_info = self._processes[process]
-            process_info["stop_event"].set()  # Signal monitoring thread to stop
-            if process_info["thread"]:
-                process_info["thread"].join()  # Wait for monitoring thread to finish
+
+    def retire_process(self, process: Child, timeout: float):
+        """
+        Asks a process to finish its work and exit, without restarting it.
+
+        The process is terminated if it did not exit after `timeout` seconds.
+        """
+        with self._lock:
+            process_info = self._processes.get(process)
+            if process_info is None:
+                # Given up after too many restarts, it is not running
+                return
+            process_info["retire_deadline"] = time.monotonic() + timeout
+            process.retire()  # type: ignore
+        self.logger.info(f"Supervisor: Retiring process {process}.")
+        self._wake_up()
+
+    def _wake_up(self):
+        self._wakeup_sender.send_bytes(b"")
+
+    def _monitor_loop(self):
+        """
+        Waits for processes to exit and for restarts and retirements to be due.
+        """
+        while not self._monitor_stop.is_set():
+            with self._lock:
+                # Also catches processes that exited before the monitor started
+                for process, process_info in list(self._processes.items()):
+                    self._check_process(process, process_info)
+                sentinels = [self._wakeup_receiver]
+                deadlines = []
+                for process, process_info in self._processes.items():
+                    # A process that exits right after the check is noticed
+                    # through its sentinel, which stays ready once it exited
+                    launched = process.process is not None  # type: ignore
+                    if launched and process_info["restart_at"] is None:
+                        sentinels.append(process.process.sentinel)  # type: ignore
+                    if process.is_alive():  # type: ignore
+                        watchdog = process_info["watchdog"]
+                        if watchdog is not None and watchdog.timeouts:
+                            deadlines.append(time.monotonic() + watchdog.interval)
+                    for deadline in ("restart_at", "retire_deadline"):
+                        if process_info[deadline] is not None:
+                            deadlines.append(process_info[deadline])
+            timeout = None
+            if deadlines:
+                timeout = max(min(deadlines) - time.monotonic(), 0)
+            wait(sentinels, timeout)
+            while self._wakeup_receiver.poll():
+                self._wakeup_receiver.recv_bytes()
+
+    def _check_process(self, process: Child, process_info: Dict):
+        now = time.monotonic()
+        if process_info["retire_deadline"] is not None:
+            if process.is_alive() and now < process_info["retire_deadline"]:  # type: ignore
+                return
+            # Exited or overdue, terminate it if necessary
+            process.stop()  # type: ignore
             del self._processes[process]
+            self.logger.info(f"Supervisor: Process {process} retired.")
+        elif process_info["restart_at"] is not None:
+            if now >= process_info["restart_at"]:
+                self._launch_scheduled(process)
+        elif process.process is not None:  # type: ignore
+            if process.is_alive() and not self._kill_if_stuck(process):  # type: ignore
+                return
+            if process.process.exitcode == RECYCLE_EXIT_CODE:  # type: ignore
+                process.launch()  # type: ignore
+                self._count("ripflow_recycles_total", process)
+                self.logger.info(f"Supervisor: Process {process} recycled.")
+                return
+            self.logger.info(f"Supervisor: Process {process} stopped unexpectedly.")
+            self.restart_process(process)
 
-    def _monitor_process(self, process: Child):
+    def _kill_if_stuck(self, process: Child) -> bool:
         """
-        Monitors a process and restarts it if it stops unexpectedly.
+        Kills a process that exceeded a stage timeout, returns if it did.
         """
-        stop_event = self._processes[process]["stop_event"]
-        while not stop_event.is_set():
-            if not process.is_alive():  # type: ignore
-                self.logger.info(f"Supervisor: Process {process} stopped unexpectedly.")
-                self.restart_process(process)
-            time.sleep(1)  # Polling interval
+        watchdog = self._processes[process]["watchdog"]
+        if watchdog is None:
+            return False
+        overdue = watchdog.overdue(process.heartbeat)
+        if overdue is None:
+            return False
+        stage, elapsed, event = overdue
+        self.logger.error(
+            f"Supervisor: Process {process} stuck in {stage} for "
+            f"{elapsed:.1f} s at event {event}, killing it."
+        )
+        self._count("ripflow_watchdog_kills_total", process)
+        process.process.kill()  # type: ignore
+        process.process.join()  # type: ignore
+        return True
 
     def monitor_processes(self):
         """
-        Starts monitoring threads for all managed processes.
+        Starts the monitoring thread for all managed processes.
         """
-        for process in self._processes.keys():
-            if not self._processes[process]["thread"]:
-                thread = Thread(target=self._monitor_process, args=(process,))
-                thread.start()
-                self._processes[process]["thread"] = thread
-                self.logger.info(
-                    f"Supervisor: Monitoring thread for process {process} started."
+        if self._monitor is None:
+            self._monitor_stop.clear()
+            self._monitor = Thread(target=self._monitor_loop, daemon=True)
+            self._monitor.start()
+            self.logger.info("Supervisor: Monitoring thread started.")
+        else:
+            self._wake_up()
+
+    def autoscale(
+        self,
+        policy: AutoscalePolicy,
+        workers: List[Child],
+        create_worker: Callable[[], Child],
+        restart_policy: RestartPolicy,
+        watchdog: Optional[WatchdogPolicy] = None,
+    ):
+        """
+        Adds and retires workers according to `policy`.
+
+        Requires a metrics collector, the load is estimated from the events
+        the producer received and the analysis time the workers reported.
+
+        Parameters
+        ----------
+        policy : AutoscalePolicy
+            When to scale
+        workers : list of Child
+            Running workers, updated in place
+        create_worker : callable
+            Returns a new worker that is not started yet
+        restart_policy : RestartPolicy
+            Restart policy of new workers
+        watchdog : WatchdogPolicy, optional
+            Watchdog policy of new workers
+        """
+        if self.metrics is None:
+            raise RuntimeError("Autoscaling requires a metrics collector")
+        self._autoscaler_stop.clear()
+        self._autoscaler = Thread(
+            target=self._autoscale,
+            args=(policy, workers, create_worker, restart_policy, watchdog),
+            daemon=True,
+        )
+        self._autoscaler.start()
+
+    def _autoscale(
+        self,
+        policy: AutoscalePolicy,
+        workers: List[Child],
+        create_worker: Callable[[], Child],
+        restart_policy: RestartPolicy,
+        watchdog: Optional[WatchdogPolicy],
+    ):
+        assert self.metrics is not None
+        arrivals = key(
+            "ripflow_events_received_total", process="producer", hop="source"
+        )
+        backlog_key = key("ripflow_queue_depth", hop="input")
+        last = None
+        analysis_per_event = 0.0
+        cooldown_end = 0.0
+        while not self._autoscaler_stop.wait(policy.interval):
+            if time.monotonic() < cooldown_end:
+                continue
+            counters, histograms = self.metrics.totals()
+            backlog = self.metrics.queue_depths(counters).get(backlog_key, 0)
+            analysis = sum(
+                h.sum
+                for (name, _), h in histograms.items()
+                if name == "ripflow_analysis_seconds"
+            )
+            analyzed = sum(
+                value
+                for (name, labels), value in counters.items()
+                if name == "ripflow_events_received_total"
+                and ("hop", "input") in labels
+            )
+            now = time.monotonic()
+            sample = (now, counters.get(arrivals, 0), analysis, analyzed)
+            if last is None:
+                last = sample
+                continue
+            elapsed = now - last[0]
+            rate = (sample[1] - last[1]) / elapsed
+            if sample[3] > last[3]:
+                analysis_per_event = (sample[2] - last[2]) / (sample[3] - last[3])
+            last = sample
+            load = rate * analysis_per_event
+            desired = policy.desired_workers(len(workers), load, backlog)
+            if desired == len(workers):
+                continue
+            self.logger.info(
+                f"Supervisor: Scaling from {len(workers)} to {desired} workers "
+                f"(load {load:.2f}, backlog {backlog:.0f})"
+            )
+            while len(workers) < desired:
+                worker = create_worker()
+                self.add_process(worker, restart_policy, watchdog)
+                self.start_process(worker)
+                workers.append(worker)
+            while len(workers) > desired:
+                self.retire_process(workers.pop(), policy.drain_timeout)
+            self.monitor_processes()
+            cooldown_end = time.monotonic() + policy.cooldown
+            last = None
+
+    def drain(self, stages: Sequence[Sequence[Child]], timeout: float = 5.0):
+        """
+        Shuts processes down without losing the events they hold.
+
+        The processes of each stage are asked to drain once the processes of
+        the previous stage have exited, so every stage receives all events
+        of the stage before it. Processes that have not exited when their
+        stage's time is up are terminated, and the next stage is drained
+        nonetheless.
+
+        Every stage may take at least an equal share of `timeout`, time that
+        a stage does not use is left to the stages after it. A stuck stage
+        thus cannot use up the time of the stages behind it.
+
+        Parameters
+        ----------
+        stages : sequence of sequences of Child
+            Processes in the order in which events pass them
+        timeout : float, default 5.0
+            Time in seconds for all stages together
+        """
+        self._stop_autoscaler()
+        deadline = time.monotonic() + timeout
+        share = timeout / max(len(stages), 1)
+        for i, stage in enumerate(stages):
+            # Keep the minimum share of each later stage in reserve
+            reserve = share * (len(stages) - i - 1)
+            stage_deadline = max(deadline - reserve, time.monotonic() + share)
+            with self._lock:
+                for process in stage:
+                    # No longer supervised, its exit is not a crash
+                    self._processes.pop(process, None)
+            self._wake_up()
+            for process in stage:
+                process.drain()
+            for process in stage:
+                if process.process is None:  # type: ignore
+                    continue
+                process.process.join(  # type: ignore
+                    max(stage_deadline - time.monotonic(), 0)
                 )
+                if process.is_alive():  # type: ignore
+                    self.logger.warning(
+                        f"Supervisor: Process {process} did not drain in time."
+                    )
+                    process.stop()  # type: ignore
+        self.logger.info("Supervisor: Processes drained.")
 
     def stop(self):
         """
         Stops all managed processes.
         """
-        # Create a list of keys to iterate over
-        processes_to_stop = list(self._processes.keys())
+        self._stop_autoscaler()
+        if self._monitor is not None:
+            self._monitor_stop.set()
+            self._wake_up()
+            self._monitor.join()
+            self._monitor = None
+        with self._lock:
+            processes_to_stop = list(self._processes.keys())
+            self._processes.clear()
+        # Signal all processes before waiting for any of them
         for process in processes_to_stop:
-            self.stop_process(process)
+            if process.is_alive():  # type: ignore
+                process.process.terminate()  # type: ignore
+        for process in processes_to_stop:
+            process.stop()  # type: ignore
+
+    def _stop_autoscaler(self):
+        if self._autoscaler is not None:
+            self._autoscaler_stop.set()
+            self._autoscaler.join()
+            self._autoscaler = None
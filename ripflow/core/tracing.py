@@ -0,0 +1,217 @@
+from bisect import bisect_right
+from typing import Any, Dict, Optional
+import logging
+import threading
+import time
+import zmq
+
+# Intervals between the timestamps that are attached to a traced event, in
+# the order in which they pass. "total" spans all of them.
+STAGES = {
+    "producer": ("receive", "enqueue"),
+    "input_queue": ("enqueue", "dequeue"),
+    "batch_wait": ("dequeue", "analysis_start"),
+    "analysis": ("analysis_start", "analysis_end"),
+    "serialize": ("analysis_end", "serialize"),
+    "output_queue": ("serialize", "sender_receive"),
+    "reorder": ("sender_receive", "sink_start"),
+    "sink": ("sink_start", "send"),
+    "total": ("receive", "send"),
+}
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of durations with logarithmic buckets.
+
+    There are `per_decade` buckets per factor of ten between 1 us and 100 s,
+    so percentiles are accurate to about 25 % of their value with the
+    default of 10.
+
+    Parameters
+    ----------
+    per_decade : int, default 10
+        Number of buckets per decade
+    """
+
+    def __init__(self, per_decade: int = 10):
+        self.per_decade = per_decade
+        self.edges = [
+            10 ** (k / per_decade) for k in range(-6 * per_decade, 2 * per_decade + 1)
+        ]
+        # One bucket below the first and one above the last edge
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        self.counts[bisect_right(self.edges, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile, the geometric center of its bucket."""
+        if not self.count:
+            return float("nan")
+        rank = q / 100 * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                break
+        if i == 0:
+            return self.edges[0]
+        if i == len(self.edges):
+            return self.max
+        return min((self.edges[i - 1] * self.edges[i]) ** 0.5, self.max)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else float("nan"),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Tracer(object):
+    """
+    Collects the stage latencies of traced events in a sender process.
+
+    The histograms are pushed to the `TraceCollector` when `poll` is called
+    at least `interval` seconds after the last push, and reset afterwards.
+    Pushing never blocks, if the collector does not keep up the latencies of
+    the interval are lost.
+
+    Parameters
+    ----------
+    socket : zmq.Socket
+        PUSH socket connected to the collector
+    name : str
+        Name of the process in the collected statistics
+    interval : float, default 1.0
+        Time in seconds between two pushes
+    """
+
+    def __init__(self, socket: zmq.Socket, name: str, interval: float = 1.0):
+        self.socket = socket
+        self.name = name
+        self.interval = interval
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._last_push = time.monotonic()
+
+    def record(self, trace: Dict[str, float]) -> None:
+        """Record the stages of an event whose timestamps are in `trace`."""
+        for stage, (start, end) in STAGES.items():
+            if start in trace and end in trace:
+                if stage not in self.histograms:
+                    self.histograms[stage] = LatencyHistogram()
+                self.histograms[stage].record(trace[end] - trace[start])
+
+    def poll(self) -> None:
+        """Push the histograms if the interval has passed."""
+        if time.monotonic() - self._last_push >= self.interval:
+            self.push()
+
+    def push(self) -> None:
+        self._last_push = time.monotonic()
+        if not self.histograms:
+            return
+        try:
+            self.socket.send_pyobj((self.name, self.histograms), flags=zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+        self.histograms = {}
+
+
+class TraceCollector(object):
+    """
+    Merges the histograms pushed by the tracers of all senders.
+
+    Runs a background thread in the main process that receives on `address`.
+
+    Parameters
+    ----------
+    address : str
+        ZMQ address to bind the PULL socket to
+    logger : logging.Logger
+        Logger for errors of the collector thread
+    """
+
+    def __init__(self, address: str, logger: logging.Logger):
+        self.address = address
+        self.logger = logger
+        self.histograms: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._collect, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def snapshot(self, per_process: bool = False) -> Dict[str, Any]:
+        """Return the statistics of all stages since the pipeline started.
+
+        Parameters
+        ----------
+        per_process : bool, default False
+            If True, return the statistics per sender process
+        """
+        with self._lock:
+            if per_process:
+                return {
+                    name: {stage: h.summary() for stage, h in stages.items()}
+                    for name, stages in self.histograms.items()
+                }
+            merged: Dict[str, LatencyHistogram] = {}
+            for stages in self.histograms.values():
+                for stage, histogram in stages.items():
+                    merged.setdefault(stage, LatencyHistogram()).merge(histogram)
+        return {stage: merged[stage].summary() for stage in STAGES if stage in merged}
+
+    def _collect(self) -> None:
+        context = zmq.Context()
+        socket = context.socket(zmq.PULL)
+        socket.bind(self.address)
+        try:
+            while not self._stop.is_set():
+                if not socket.poll(100):
+                    continue
+                name, histograms = socket.recv_pyobj()
+                with self._lock:
+                    stages = self.histograms.setdefault(name, {})
+                    for stage, histogram in histograms.items():
+                        stages.setdefault(stage, LatencyHistogram()).merge(histogram)
+        except Exception as e:
+            self.logger.error(f"Error in trace collector: {e}")
+        finally:
+            socket.close(linger=0)
+            context.term()
+
+
+def stamp(meta: Dict[str, Any], *stages: str) -> None:
+    """Record the current time for `stages` if the event is traced."""
+    trace: Optional[Dict[str, float]] = meta.get("trace")
+    if trace is not None:
+        now = time.monotonic()
+        for stage in stages:
+            trace[stage] = now
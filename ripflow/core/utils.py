@@ -1,8 +1,19 @@
 from abc import ABC, abstractmethod
-from multiprocessing import Process
+from contextlib import contextmanager
+from multiprocessing import Event, Process, shared_memory
+import fcntl
+import os
+import pickle
+import numpy as np
 import zmq
 import logging
-from typing import List, Any
+from .watchdog import Heartbeat
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+# Returned by `SharedMemoryFactory.recv_object` in place of an object whose
+# slots were reused before it arrived. Workers skip bytes like other control
+# messages.
+STALE = b"STALE"
 
 
 class CommsFactory(ABC):
@@ -18,12 +29,39 @@ class CommsFactory(ABC):
     def cleanup(self, context, sockets) -> None:
         pass
 
+    @abstractmethod
+    def send_object(self, socket, obj: Any, flags: int = 0) -> None:
+        pass
+
+    @abstractmethod
+    def recv_object(self, socket) -> Any:
+        pass
+
+    def release(self, obj: Any = None) -> None:
+        """Hand back resources held by a received object, or by all if None."""
+        pass
+
+    def close(self) -> None:
+        """Free resources shared by all processes, called on shutdown."""
+        pass
+
 
 class ZMQFactory(CommsFactory):
     """
     Factory class for zmq context and socket creation
+
+    Parameters
+    ----------
+    zero_copy : bool, default False
+        If True, objects are pickled with protocol 5 and every contiguous
+        buffer (e.g. the data of a NumPy array) is sent as its own ZMQ frame
+        without copying. Received arrays are views on the received frames.
+        If False, objects are sent as a single pickled frame.
     """
 
+    def __init__(self, zero_copy: bool = False) -> None:
+        self.zero_copy = zero_copy
+
     def create_context(self) -> zmq.Context:
         return zmq.Context()
 
@@ -42,10 +80,21 @@ class ZMQFactory(CommsFactory):
             raise ValueError(
                 "Either 'bind_address' or 'connect_address' must be provided"
             )
-        if socket_type not in [zmq.PUSH, zmq.PULL, zmq.PUB, zmq.SUB, zmq.REQ, zmq.REP]:
+        if socket_type not in [
+            zmq.PUSH,
+            zmq.PULL,
+            zmq.PUB,
+            zmq.SUB,
+            zmq.REQ,
+            zmq.REP,
+            zmq.ROUTER,
+            zmq.DEALER,
+        ]:
             raise ValueError(f"Invalid 'socket_type': {socket_type}")
 
         socket = context.socket(socket_type)
+        for option, value in kwargs.get("options", {}).items():
+            socket.setsockopt(option, value)
         if bind_address:
             socket.bind(bind_address)
         if connect_address:
@@ -57,6 +106,261 @@ class ZMQFactory(CommsFactory):
             socket.close()
         context.term()
 
+    def send_object(self, socket: zmq.Socket, obj: Any, flags: int = 0) -> None:
+        if not self.zero_copy:
+            socket.send_pyobj(obj, flags=flags)
+            return
+        buffers: List[pickle.PickleBuffer] = []
+        header = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        socket.send_multipart(
+            [header] + [b.raw() for b in buffers], flags=flags, copy=False
+        )
+
+    def recv_object(self, socket: zmq.Socket) -> Any:
+        if not self.zero_copy:
+            return socket.recv_pyobj()
+        frames = socket.recv_multipart(copy=False)
+        return pickle.loads(
+            frames[0].buffer, buffers=[frame.buffer for frame in frames[1:]]
+        )
+
+
+class SharedMemoryFactory(ZMQFactory):
+    """
+    Factory that moves large buffers through a shared memory slot ring
+
+    Buffers of at least ``min_size`` bytes are copied once into a free slot of
+    a ``multiprocessing.shared_memory`` segment by the sending process and only
+    the slot index travels over ZMQ. Receivers map the slot read-only, so
+    arrays are not copied again on their way into the workers. A slot returns
+    to the ring when the receiving process calls ``release(obj)`` with the
+    received object. Buffers that do
+    not fit into a slot, or that are sent while all slots are taken, fall back
+    to zero-copy ZMQ frames.
+
+    Every slot records the process that holds it, the sender while the
+    object is in transit and the receiver once it arrived. A slot that was
+    never released is only reclaimed after its holder exited, e.g. when the
+    worker holding it crashed, so a slot is never overwritten while it is
+    read. Slots of objects that are lost in transit stay taken as long as
+    the sender lives, their buffers fall back to ZMQ frames.
+
+    Every slot also counts how often it was claimed, and the count travels
+    with the slot index. A sender that restarts after a crash reclaims the
+    slots of objects that its previous process sent but that are still
+    queued at the receivers. `recv_object` returns `STALE` for such an
+    object instead of reading the new contents of the slot.
+
+    Only a single process (the producer) may send objects through the factory.
+    Received arrays are valid until they are released and have to be
+    copied if an analyzer keeps them beyond the current event.
+
+    Parameters
+    ----------
+    n_slots : int, default 16
+        Number of slots in the ring
+    slot_size : int, default 8 MiB
+        Size of a single slot in bytes
+    min_size : int, default 64 KiB
+        Smaller buffers are sent as ZMQ frames
+    """
+
+    def __init__(
+        self,
+        n_slots: int = 16,
+        slot_size: int = 2**23,
+        min_size: int = 2**16,
+    ) -> None:
+        super().__init__(zero_copy=True)
+        self.n_slots = n_slots
+        self.slot_size = slot_size
+        self.min_size = min_size
+        # Header with the pid of the process holding each slot, 0 if it is
+        # free, and the number of times each slot was claimed, followed by
+        # the slots
+        self._header_size = 16 * n_slots
+        self._shm: Optional[shared_memory.SharedMemory] = shared_memory.SharedMemory(
+            create=True, size=self._header_size + n_slots * slot_size
+        )
+        self._owner: Optional[int] = os.getpid()
+        self._header_view: Optional[np.ndarray] = None
+        self._cursor = 0
+        # Slots held by received objects, by object id
+        self._leases: Dict[int, List[int]] = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_owner"] = None
+        state["_header_view"] = None
+        state["_leases"] = {}
+        return state
+
+    @property
+    def _header(self) -> np.ndarray:
+        if self._header_view is None:
+            if self._shm is None:
+                raise RuntimeError("Shared memory factory is closed")
+            self._header_view = np.ndarray(
+                (2, self.n_slots), dtype=np.int64, buffer=self._shm.buf
+            )
+        return self._header_view
+
+    @property
+    def _claims(self) -> np.ndarray:
+        return self._header[0]
+
+    @property
+    def _generations(self) -> np.ndarray:
+        return self._header[1]
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize taking over slots between processes. The lock is
+        released by the system if its holder dies."""
+        fd = self._shm._fd  # type: ignore
+        fcntl.lockf(fd, fcntl.LOCK_EX, 1)
+        try:
+            yield
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1)
+
+    def _slot(self, slot: int, nbytes: int) -> memoryview:
+        if self._shm is None:
+            raise RuntimeError("Shared memory factory is closed")
+        offset = self._header_size + slot * self.slot_size
+        return self._shm.buf[offset : offset + nbytes]  # type: ignore
+
+    def _claim_slot(self) -> Optional[Tuple[int, int]]:
+        """Claim a slot, return its index and generation."""
+        claims = self._claims
+        order = [(self._cursor + i) % self.n_slots for i in range(self.n_slots)]
+        # Free slots first, holders are only checked when the ring is full
+        for slot in order:
+            if claims[slot] == 0:
+                return self._take(slot)
+        # A receiver may take over the object of a sender that exited
+        with self._locked():
+            for slot in order:
+                if not _alive(claims[slot]):
+                    return self._take(slot)
+        return None
+
+    def _take(self, slot: int) -> Tuple[int, int]:
+        # Receivers of objects that were sent through the slot before see
+        # the new generation from now on
+        self._generations[slot] += 1
+        self._claims[slot] = os.getpid()
+        self._cursor = slot + 1
+        return slot, int(self._generations[slot])
+
+    def send_object(self, socket: zmq.Socket, obj: Any, flags: int = 0) -> None:
+        buffers: List[pickle.PickleBuffer] = []
+        header = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        layout: List[Optional[Tuple[int, int, int]]] = []
+        inline: List[Any] = []
+        for buffer in buffers:
+            raw = buffer.raw()
+            claim = None
+            if self.min_size <= raw.nbytes <= self.slot_size:
+                claim = self._claim_slot()
+            if claim is None:
+                layout.append(None)
+                inline.append(raw)
+            else:
+                slot, generation = claim
+                self._slot(slot, raw.nbytes)[:] = raw
+                layout.append((slot, raw.nbytes, generation))
+        frames: List[Any] = [header, pickle.dumps(layout)]
+        try:
+            socket.send_multipart(frames + inline, flags=flags, copy=False)
+        except zmq.Again:
+            # Nothing was sent, hand the slots back to the ring
+            for entry in layout:
+                if entry is not None:
+                    self._claims[entry[0]] = 0
+            raise
+
+    def recv_object(self, socket: zmq.Socket) -> Any:
+        frames = socket.recv_multipart(copy=False)
+        layout = pickle.loads(frames[1].buffer)
+        inline = iter(frames[2:])
+        buffers = []
+        slots = [entry[0] for entry in layout if entry is not None]
+        if slots and not self._take_over(layout):
+            return STALE
+        for entry in layout:
+            if entry is None:
+                buffers.append(next(inline).buffer)
+            else:
+                slot, nbytes, _ = entry
+                buffers.append(self._slot(slot, nbytes).toreadonly())
+        obj = pickle.loads(frames[0].buffer, buffers=buffers)
+        if slots:
+            self._leases[id(obj)] = slots
+        return obj
+
+    def _take_over(self, layout: List[Optional[Tuple[int, int, int]]]) -> bool:
+        """Hold the slots of a received object, False if any was reclaimed."""
+        claims, generations = self._claims, self._generations
+        entries = [entry for entry in layout if entry is not None]
+        with self._locked():
+            current = [
+                slot
+                for slot, _, generation in entries
+                if generations[slot] == generation
+            ]
+            # Slots that were not reclaimed are freed if the object is stale
+            claims[current] = os.getpid() if len(current) == len(entries) else 0
+        return len(current) == len(entries)
+
+    def release(self, obj: Any = None) -> None:
+        if obj is not None:
+            leases = [self._leases.pop(id(obj), [])]
+        else:
+            leases = []
+            while self._leases:
+                leases.append(self._leases.popitem()[1])
+        claims = self._claims
+        for slots in leases:
+            for slot in slots:
+                claims[slot] = 0
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        self._header_view = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Arrays received in this process still reference the segment,
+            # the mapping is released together with the last of them
+            pass
+        if os.getpid() == self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+
+def _alive(pid: int) -> bool:
+    """Whether the process with id `pid` still exists."""
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        pass
+    return True
+
+
+def _log_handlers(logger: logging.Logger) -> List[logging.Handler]:
+    """Collect the handlers that records of ``logger`` are passed to."""
+    handlers = []
+    current: Optional[logging.Logger] = logger
+    while current is not None:
+        handlers.extend(current.handlers)
+        current = current.parent if current.propagate else None
+    return handlers
+
 
 class ProcessMetaclass(type):
     def __new__(cls, name, bases, attrs):
@@ -73,8 +377,27 @@ class ProcessMetaclass(type):
 
         def launch(self) -> None:
             if self.process is None or not self.process.is_alive():
+                # The previous process may have died halfway through an update
+                self.heartbeat.reset()
+                self.heartbeat.enter("idle")
+                self.draining.clear()
+                self.ready.clear()
                 self.process = Process(target=self.main_routine, daemon=True)
-                self.process.start()
+                # Processes are also forked from the supervisor thread. The
+                # logging module only re-creates the handler locks in the
+                # child, it does not wait for a record another thread is
+                # writing at that moment. The child would then inherit the
+                # buffer lock of the log file in a locked state and hang on
+                # its first log message. Holding the handler locks ensures
+                # that no thread is inside a handler during the fork.
+                handlers = _log_handlers(self.logger)
+                for handler in handlers:
+                    handler.acquire()
+                try:
+                    self.process.start()
+                finally:
+                    for handler in reversed(handlers):
+                        handler.release()
                 self.logger.info(f"{name} process launched")
 
         attrs["launch"] = launch
@@ -103,6 +426,16 @@ class Child(metaclass=ProcessMetaclass):
     def __init__(self, logger: logging.Logger, comms_factory: CommsFactory) -> None:
         self.logger = logger
         self.comms_factory = comms_factory
+        # Shared with the supervisor, which watches for hanging processes
+        self.heartbeat = Heartbeat()
+        # Set by the supervisor to shut the pipeline down without losing events
+        self.draining = Event()
+        # Set by the process once its sockets and connectors are set up
+        self.ready = Event()
+
+    def drain(self) -> None:
+        """Ask the process to pass on the events it holds and exit."""
+        self.draining.set()
 
     def main_routine(self):
         # To be implemented by subclasses
@@ -0,0 +1,130 @@
+from multiprocessing import RawArray
+from typing import Dict, Optional, Tuple
+import resource
+import time
+
+# Exit code of a worker that ends itself to be replaced by a fresh process
+RECYCLE_EXIT_CODE = 75
+
+# Stages a child reports in its heartbeat. "idle" is waiting for input,
+# "source" is waiting for the source connector in the producer.
+STAGES = ("idle", "source", "analysis", "serialize", "send", "sink")
+
+# Attempts to read a consistent heartbeat before the last read is returned
+READ_RETRIES = 1000
+
+
+class Heartbeat(object):
+    """
+    Current stage of a child process, in memory shared with the supervisor.
+
+    The child records which stage it entered when, and for which event.
+    Updating the record costs a few memory writes and no system call, so it
+    is done for every stage of every event. A sequence number guards
+    against reading a half-written record.
+    """
+
+    def __init__(self) -> None:
+        # Sequence number, stage, time the stage was entered, event id
+        self._record = RawArray("d", 4)
+
+    def reset(self) -> None:
+        """Clear the sequence number of a process that died while writing."""
+        self._record[0] = 0
+
+    def enter(self, stage: str, event: int = -1) -> None:
+        """Record that the process entered `stage` while handling `event`."""
+        record = self._record
+        record[0] += 1
+        record[1] = STAGES.index(stage)
+        record[2] = time.monotonic()
+        record[3] = event
+        record[0] += 1
+
+    def read(self) -> Tuple[str, float, int]:
+        """Return the stage, the time it was entered and the event id.
+
+        Gives up waiting for a consistent record after `READ_RETRIES`
+        attempts and returns the last one read, so that a writer that died
+        halfway cannot block the supervisor.
+        """
+        record = self._record
+        for _ in range(READ_RETRIES):
+            seq = record[0]
+            stage, since, event = record[1], record[2], record[3]
+            if seq % 2 == 0 and record[0] == seq:
+                break
+        return STAGES[int(stage)], since, int(event)
+
+
+class WatchdogPolicy:
+    """
+    When to kill a hanging process and when to recycle a worker.
+
+    Parameters
+    ----------
+    timeouts : dict, optional
+        Maximum time in seconds a process may spend in a stage, e.g.
+        ``{"analysis": 30.0, "sink": 5.0}``. Stages are "source" (waiting
+        for the source connector), "analysis", "serialize", "send" (waiting
+        for the next process to accept an event) and "sink". Processes that
+        exceed the timeout are killed and restarted.
+    max_events : int, optional
+        Number of events after which a worker is replaced by a new process
+    max_rss : int, optional
+        Resident memory in bytes above which a worker is replaced by a new
+        process
+    interval : float, default 0.5
+        Time in seconds between two checks of the heartbeats
+    """
+
+    def __init__(
+        self,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_events: Optional[int] = None,
+        max_rss: Optional[int] = None,
+        interval: float = 0.5,
+    ):
+        timeouts = dict(timeouts or {})
+        for stage in timeouts:
+            if stage not in STAGES or stage == "idle":
+                raise ValueError(f"Unknown stage {stage!r}")
+        self._timeouts = timeouts
+        self._max_events = max_events
+        self._max_rss = max_rss
+        self._interval = interval
+
+    @property
+    def timeouts(self):
+        return self._timeouts
+
+    @property
+    def max_events(self):
+        return self._max_events
+
+    @property
+    def max_rss(self):
+        return self._max_rss
+
+    @property
+    def interval(self):
+        return self._interval
+
+    def overdue(self, heartbeat: Heartbeat) -> Optional[Tuple[str, float, int]]:
+        """Return stage, time in stage and event id if the timeout is exceeded."""
+        stage, since, event = heartbeat.read()
+        timeout = self.timeouts.get(stage)
+        elapsed = time.monotonic() - since
+        if timeout is not None and elapsed > timeout:
+            return stage, elapsed, event
+        return None
+
+
+def rss() -> int:
+    """Resident memory of the current process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Peak instead of current memory where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -1,3 +1,5 @@
 from .base import *
 from .json_serializer import *
 from .avro_serializer import *
+from .binary_serializer import *
+from .compressed_serializer import *
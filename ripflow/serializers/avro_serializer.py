@@ -1,31 +1,205 @@
 from .base import Serializer
+import avro.errors
 import avro.schema
 import avro.io
 import io
 import numpy as np
-from typing import Any
+from typing import Any, Callable, Dict, Optional, cast
+
+__all__ = ["AvroSerializer"]
+
+# Function that writes a datum with the encoder
+Writer = Callable[[Any, avro.io.BinaryEncoder], None]
+
+# Little-endian NumPy equivalents of Avro array items with a fixed size
+_FIXED_SIZE_ITEMS: Dict[str, np.dtype] = {
+    "float": np.dtype("<f4"),
+    "double": np.dtype("<f8"),
+}
+
+# Value ranges of the Avro integer types
+_INTEGER_RANGES = {
+    "int": (-(1 << 31), (1 << 31) - 1),
+    "long": (-(1 << 63), (1 << 63) - 1),
+}
+
+# Types accepted for Avro floating point values
+_REAL = (int, float, np.integer, np.floating)
 
 
 class AvroSerializer(Serializer):
-    """Avro serializer with NumPy support"""
+    """Avro serializer with NumPy support
+
+    The schema is compiled once into a tree of writer functions that share a
+    single encoder and output buffer. NumPy arrays are written without
+    converting them to lists if the schema has a matching type:
+
+    * ``{"type": "array", "items": "float"}`` or ``"double"``, the array data
+      is written as one block
+    * ``"bytes"`` and ``"fixed"``, the raw array data is written
+
+    All other types are written by the Avro ``DatumWriter``, with arrays
+    converted to lists. As with the ``DatumWriter``, data that does not
+    match the schema raises ``avro.errors.AvroTypeException``. NumPy scalars
+    are accepted wherever the corresponding Python type is.
+
+    Parameters
+    ----------
+    schema_str : str
+        Avro schema in JSON format
+    """
 
     def __init__(self, schema_str: str):
+        self.schema_str = schema_str
         self.schema = avro.schema.parse(schema_str)
+        self._setup()
+
+    def _setup(self) -> None:
+        self._buffer = io.BytesIO()
+        self._encoder = avro.io.BinaryEncoder(self._buffer)
+        self._datum_writer = avro.io.DatumWriter(self.schema)
+        self._datum_reader = avro.io.DatumReader(self.schema)
+        self._write = self._compile(self.schema)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"schema_str": self.schema_str}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["schema_str"])  # type: ignore
 
     def serialize(self, data: dict) -> bytes:
-        writer_schema = self.schema
-        bytes_writer = io.BytesIO()
-        encoder = avro.io.BinaryEncoder(bytes_writer)
-        datum_writer = avro.io.DatumWriter(writer_schema)
-
-        def encode(obj: Any) -> Any:
-            if isinstance(obj, np.ndarray):
-                return obj.tolist()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._write(data, self._encoder)
+        return self._buffer.getvalue()
+
+    def deserialize(self, message: bytes) -> dict:
+        decoder = avro.io.BinaryDecoder(io.BytesIO(message))
+        return cast(dict, self._datum_reader.read(decoder))
+
+    def _compile(
+        self, schema: avro.schema.Schema, name: Optional[str] = None
+    ) -> Writer:
+        """Build the writer function for `schema`, `name` is used in errors."""
+        if schema.get_prop("logicalType") is not None:
+            return self._generic(schema)
+        if isinstance(schema, avro.schema.RecordSchema):
+            fields = [
+                (field.name, self._compile(field.type, field.name))
+                for field in schema.fields
+            ]
+            names = {field.name for field in schema.fields}
+
+            def write_record(datum: Any, encoder: avro.io.BinaryEncoder) -> None:
+                if not isinstance(datum, dict) or not names.issuperset(datum):
+                    raise avro.errors.AvroTypeException(schema, name, datum)
+                for field_name, write in fields:
+                    write(datum.get(field_name), encoder)
+
+            return write_record
+        if isinstance(schema, avro.schema.ArraySchema):
+            return self._compile_array(schema, name)
+        if isinstance(schema, avro.schema.FixedSchema):
+            size = schema.size
+
+            def write_fixed(datum: Any, encoder: avro.io.BinaryEncoder) -> None:
+                raw = _raw(datum) if isinstance(datum, np.ndarray) else datum
+                if not isinstance(raw, (bytes, memoryview)) or len(raw) != size:
+                    raise avro.errors.AvroTypeException(schema, name, datum)
+                encoder.write(cast(bytes, raw))
+
+            return write_fixed
+        if schema.type in _INTEGER_RANGES:
+            low, high = _INTEGER_RANGES[schema.type]
+
+            def write_integer(datum: Any, encoder: avro.io.BinaryEncoder) -> None:
+                if not isinstance(datum, (int, np.integer)) or not (
+                    low <= int(datum) <= high
+                ):
+                    raise avro.errors.AvroTypeException(schema, name, datum)
+                encoder.write_long(int(datum))
+
+            return write_integer
+        checked: Dict[str, Any] = {
+            "null": (type(None), lambda datum, encoder: None),
+            "boolean": (
+                (bool, np.bool_),
+                lambda datum, encoder: encoder.write_boolean(datum),
+            ),
+            "float": (_REAL, lambda datum, encoder: encoder.write_float(datum)),
+            "double": (_REAL, lambda datum, encoder: encoder.write_double(datum)),
+            "string": (str, lambda datum, encoder: encoder.write_utf8(datum)),
+            "bytes": ((bytes, np.ndarray), _write_bytes),
+        }
+        if schema.type not in checked:
+            return self._generic(schema)
+        types, write = checked[schema.type]
+
+        def write_primitive(datum: Any, encoder: avro.io.BinaryEncoder) -> None:
+            if not isinstance(datum, types):
+                raise avro.errors.AvroTypeException(schema, name, datum)
+            write(datum, encoder)
+
+        return write_primitive
+
+    def _compile_array(
+        self, schema: avro.schema.ArraySchema, name: Optional[str]
+    ) -> Writer:
+        items = schema.items
+        write_item = self._compile(items, name)
+        dtype: Optional[np.dtype] = None
+        if items.get_prop("logicalType") is None:
+            dtype = _FIXED_SIZE_ITEMS.get(items.type)
+
+        def write_array(datum: Any, encoder: avro.io.BinaryEncoder) -> None:
+            if dtype is not None and isinstance(datum, np.ndarray):
+                if datum.dtype.kind not in "biuf":
+                    raise avro.errors.AvroTypeException(schema, name, datum)
+                if datum.size:
+                    encoder.write_long(datum.size)
+                    encoder.write(_raw(datum.astype(dtype, copy=False)))
+            elif isinstance(datum, (list, np.ndarray)):
+                if len(datum):
+                    encoder.write_long(len(datum))
+                    for item in datum:
+                        write_item(item, encoder)
             else:
-                return obj
+                raise avro.errors.AvroTypeException(schema, name, datum)
+            encoder.write_long(0)
+
+        return write_array
+
+    def _generic(self, schema: avro.schema.Schema) -> Writer:
+        """Writer for types without a fast path."""
+        datum_writer = self._datum_writer
+
+        def write_generic(datum: Any, encoder: avro.io.BinaryEncoder) -> None:
+            datum = _to_python(datum)
+            avro.io.validate(schema, datum, raise_on_error=True)
+            datum_writer.write_data(schema, datum, encoder)
+
+        return write_generic
+
+
+def _raw(array: np.ndarray) -> Any:
+    """Data of an array as flat bytes, without a copy if it is contiguous."""
+    return np.ascontiguousarray(array).reshape(-1).view(np.uint8).data
+
+
+def _write_bytes(datum: Any, encoder: avro.io.BinaryEncoder) -> None:
+    if isinstance(datum, np.ndarray):
+        datum = _raw(datum)
+    encoder.write_long(len(datum))
+    encoder.write(datum)
 
-        datum = {k: encode(v) for k, v in data.items()}
-        datum_writer.write(datum, encoder)
-        serialized_data = bytes_writer.getvalue()
 
-        return serialized_data
+def _to_python(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, dict):
+        return {key: _to_python(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_python(value) for value in obj]
+    return obj
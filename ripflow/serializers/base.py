@@ -3,3 +3,11 @@ class Serializer(object):
 
     def serialize(self, data: dict) -> bytes:
         raise NotImplementedError
+
+    def for_output(self, idx: int) -> "Serializer":
+        """Return the serializer for the output `idx` of the analyzer"""
+        return self
+
+    def deserialize(self, message: bytes) -> dict:
+        """Decode a serialized message, for use by subscribers"""
+        raise NotImplementedError
@@ -0,0 +1,79 @@
+from .base import Serializer
+import numpy as np
+import json
+import struct
+from typing import Any, Dict, List, Union
+
+__all__ = ["BinarySerializer"]
+
+
+class BinarySerializer(Serializer):
+    """Binary serializer that sends NumPy arrays as raw bytes
+
+    A message consists of the magic bytes ``RPF1``, the length of the header
+    as little-endian uint32, a JSON header and the raw array data. The header
+    holds all fields that are not arrays and, for every array, its key,
+    ``dtype.str``, shape and offset into the data section. Offsets are
+    aligned to 8 bytes, so `deserialize` returns the arrays as views on the
+    received message without copying them.
+
+    Parameters
+    ----------
+    alignment : int, default 8
+        Alignment of the arrays in the data section in bytes
+    """
+
+    magic = b"RPF1"
+
+    def __init__(self, alignment: int = 8) -> None:
+        self.alignment = alignment
+
+    def serialize(self, data: dict) -> bytes:
+        fields = {}
+        arrays = []
+        chunks: List[Any] = []
+        offset = 0
+        for key, value in data.items():
+            if not isinstance(value, np.ndarray) or value.dtype.hasobject:
+                fields[key] = value
+                continue
+            # Keep the shape, ascontiguousarray turns 0-d arrays into 1-d ones
+            shape = value.shape
+            value = np.ascontiguousarray(value)
+            arrays.append([key, value.dtype.str, shape, offset])
+            chunks.append(value.reshape(-1).view(np.uint8))
+            padding = -value.nbytes % self.alignment
+            if padding:
+                chunks.append(bytes(padding))
+            offset += value.nbytes + padding
+        header = json.dumps(
+            {"fields": fields, "arrays": arrays}, default=_encode
+        ).encode("utf-8")
+        # Pad the header so the data section starts aligned as well
+        header += b" " * (-(len(header) + 8) % self.alignment)
+        return b"".join([self.magic, struct.pack("<I", len(header)), header] + chunks)
+
+    def deserialize(self, message: Union[bytes, memoryview]) -> Dict[str, Any]:
+        """Decode a message, arrays are read-only views on `message`."""
+        buffer = memoryview(message)
+        if bytes(buffer[:4]) != self.magic:
+            raise ValueError("Not a BinarySerializer message")
+        (length,) = struct.unpack_from("<I", buffer, 4)
+        header = json.loads(bytes(buffer[8 : 8 + length]))
+        start = 8 + length
+        data = header["fields"]
+        for key, dtype, shape, offset in header["arrays"]:
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape, dtype=np.int64))
+            data[key] = np.frombuffer(
+                buffer, dtype=dtype, count=count, offset=start + offset
+            ).reshape(shape)
+        return data
+
+
+def _encode(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
@@ -0,0 +1,216 @@
+from .base import Serializer
+import bz2
+import lzma
+import struct
+import zlib
+import numpy as np
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+try:
+    import lz4.frame  # type: ignore
+except ImportError:
+    lz4 = None
+try:
+    import zstandard  # type: ignore
+except ImportError:
+    zstandard = None
+
+__all__ = ["CompressedSerializer", "decompress"]
+
+# Codec names and their ids in the message header, 0 marks raw payloads
+CODECS = {"zlib": 1, "lzma": 2, "bz2": 3, "lz4": 4, "zstd": 5}
+FILTERS = (None, "shuffle", "delta", "shuffle+delta")
+
+_MAGIC = b"RPZ1"
+# Magic, codec id, filter id, type size, payload size. Type sizes below 256
+# are encoded as in the first version, which had a padding byte after them.
+_HEADER = struct.Struct("<4sBBHQ")
+# Larger elements are not shuffled, as with a type size of 1
+_MAX_TYPESIZE = 0xFFFF
+
+
+class CompressedSerializer(Serializer):
+    """Compression wrapper around any serializer
+
+    Messages of the wrapped serializer are compressed if they are at least
+    `threshold` bytes long. Every message starts with a small header that
+    names the codec and pre-filter, use `deserialize` or `decompress` on
+    the receiving side.
+
+    Parameters
+    ----------
+    serializer : Serializer
+        Serializer whose messages are compressed
+    codec : str, default "zlib"
+        One of "zlib", "lzma" and "bz2" from the standard library, or "lz4"
+        and "zstd" if the lz4 and zstandard packages are installed
+    level : int, optional
+        Compression level, defaults to the default level of the codec
+    threshold : int, default 1024
+        Smaller messages are sent uncompressed
+    filter : str, optional
+        Pre-filter for numeric data: "shuffle" groups the n-th bytes of all
+        elements, "delta" stores the difference of consecutive bytes and
+        "shuffle+delta" applies both. Best used with `BinarySerializer`,
+        whose arrays are aligned within the message.
+    typesize : int or "auto", default "auto"
+        Element size for the shuffle filter. "auto" uses the largest item
+        size of the NumPy arrays in the data. Elements larger than 65535
+        bytes are not shuffled.
+    outputs : dict, optional
+        Per output overrides of `codec`, `level`, `threshold` and `filter`,
+        e.g. ``{0: {"codec": "lz4"}, 2: {"filter": "shuffle"}}``
+    """
+
+    def __init__(
+        self,
+        serializer: Serializer,
+        codec: str = "zlib",
+        level: Optional[int] = None,
+        threshold: int = 1024,
+        filter: Optional[str] = None,
+        typesize: Union[int, str] = "auto",
+        outputs: Optional[Dict[int, Dict[str, Any]]] = None,
+    ) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}, use one of {list(CODECS)}")
+        if codec == "lz4" and lz4 is None:
+            raise ImportError("lz4 is not installed. Please install lz4")
+        if codec == "zstd" and zstandard is None:
+            raise ImportError("zstandard is not installed. Please install zstandard")
+        if filter not in FILTERS:
+            raise ValueError(f"Unknown filter {filter!r}, use one of {FILTERS}")
+        self.serializer = serializer
+        self.codec = codec
+        self.level = level
+        self.threshold = threshold
+        self.filter = filter
+        self.typesize = typesize
+        self.outputs = outputs or {}
+        self._compress = _compressor(codec, level)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_compress"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._compress = _compressor(self.codec, self.level)
+
+    def for_output(self, idx: int) -> "CompressedSerializer":
+        if idx not in self.outputs:
+            return self
+        settings = dict(
+            codec=self.codec,
+            level=self.level,
+            threshold=self.threshold,
+            filter=self.filter,
+            typesize=self.typesize,
+        )
+        settings.update(self.outputs[idx])
+        return CompressedSerializer(
+            self.serializer.for_output(idx), **settings  # type: ignore
+        )
+
+    def serialize(self, data: dict) -> bytes:
+        message = self.serializer.serialize(data)
+        if len(message) < self.threshold:
+            return _HEADER.pack(_MAGIC, 0, 0, 1, len(message)) + message
+        typesize = self.typesize
+        if typesize == "auto":
+            typesize = max(
+                (v.itemsize for v in data.values() if isinstance(v, np.ndarray)),
+                default=1,
+            )
+        assert isinstance(typesize, int)
+        if typesize > _MAX_TYPESIZE:
+            typesize = 1
+        payload = _apply_filter(message, self.filter, typesize)
+        header = _HEADER.pack(
+            _MAGIC,
+            CODECS[self.codec],
+            FILTERS.index(self.filter),
+            typesize,
+            len(message),
+        )
+        return header + self._compress(payload)
+
+    def deserialize(self, message: bytes) -> dict:
+        return self.serializer.deserialize(decompress(message))
+
+
+def decompress(message: bytes) -> bytes:
+    """Return the message of the wrapped serializer."""
+    magic, codec, filter_id, typesize, size = _HEADER.unpack_from(message)
+    if magic != _MAGIC:
+        raise ValueError("Not a CompressedSerializer message")
+    payload = memoryview(message)[_HEADER.size :]
+    if codec == 0:
+        return bytes(payload)
+    raw = _revert_filter(_decompressor(codec)(payload), FILTERS[filter_id], typesize)
+    if len(raw) != size:
+        raise ValueError(f"Expected {size} bytes, got {len(raw)}")
+    return raw
+
+
+def _compressor(codec: str, level: Optional[int]) -> Callable[[bytes], bytes]:
+    if codec == "zlib":
+        return lambda data: zlib.compress(data, -1 if level is None else level)
+    if codec == "lzma":
+        return lambda data: lzma.compress(data, preset=level)
+    if codec == "bz2":
+        return lambda data: bz2.compress(data, 9 if level is None else level)
+    if codec == "lz4":
+        return lambda data: lz4.frame.compress(data, compression_level=level or 0)
+    compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+    return compressor.compress
+
+
+def _decompressor(codec_id: int) -> Callable[[Any], bytes]:
+    if codec_id == CODECS["zlib"]:
+        return zlib.decompress
+    if codec_id == CODECS["lzma"]:
+        return lzma.decompress
+    if codec_id == CODECS["bz2"]:
+        return bz2.decompress
+    if codec_id == CODECS["lz4"]:
+        if lz4 is None:
+            raise ImportError("lz4 is not installed. Please install lz4")
+        return lz4.frame.decompress
+    if codec_id == CODECS["zstd"]:
+        if zstandard is None:
+            raise ImportError("zstandard is not installed. Please install zstandard")
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Unknown codec id {codec_id}")
+
+
+def _split(data: Any, typesize: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Split bytes into whole elements of `typesize` bytes and the rest."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    n = len(raw) // typesize * typesize
+    return raw[:n], raw[n:]
+
+
+def _apply_filter(data: bytes, filter: Optional[str], typesize: int) -> bytes:
+    if filter is None:
+        return data
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if filter.startswith("shuffle") and typesize > 1:
+        body, tail = _split(data, typesize)
+        raw = np.concatenate([body.reshape(-1, typesize).T.reshape(-1), tail])
+    if filter.endswith("delta"):
+        raw = np.diff(raw, prepend=np.uint8(0))
+    return raw.tobytes()
+
+
+def _revert_filter(data: bytes, filter: Optional[str], typesize: int) -> bytes:
+    if filter is None:
+        return data
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if filter.endswith("delta"):
+        raw = np.cumsum(raw, dtype=np.uint8)
+    if filter.startswith("shuffle") and typesize > 1:
+        body, tail = _split(raw, typesize)
+        raw = np.concatenate([body.reshape(typesize, -1).T.reshape(-1), tail])
+    return raw.tobytes()
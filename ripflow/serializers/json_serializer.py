@@ -15,3 +15,6 @@ class JsonSerializer(Serializer):
                 return obj
 
         return json.dumps(data, default=encode).encode("utf-8")
+
+    def deserialize(self, message: bytes) -> dict:
+        return json.loads(message)
@@ -0,0 +1,201 @@
+import json
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import BaseAnalyzer, SharedArray
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.serializers import JsonSerializer
+
+
+class CalibratedAnalyzer(BaseAnalyzer):
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self.calibration = SharedArray(np.arange(1000, dtype=np.float64))
+        self.worker_id = None
+
+    @property
+    def n_outputs(self):
+        return 1
+
+    def setup(self, worker_id):
+        self.worker_id = worker_id
+
+    def teardown(self):
+        path = os.path.join(self.directory, f"worker_{self.worker_id}")
+        open(path, "w").close()
+
+    def run(self, data):
+        data = dict(data, data=float(self.calibration.array[data["macropulse"]]))
+        return [dict(data, name=f"worker_{self.worker_id}")]
+
+
+class FailingSetupAnalyzer(CalibratedAnalyzer):
+    def __init__(self, directory, failing=(0,)):
+        super().__init__(directory)
+        self.failing = failing
+
+    def setup(self, worker_id):
+        self.worker_id = worker_id
+        if worker_id in self.failing:
+            time.sleep(0.2)
+            raise RuntimeError("Calibration not found")
+
+
+class TestSharedArray(unittest.TestCase):
+    def setUp(self):
+        self.shared = SharedArray(np.ones((4, 4), dtype=np.float32))
+
+    def tearDown(self):
+        self.shared.close()
+
+    def test_read_only(self):
+        np.testing.assert_array_equal(self.shared.array, np.ones((4, 4)))
+        with self.assertRaises(ValueError):
+            self.shared.array[0, 0] = 2
+
+    def test_pickle_maps_same_memory(self):
+        copy = pickle.loads(pickle.dumps(self.shared))
+        self.assertEqual(copy.array.dtype, np.float32)
+        np.testing.assert_array_equal(copy.array, self.shared.array)
+        copy.close()
+        # Only the creating process frees the memory
+        self.assertEqual(self.shared.array.sum(), 16)
+
+
+class TestAnalyzerSetup(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1354
+        self.n_events = 6
+        self.test_sequence = [
+            {
+                "data": 0.0,
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.analyzer = CalibratedAnalyzer(self.directory.name)
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=self.analyzer,
+            n_workers=2,
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+        self.analyzer.calibration.close()
+        self.directory.cleanup()
+
+    def test_setup_and_teardown(self):
+        self.server.event_loop()
+        received = [json.loads(self.socket.recv()) for _ in range(self.n_events)]
+        self.assertEqual(
+            sorted(msg["data"] for msg in received), [float(i) for i in range(6)]
+        )
+        # Every message was analyzed by a worker that ran its setup
+        self.assertLessEqual(
+            {msg["name"] for msg in received}, {"worker_0", "worker_1"}
+        )
+        self.server.stop(drain=True)
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)), ["worker_0", "worker_1"]
+        )
+
+
+class TestFailingSetup(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.analyzer = FailingSetupAnalyzer(self.directory.name)
+        self.server = Ripflow(
+            source_connector=SourceConnector([]),
+            sink_connector=ZMQSinkConnector(port=1361, serializer=JsonSerializer()),
+            analyzer=self.analyzer,
+            n_workers=1,
+        )
+
+    def tearDown(self):
+        self.server.stop()
+        self.analyzer.calibration.close()
+        self.directory.cleanup()
+
+    def test_worker_shuts_down(self):
+        self.server.event_loop()
+        deadline = time.monotonic() + 5
+        # The worker tears the analyzer down before it exits
+        while not os.listdir(self.directory.name):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        self.assertEqual(os.listdir(self.directory.name), ["worker_0"])
+
+
+class TestPartlyFailingSetup(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1362
+        self.n_events = 20
+        self.test_sequence = [
+            {
+                "data": 0.0,
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.analyzer = FailingSetupAnalyzer(self.directory.name, failing=(1,))
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=self.analyzer,
+            n_workers=2,
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 5000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+        self.analyzer.calibration.close()
+        self.directory.cleanup()
+
+    def test_no_events_before_setup(self):
+        self.server.event_loop()
+        received = [json.loads(self.socket.recv()) for _ in range(self.n_events)]
+        # Worker 1 never asked for events, worker 0 analyzed all of them
+        self.assertEqual(
+            sorted(msg["macropulse"] for msg in received), list(range(self.n_events))
+        )
+        self.assertEqual({msg["name"] for msg in received}, {"worker_0"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import json
+import time
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import TestAnalyzer as Analyzer
+from ripflow.connectors.source import SyntheticSourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.core import AutoscalePolicy
+from ripflow.serializers import JsonSerializer
+
+
+class TestAutoscalePolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = AutoscalePolicy(min_workers=1, max_workers=4)
+
+    def test_scale_up(self):
+        # 2 busy workers need 3 workers at 70 % utilization
+        self.assertEqual(self.policy.desired_workers(2, 2.0, 0), 3)
+        self.assertEqual(self.policy.desired_workers(1, 10.0, 0), 4)
+        # A backlog adds a worker even if the load looks fine
+        self.assertEqual(self.policy.desired_workers(2, 0.5, 500), 3)
+        self.assertEqual(self.policy.desired_workers(4, 0.5, 500), 4)
+
+    def test_scale_down(self):
+        self.assertEqual(self.policy.desired_workers(3, 0.3, 0), 2)
+        self.assertEqual(self.policy.desired_workers(1, 0.0, 0), 1)
+        # Not while events are queued
+        self.assertEqual(self.policy.desired_workers(3, 0.3, 5), 3)
+
+    def test_hysteresis(self):
+        # 2 workers at 50 %: too busy to retire one, idle enough to keep both
+        self.assertEqual(self.policy.desired_workers(2, 1.0, 0), 2)
+        # 2 workers at 37.5 %, but a single one would be above the target
+        self.assertEqual(self.policy.desired_workers(2, 0.75, 0), 2)
+
+    def test_bounds(self):
+        with self.assertRaises(ValueError):
+            AutoscalePolicy(min_workers=3, max_workers=2)
+        with self.assertRaises(ValueError):
+            AutoscalePolicy(target_utilization=0.5, scale_down_utilization=0.6)
+
+
+class TestAutoscaling(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1350
+        self.n_events = 120
+        self.server = Ripflow(
+            # 40 Hz at 20 ms per event keeps one worker 80 % busy, well above
+            # the target even if the machine is too busy to keep the rate
+            source_connector=SyntheticSourceConnector(rate=40, n_events=self.n_events),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(fake_load=0.02),
+            n_workers=1,
+            autoscale=AutoscalePolicy(
+                min_workers=1,
+                max_workers=2,
+                target_utilization=0.5,
+                cooldown=0.5,
+                interval=1.5,
+            ),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def wait_for_workers(self, n, timeout):
+        deadline = time.monotonic() + timeout
+        while len(self.server.workers) != n:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.1)
+
+    def test_scale_up_and_down(self):
+        self.server.event_loop()
+        self.wait_for_workers(2, timeout=5)
+        received = 0
+        while received < self.n_events:
+            self.socket.recv()
+            received += 1
+        # The source is exhausted, the added worker is retired again
+        self.wait_for_workers(1, timeout=10)
+        self.assertEqual([w.worker_id for w in self.server.workers], [0])
+
+
+class TestRetireUnderLoad(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1358
+        self.n_events = 60
+        self.server = Ripflow(
+            # 40 Hz at 100 ms per event, events queue up in front of the workers
+            source_connector=SyntheticSourceConnector(rate=40, n_events=self.n_events),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(fake_load=0.1),
+            n_workers=2,
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_no_events_lost(self):
+        self.server.event_loop()
+        received = set()
+        while len(received) < self.n_events:
+            if len(received) == 10:
+                worker = self.server.workers.pop()
+                self.server.supervisor.retire_process(worker, timeout=10)
+            try:
+                msg = json.loads(self.socket.recv())
+            except zmq.Again:
+                break
+            received.add(msg["macropulse"])
+        self.assertEqual(received, set(range(self.n_events)))
+        self.assertFalse(worker.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
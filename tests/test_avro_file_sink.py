@@ -0,0 +1,134 @@
+import os
+import time
+import tempfile
+import unittest
+import numpy as np
+from avro.datafile import DataFileReader
+from avro.io import DatumReader
+from ripflow import Ripflow
+from ripflow.analyzers import BaseAnalyzer
+from ripflow.connectors.sink import AvroFileSinkConnector
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.serializers import AvroSerializer
+
+
+class SpectrumAnalyzer(BaseAnalyzer):
+    @property
+    def n_outputs(self):
+        return 1
+
+    def run(self, data):
+        return [
+            {
+                "macropulse": data["macropulse"],
+                "data": np.full(4, data["data"], dtype=np.float32),
+            }
+        ]
+
+
+class TestAvroFileSink(unittest.TestCase):
+    schema = """
+    {
+        "type": "record",
+        "name": "Spectrum",
+        "fields": [
+            {"name": "macropulse", "type": "long"},
+            {"name": "data", "type": {"type": "array", "items": "float"}}
+        ]
+    }
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "output_{idx}.avro")
+        self.serializer = AvroSerializer(self.schema)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, codec, n_records):
+        sink = AvroFileSinkConnector(
+            self.path, self.serializer, codec=codec, block_records=7
+        ).for_output(3)
+        sink.connect_subprocess(3)
+        for i in range(n_records):
+            data = {"macropulse": i, "data": np.full(4, i, dtype=np.float32)}
+            sink.send(self.serializer.serialize(data))
+        sink.close()
+        return self.path.format(idx=3)
+
+    def _read(self, filename):
+        with open(filename, "rb") as f:
+            return list(DataFileReader(f, DatumReader()))
+
+    def test_null_codec(self):
+        records = self._read(self._write("null", 20))
+        self.assertEqual([r["macropulse"] for r in records], list(range(20)))
+        self.assertEqual(records[5]["data"], [5.0] * 4)
+
+    def test_deflate_codec(self):
+        records = self._read(self._write("deflate", 20))
+        self.assertEqual([r["macropulse"] for r in records], list(range(20)))
+
+    def test_invalid_codec(self):
+        with self.assertRaises(ValueError):
+            AvroFileSinkConnector(self.path, self.serializer, codec="brotli")
+
+    def test_path_without_idx(self):
+        path = os.path.join(self.tmpdir.name, "output.avro")
+        sink = AvroFileSinkConnector(path, self.serializer)
+        sink.check_outputs(1)
+        with self.assertRaises(ValueError):
+            sink.check_outputs(2)
+        AvroFileSinkConnector(self.path, self.serializer).check_outputs(2)
+
+    def test_flush_interval(self):
+        sink = AvroFileSinkConnector(
+            self.path, self.serializer, flush_interval=0.1
+        ).for_output(3)
+        sink.connect_subprocess(3)
+        for i in range(3):
+            data = {"macropulse": i, "data": np.full(4, i, dtype=np.float32)}
+            sink.send(self.serializer.serialize(data))
+        sink.poll()
+        self.assertEqual(self._read(self.path.format(idx=3)), [])
+        time.sleep(0.15)
+        sink.poll()
+        records = self._read(self.path.format(idx=3))
+        self.assertEqual([r["macropulse"] for r in records], [0, 1, 2])
+        sink.close()
+
+    def test_stop(self):
+        # Blocks are only written when the sender closes the connector
+        n_events = 10
+        server = Ripflow(
+            source_connector=SourceConnector(
+                [
+                    {
+                        "data": float(i),
+                        "type": "FLOAT",
+                        "timestamp": time.time() + i,
+                        "macropulse": i,
+                        "miscellaneous": {},
+                        "name": "test",
+                    }
+                    for i in range(n_events)
+                ]
+            ),
+            sink_connector=AvroFileSinkConnector(
+                self.path, self.serializer, flush_interval=60.0
+            ),
+            analyzer=SpectrumAnalyzer(),
+            n_workers=2,
+        )
+        server.event_loop()
+        time.sleep(1.0)
+        server.stop()
+        records = self._read(self.path.format(idx=0))
+        self.assertEqual(
+            sorted(r["macropulse"] for r in records), list(range(n_events))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import time
+import zmq
+import random
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import BaseAnalyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.serializers import JsonSerializer
+
+
+class BatchAnalyzer(BaseAnalyzer):
+    """Tag every event with the size of the batch it was analyzed in."""
+
+    def __init__(self, fake_load: float = 0.0) -> None:
+        self.fake_load = fake_load
+
+    @property
+    def n_outputs(self):
+        return 1
+
+    def run(self, data):
+        return self.run_batch([data])[0]
+
+    def run_batch(self, events):
+        time.sleep(self.fake_load)
+        return [[dict(data, batch=len(events))] for data in events]
+
+
+class TestBatching(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1338
+        self.test_sequence = list()
+        for i in range(10):
+            data = {
+                "data": random.random(),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            self.test_sequence.append(data)
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=BatchAnalyzer(fake_load=0.2),
+            n_workers=1,
+            batch_size=4,
+            batch_timeout=0.1,
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_batches(self):
+        self.server.event_loop()
+        received = [self.socket.recv_json() for _ in range(10)]
+        self.assertEqual([msg["macropulse"] for msg in received], list(range(10)))
+        batch_sizes = [msg["batch"] for msg in received]
+        self.assertLessEqual(max(batch_sizes), 4)
+        self.assertGreater(max(batch_sizes), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
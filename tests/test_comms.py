@@ -0,0 +1,143 @@
+import unittest
+import numpy as np
+import zmq
+import pickle
+import subprocess
+from ripflow.core import SharedMemoryFactory, ZMQFactory
+from ripflow.core.utils import STALE
+
+
+class TestZMQFactory(unittest.TestCase):
+    def setUp(self):
+        self.context = zmq.Context()
+        self.n_roundtrips = 0
+        self.data = [
+            {
+                "data": np.arange(4096, dtype=np.uint16).reshape(64, 64),
+                "macropulse": 42,
+                "name": "test",
+            }
+        ]
+
+    def tearDown(self):
+        self.context.term()
+
+    def _roundtrip(self, factory, obj, receiver=None):
+        # inproc endpoints are released asynchronously, use a fresh one per call
+        self.n_roundtrips += 1
+        address = f"inproc://comms_{self.n_roundtrips}"
+        push = factory.create_socket(
+            self.context, socket_type=zmq.PUSH, bind_address=address
+        )
+        pull = factory.create_socket(
+            self.context, socket_type=zmq.PULL, connect_address=address
+        )
+        try:
+            factory.send_object(push, obj)
+            return (receiver or factory).recv_object(pull)
+        finally:
+            push.close()
+            pull.close()
+
+    def test_pickle_transport(self):
+        received = self._roundtrip(ZMQFactory(), self.data)
+        np.testing.assert_array_equal(received[0]["data"], self.data[0]["data"])
+        self.assertEqual(received[0]["macropulse"], 42)
+
+    def test_zero_copy_transport(self):
+        received = self._roundtrip(ZMQFactory(zero_copy=True), self.data)
+        array = received[0]["data"]
+        np.testing.assert_array_equal(array, self.data[0]["data"])
+        self.assertEqual(array.dtype, np.uint16)
+        self.assertEqual(received[0]["name"], "test")
+        # Arrays are views on the received frames rather than fresh copies
+        self.assertFalse(array.flags.owndata)
+
+    def test_zero_copy_non_contiguous(self):
+        data = {"data": np.arange(100.0).reshape(10, 10)[:, ::2]}
+        received = self._roundtrip(ZMQFactory(zero_copy=True), data)
+        np.testing.assert_array_equal(received["data"], data["data"])
+
+
+class TestSharedMemoryFactory(TestZMQFactory):
+    def setUp(self):
+        super().setUp()
+        self.factory = SharedMemoryFactory(n_slots=2, slot_size=2**16, min_size=1024)
+
+    def tearDown(self):
+        self.factory.close()
+        super().tearDown()
+
+    def test_shared_memory_transport(self):
+        # The receiver gets its own copy of the factory, as a spawned worker would
+        receiver = pickle.loads(pickle.dumps(self.factory))
+        received = self._roundtrip(self.factory, self.data, receiver)
+        array = received[0]["data"]
+        np.testing.assert_array_equal(array, self.data[0]["data"])
+        self.assertFalse(array.flags.writeable)
+        self.assertEqual(np.count_nonzero(self.factory._claims), 1)
+        receiver.release(received)
+        del received, array
+        self.assertEqual(np.count_nonzero(self.factory._claims), 0)
+        receiver.close()
+
+    def test_fallback_when_ring_is_full(self):
+        for _ in range(3):
+            received = self._roundtrip(self.factory, self.data)
+            np.testing.assert_array_equal(received[0]["data"], self.data[0]["data"])
+        # Two slots are leased, the third array went through a ZMQ frame
+        self.assertEqual(np.count_nonzero(self.factory._claims), 2)
+        self.assertTrue(received[0]["data"].flags.writeable)
+        del received
+
+    def test_reclaim_slots_of_exited_holders(self):
+        first = self._roundtrip(self.factory, self.data)
+        second = self._roundtrip(self.factory, self.data)
+        # Slots are only taken over from processes that exited
+        holder = subprocess.Popen(["true"])
+        holder.wait()
+        self.factory._claims[0] = holder.pid
+        third = self._roundtrip(self.factory, self.data)
+        self.assertFalse(third[0]["data"].flags.writeable)
+        np.testing.assert_array_equal(second[0]["data"], self.data[0]["data"])
+        # A slot that is held for long is not reused
+        fourth = self._roundtrip(self.factory, self.data)
+        self.assertTrue(fourth[0]["data"].flags.writeable)
+        del first, second, third, fourth
+
+    def test_reclaimed_in_transit(self):
+        push = self.factory.create_socket(
+            self.context, socket_type=zmq.PUSH, bind_address="inproc://transit"
+        )
+        pull = self.factory.create_socket(
+            self.context, socket_type=zmq.PULL, connect_address="inproc://transit"
+        )
+        self.factory.send_object(push, {"data": np.zeros(1024)})
+        self.factory.send_object(push, {"data": np.ones(1024)})
+        # The producer crashed with both objects still queued at the receiver,
+        # its next process reuses the slot of the first one
+        crashed = subprocess.Popen(["true"])
+        crashed.wait()
+        self.factory._claims[:] = crashed.pid
+        self.factory.send_object(push, {"data": np.full(1024, 2.0)})
+        self.assertEqual(self.factory.recv_object(pull), STALE)
+        second = self.factory.recv_object(pull)
+        third = self.factory.recv_object(pull)
+        np.testing.assert_array_equal(second["data"], np.ones(1024))
+        np.testing.assert_array_equal(third["data"], np.full(1024, 2.0))
+        self.assertFalse(third["data"].flags.writeable)
+        self.factory.release()
+        self.assertEqual(np.count_nonzero(self.factory._claims), 0)
+        push.close()
+        pull.close()
+        del second, third
+
+    def test_small_buffers_stay_inline(self):
+        data = {"data": np.zeros(10)}
+        received = self._roundtrip(self.factory, data)
+        np.testing.assert_array_equal(received["data"], data["data"])
+        self.assertEqual(np.count_nonzero(self.factory._claims), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
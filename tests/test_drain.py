@@ -0,0 +1,157 @@
+import json
+import time
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import TestAnalyzer as Analyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.connectors.source.base import SourceConnector as BaseSourceConnector
+from ripflow.core import ReorderPolicy
+from ripflow.serializers import JsonSerializer
+
+
+class TestDrain(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1353
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            # The workers fall far behind the source
+            analyzer=Analyzer(fake_load=0.2),
+            n_workers=2,
+            ordering=ReorderPolicy(),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 1000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_drain_passes_on_queued_events(self):
+        self.server.event_loop()
+        received = [json.loads(self.socket.recv())]
+        # Wait until the producer has read the whole sequence
+        time.sleep(1.0)
+        start = time.monotonic()
+        self.server.stop(drain=True, timeout=10)
+        # Well before the timeout, nothing was terminated
+        self.assertLess(time.monotonic() - start, 5)
+        for worker in self.server.workers:
+            self.assertEqual(worker.process.exitcode, 0)
+        while True:
+            try:
+                received.append(json.loads(self.socket.recv()))
+            except zmq.Again:
+                break
+        self.assertEqual(
+            [msg["macropulse"] for msg in received], list(range(self.n_events))
+        )
+
+    def test_drain_idle_pipeline(self):
+        self.server.event_loop()
+        for _ in range(self.n_events):
+            self.socket.recv()
+        # The producer waits for the source, which has no more events
+        start = time.monotonic()
+        self.server.stop(drain=True, timeout=10)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.server.producer.process.exitcode, 0)
+
+
+class StuckSourceConnector(BaseSourceConnector):
+    """Source that hangs after its sequence and ignores interruptions."""
+
+    def __init__(self, data_sequence):
+        self.data_sequence = list(data_sequence)
+
+    def connect(self):
+        pass
+
+    def get_data(self):
+        if self.data_sequence:
+            time.sleep(0.05)
+            return self.data_sequence.pop(0)
+        while True:
+            try:
+                time.sleep(1)
+            except BaseException:
+                pass
+
+
+class TestDrainStuckProducer(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1359
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=StuckSourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(fake_load=0.5),
+            n_workers=2,
+            ordering=ReorderPolicy(),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 1000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_downstream_stages_drain_after_stuck_producer(self):
+        self.server.event_loop()
+        received = [json.loads(self.socket.recv())]
+        # The producer has read the whole sequence and hangs in the source,
+        # the workers still hold most of the events
+        time.sleep(0.5)
+        self.server.stop(drain=True, timeout=9)
+        self.assertNotEqual(self.server.producer.process.exitcode, 0)
+        for worker in self.server.workers:
+            self.assertEqual(worker.process.exitcode, 0)
+        while True:
+            try:
+                received.append(json.loads(self.socket.recv()))
+            except zmq.Again:
+                break
+        self.assertEqual(
+            [msg["macropulse"] for msg in received], list(range(self.n_events))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import json
+import tempfile
+import time
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import TestAnalyzer as Analyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.core import DiskDeadLetterQueue, ErrorPolicy
+from ripflow.serializers import JsonSerializer
+
+
+class FailingAnalyzer(Analyzer):
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = failing
+
+    def run(self, data):
+        if data["macropulse"] in self.failing:
+            raise ValueError(f"Malformed event {data['macropulse']}")
+        return [data]
+
+
+class ShortBatchAnalyzer(Analyzer):
+    """Loses the output of event 5 from every batch that contains it."""
+
+    def run_batch(self, events):
+        return [[data] for data in events if data["macropulse"] != 5]
+
+
+class TestDiskDeadLetterQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.queue = DiskDeadLetterQueue(self.directory.name, max_events=3)
+        self.queue.open()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_bounded(self):
+        for i in range(5):
+            self.queue.put({"seq": i}, i, "analysis", "ValueError()")
+        self.assertEqual(len(self.queue), 3)
+        # The oldest events make room for new ones
+        seqs = [meta["seq"] for meta, _, _, _ in self.queue.replay()]
+        self.assertEqual(seqs, [2, 3, 4])
+        self.assertEqual(len(self.queue), 0)
+
+    def test_replay_keeps(self):
+        self.queue.put({"seq": 0}, {"data": 1.0}, "serialize", "TypeError()")
+        letters = list(self.queue.replay(remove=False))
+        self.assertEqual(
+            letters, [({"seq": 0}, {"data": 1.0}, "serialize", "TypeError()")]
+        )
+        self.assertEqual(len(self.queue), 1)
+
+
+class TestErrorIsolation(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1352
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.dead_letter = DiskDeadLetterQueue(self.directory.name)
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=FailingAnalyzer(failing={3, 4, 7}),
+            n_workers=1,
+            errors=ErrorPolicy(dead_letter=self.dead_letter),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+        self.directory.cleanup()
+
+    def test_failing_events_are_skipped(self):
+        self.server.event_loop()
+        received = [json.loads(self.socket.recv()) for _ in range(self.n_events - 3)]
+        self.assertEqual([msg["macropulse"] for msg in received], [0, 1, 2, 5, 6, 8, 9])
+        worker = self.server.workers[0]
+        self.assertEqual(self.server.supervisor._processes[worker]["restart_count"], 0)
+        letters = list(self.dead_letter.replay())
+        self.assertEqual([data["macropulse"] for _, data, _, _ in letters], [3, 4, 7])
+        self.assertEqual({stage for _, _, stage, _ in letters}, {"analysis"})
+
+
+class TestShortBatch(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1360
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.dead_letter = DiskDeadLetterQueue(self.directory.name)
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=ShortBatchAnalyzer(),
+            n_workers=1,
+            batch_size=4,
+            batch_timeout=0.5,
+            errors=ErrorPolicy(dead_letter=self.dead_letter),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+        self.directory.cleanup()
+
+    def test_missing_batch_output_fails_its_event(self):
+        self.server.event_loop()
+        received = [json.loads(self.socket.recv()) for _ in range(self.n_events - 1)]
+        self.assertEqual(
+            sorted(msg["macropulse"] for msg in received),
+            [0, 1, 2, 3, 4, 6, 7, 8, 9],
+        )
+        letters = list(self.dead_letter.replay())
+        self.assertEqual([data["macropulse"] for _, data, _, _ in letters], [5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from ripflow.connectors.source import EventBuilderSourceConnector, SourceConnector
+
+
+class ChunkedSourceConnector(SourceConnector):
+    """Deliver prepared chunks of records, one chunk per call."""
+
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = list(chunks)
+
+    def connect(self):
+        pass
+
+    def get_data(self):
+        return self.chunks.pop(0)
+
+
+def record(channel, macropulse):
+    return {"name": channel, "macropulse": macropulse, "data": 0.0}
+
+
+class TestEventBuilder(unittest.TestCase):
+    def test_merge_split_channels(self):
+        source = ChunkedSourceConnector(
+            [
+                [record("B", 1)],
+                [record("A", 1), record("A", 2)],
+                [record("B", 2)],
+            ]
+        )
+        builder = EventBuilderSourceConnector(source, channels=["A", "B"])
+        self.assertEqual(builder.get_data(), [record("A", 1), record("B", 1)])
+        self.assertEqual(builder.get_data(), [record("A", 2), record("B", 2)])
+
+    def test_drop_incomplete(self):
+        source = ChunkedSourceConnector(
+            [[record("A", 1)], [record("A", 2), record("B", 2)], [record("B", 1)]]
+        )
+        builder = EventBuilderSourceConnector(source, channels=["A", "B"], timeout=0.0)
+        self.assertEqual(builder.get_data(), [record("A", 2), record("B", 2)])
+        self.assertEqual(builder.n_incomplete, 1)
+        # The late record of the dropped event does not start a new event
+        builder._add(record("B", 1), 0.0)
+        self.assertEqual(builder.n_late, 1)
+        self.assertEqual(len(builder._pending), 0)
+
+    def test_emit_incomplete(self):
+        source = ChunkedSourceConnector([[record("A", 1), record("A", 2)]])
+        builder = EventBuilderSourceConnector(
+            source, channels=["A", "B"], incomplete="emit", max_pending=1
+        )
+        self.assertEqual(builder.get_data(), [record("A", 1), None])
+        self.assertEqual(list(builder._pending), [2])
+
+    def test_skip_records_without_event(self):
+        source = ChunkedSourceConnector(
+            [[{"name": "A", "data": 0.0}, record("A", 1)], [record("B", 1)]]
+        )
+        builder = EventBuilderSourceConnector(source, channels=["A", "B"])
+        self.assertEqual(builder.get_data(), [record("A", 1), record("B", 1)])
+        self.assertEqual(builder.n_invalid, 1)
+
+    def test_ignore_unknown_channels(self):
+        source = ChunkedSourceConnector(
+            [[record("C", 1), record("A", 1)], [record("B", 1)]]
+        )
+        builder = EventBuilderSourceConnector(source, channels=["A", "B"])
+        self.assertEqual(builder.get_data(), [record("A", 1), record("B", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
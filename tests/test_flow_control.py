@@ -0,0 +1,109 @@
+import logging
+import time
+import unittest
+import zmq
+from ripflow.core import BackpressurePolicy
+from ripflow.core.flow_control import DropCounter, Inbox, Outbox
+
+
+class TestBackpressure(unittest.TestCase):
+    def setUp(self):
+        self.context = zmq.Context()
+        self.logger = logging.getLogger("test")
+        self.inboxes = []
+
+    def tearDown(self):
+        for inbox in self.inboxes:
+            inbox.close()
+        self.context.destroy(linger=0)
+
+    def _connect(self, policy, address, marker=None):
+        push = self.context.socket(zmq.PUSH)
+        pull = self.context.socket(zmq.PULL)
+        for socket in (push, pull):
+            for option, value in policy.socket_options().items():
+                socket.setsockopt(option, value)
+        push.bind(address)
+        pull.connect(address)
+        outbox = Outbox(
+            policy,
+            lambda msg, flags: push.send_pyobj(msg, flags=flags),
+            DropCounter(self.logger, "push"),
+            marker=marker,
+        )
+        dropped = []
+        inbox = Inbox(
+            policy,
+            pull,
+            lambda socket: socket.recv_pyobj(),
+            DropCounter(self.logger, "pull"),
+            on_drop=dropped.append,
+        )
+        self.inboxes.append(inbox)
+        return outbox, inbox, dropped
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            BackpressurePolicy(mode="drop_random")
+
+    def test_block(self):
+        outbox, inbox, _ = self._connect(BackpressurePolicy(), "inproc://block")
+        for i in range(10):
+            self.assertTrue(outbox.send(i))
+        self.assertEqual([inbox.get() for _ in range(10)], list(range(10)))
+        self.assertIsNone(inbox.get(timeout=0.01))
+
+    def test_drop_newest(self):
+        policy = BackpressurePolicy(mode="drop_newest", depth=2)
+        outbox, inbox, _ = self._connect(policy, "inproc://drop_newest")
+        sent = [i for i in range(20) if outbox.send(i)]
+        self.assertLess(len(sent), 20)
+        self.assertEqual(outbox.drops.total, 20 - len(sent))
+        self.assertEqual([inbox.get() for _ in sent], sent)
+
+    def test_markers_are_not_dropped(self):
+        policy = BackpressurePolicy(mode="drop_newest", depth=2)
+        outbox, inbox, _ = self._connect(
+            policy, "inproc://markers", marker=lambda msg: ("dropped", msg)
+        )
+        sent = [i for i in range(20) if outbox.send(i)]
+        outbox.mark(("dropped", "skipped"))
+        self.assertEqual(outbox.flush(), 0)
+        self.assertEqual([inbox.get() for _ in sent], sent)
+        markers = []
+        deadline = time.monotonic() + 5
+        while outbox.markers or len(markers) < 20 - len(sent) + 1:
+            self.assertLess(time.monotonic(), deadline)
+            outbox.flush()
+            msg = inbox.get(timeout=0.01)
+            if msg is not None:
+                markers.append(msg)
+        dropped = [i for i in range(20) if i not in sent]
+        self.assertEqual(markers, [("dropped", i) for i in dropped + ["skipped"]])
+
+    def test_drop_oldest(self):
+        policy = BackpressurePolicy(mode="drop_oldest", depth=3)
+        outbox, inbox, dropped = self._connect(policy, "inproc://drop_oldest")
+        sent = [i for i in range(5) if outbox.send(i)]
+        self.assertEqual(sent, list(range(5)))
+        time.sleep(0.1)  # Leave time to the receiving thread
+        self.assertEqual([inbox.get() for _ in range(3)], [2, 3, 4])
+        self.assertEqual(dropped, [0, 1])
+        self.assertEqual(inbox.drops.total, 2)
+        # The local queue enforces the depth, not the sockets
+        policy = BackpressurePolicy(mode="drop_oldest", depth=1000)
+        self.assertLess(policy.socket_options()[zmq.RCVHWM], 1000)
+
+    def test_keep_latest(self):
+        policy = BackpressurePolicy(mode="keep_latest")
+        self.assertEqual(policy.depth, 1)
+        outbox, inbox, dropped = self._connect(policy, "inproc://keep_latest")
+        for i in range(3):
+            outbox.send(i)
+            time.sleep(0.01)
+        self.assertEqual(inbox.get(timeout=1), 2)
+        self.assertIsNone(inbox.get(timeout=0.01))
+
+
+if __name__ == "__main__":
+    unittest.main()
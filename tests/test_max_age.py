@@ -0,0 +1,72 @@
+import time
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import BaseAnalyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.serializers import JsonSerializer
+
+
+class SlowAnalyzer(BaseAnalyzer):
+    """Take longer per event than the source needs to produce one."""
+
+    def __init__(self, fake_load: float = 0.0) -> None:
+        self.fake_load = fake_load
+
+    @property
+    def n_outputs(self):
+        return 1
+
+    def run(self, data):
+        time.sleep(self.fake_load)
+        return [data]
+
+
+class TestMaxAge(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1340
+        self.n_events = 30
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=SlowAnalyzer(fake_load=0.2),
+            n_workers=1,
+            max_age=1.0,
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_stale_events_are_skipped(self):
+        self.server.event_loop()
+        received = []
+        # Without max_age the worker would need 6 s for the backlog
+        while self.socket.poll(3000):
+            received.append(self.socket.recv_json()["macropulse"])
+        self.assertGreater(len(received), 1)
+        self.assertLess(len(received), self.n_events)
+        self.assertEqual(received, sorted(received))
+
+
+if __name__ == "__main__":
+    unittest.main()
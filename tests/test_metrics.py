@@ -0,0 +1,161 @@
+import logging
+import time
+import urllib.request
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import TestAnalyzer as Analyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.core.metrics import Metrics, MetricsCollector, key
+from ripflow.serializers import JsonSerializer
+
+
+class TestMetricsCollector(unittest.TestCase):
+    def setUp(self):
+        self.collector = MetricsCollector(
+            "ipc://metrics_test", logging.getLogger(__name__)
+        )
+        self.collector.start()
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.PUSH)
+        self.socket.connect("ipc://metrics_test")
+
+    def tearDown(self):
+        self.collector.stop()
+        self.socket.close(linger=0)
+        self.context.term()
+
+    def push(self, metrics, incarnation):
+        counters, histograms = metrics.snapshot()
+        self.socket.send_pyobj((metrics.process, incarnation, counters, histograms))
+
+    def wait_for(self, name, value, **labels):
+        deadline = time.monotonic() + 5
+        while self.collector.totals()[0].get(key(name, **labels)) != value:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_restart_keeps_totals(self):
+        metrics = Metrics("worker_0")
+        received = metrics.counter("ripflow_events_received_total", hop="input")
+        received.inc(5)
+        self.push(metrics, (1, 0.0))
+        received.inc(2)
+        self.push(metrics, (1, 0.0))
+        self.wait_for(
+            "ripflow_events_received_total", 7, process="worker_0", hop="input"
+        )
+        # The restarted process counts from zero again
+        metrics = Metrics("worker_0")
+        metrics.counter("ripflow_events_received_total", hop="input").inc(3)
+        self.push(metrics, (2, 1.0))
+        self.wait_for(
+            "ripflow_events_received_total", 10, process="worker_0", hop="input"
+        )
+
+    def test_queue_depth(self):
+        producer = Metrics("producer")
+        producer.counter("ripflow_events_sent_total", hop="input").inc(10)
+        worker = Metrics("worker_0")
+        worker.counter("ripflow_events_received_total", hop="input").inc(6)
+        worker.track(
+            "ripflow_events_dropped_total",
+            lambda: 1,
+            hop="input",
+            side="receive",
+            reason="backpressure",
+        )
+        worker.histogram("ripflow_analysis_seconds").record(0.01)
+        self.push(producer, (1, 0.0))
+        self.push(worker, (2, 0.0))
+        self.wait_for(
+            "ripflow_events_received_total", 6, process="worker_0", hop="input"
+        )
+        text = self.collector.text()
+        self.assertIn("# TYPE ripflow_queue_depth gauge", text)
+        self.assertIn('ripflow_queue_depth{hop="input"} 3\n', text)
+        self.assertIn('ripflow_analysis_seconds_count{process="worker_0"} 1\n', text)
+        self.assertIn(
+            'ripflow_analysis_seconds_bucket{process="worker_0",le="+Inf"} 1\n', text
+        )
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1348
+        self.metrics_port = 1349
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(),
+            n_workers=2,
+            metrics_port=self.metrics_port,
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def scrape(self):
+        url = f"http://127.0.0.1:{self.metrics_port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.read().decode()
+
+    def test_endpoint(self):
+        self.server.event_loop()
+        for _ in range(self.n_events):
+            self.socket.recv()
+        expected = [
+            'ripflow_events_received_total{hop="source",process="producer"} 10\n',
+            'ripflow_events_sent_total{hop="sink",process="sender_0"} 10\n',
+            'ripflow_queue_depth{hop="input"} 0\n',
+            'ripflow_queue_depth{hop="output_0"} 0\n',
+        ]
+        # Every process reports once per second
+        deadline = time.monotonic() + 5
+        text = self.scrape()
+        while not all(line in text for line in expected):
+            self.assertLess(time.monotonic(), deadline, text)
+            time.sleep(0.1)
+            text = self.scrape()
+        self.assertIn("# TYPE ripflow_analysis_seconds histogram", text)
+        self.assertIn('ripflow_events_sent_total{hop="sink"', self.server.metrics())
+        # Only served to the local machine by default
+        server = self.server.metrics_collector._server
+        self.assertEqual(server.server_address[0], "127.0.0.1")
+
+    def test_requires_port(self):
+        server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(),
+        )
+        with self.assertRaises(RuntimeError):
+            server.metrics()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import time
+import random
+import unittest
+import zmq
+from ripflow import Ripflow
+from ripflow.analyzers import BaseAnalyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.core.ordering import ReorderBuffer, ReorderPolicy
+from ripflow.serializers import JsonSerializer
+
+
+class TestReorderBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = ReorderBuffer(ReorderPolicy(window=4, timeout=1.0))
+
+    def test_in_order(self):
+        for seq in range(3):
+            self.assertEqual(self.buffer.push(0, seq, seq, now=0.0), [seq])
+
+    def test_reorder(self):
+        self.assertEqual(self.buffer.push(0, 0, "a", now=0.0), ["a"])
+        self.assertEqual(self.buffer.push(0, 2, "c", now=0.0), [])
+        self.assertEqual(self.buffer.push(0, 3, "d", now=0.0), [])
+        self.assertEqual(self.buffer.push(0, 1, "b", now=0.0), ["b", "c", "d"])
+
+    def test_timeout(self):
+        self.buffer.push(0, 0, "a", now=0.0)
+        self.buffer.push(0, 2, "c", now=0.0)
+        self.assertEqual(self.buffer.next_deadline(), 1.0)
+        self.assertEqual(self.buffer.poll(now=0.5), [])
+        self.assertEqual(self.buffer.poll(now=1.0), ["c"])
+        self.assertEqual(self.buffer.skipped, 1)
+        # The lost message shows up after it was given up on
+        self.assertEqual(self.buffer.push(0, 1, "b", now=1.1), [])
+        self.assertEqual(self.buffer.late, 1)
+
+    def test_window(self):
+        self.buffer.push(0, 0, "a", now=0.0)
+        for seq in range(2, 6):
+            self.assertEqual(self.buffer.push(0, seq, seq, now=0.0), [])
+        self.assertEqual(self.buffer.push(0, 6, 6, now=0.0), [2, 3, 4, 5, 6])
+        self.assertEqual(self.buffer.skipped, 1)
+
+    def test_dropped_marker(self):
+        self.buffer.push(0, 0, "a", now=0.0)
+        self.buffer.push(0, 2, "c", now=0.0)
+        self.assertEqual(self.buffer.push(0, 1, None, now=0.0), ["c"])
+        self.assertEqual(self.buffer.skipped, 0)
+
+    def test_first_message_is_slowest(self):
+        self.assertEqual(self.buffer.push(0, 1, "b", now=0.0), [])
+        self.assertEqual(self.buffer.push(0, 2, "c", now=0.0), [])
+        self.assertEqual(self.buffer.push(0, 0, "a", now=0.5), ["a", "b", "c"])
+        self.assertEqual(self.buffer.late, 0)
+
+    def test_join_running_stream(self):
+        self.assertEqual(self.buffer.push(0, 6, "g", now=0.0), [])
+        self.assertEqual(self.buffer.push(0, 5, "f", now=0.1), [])
+        self.assertEqual(self.buffer.next_deadline(), 1.0)
+        # Message 0 did not arrive in time, start with the lowest one
+        self.assertEqual(self.buffer.poll(now=1.0), ["f", "g"])
+        self.assertEqual(self.buffer.skipped, 0)
+        self.assertEqual(self.buffer.push(0, 7, "h", now=1.1), ["h"])
+
+    def test_new_epoch(self):
+        self.buffer.push(0, 0, "a", now=0.0)
+        self.buffer.push(0, 2, "c", now=0.0)
+        # The producer restarted and counts from zero
+        self.assertEqual(self.buffer.push(1, 1, "y", now=0.0), ["c"])
+        self.assertEqual(self.buffer.push(1, 0, "x", now=0.0), ["x", "y"])
+
+    def test_old_epoch_is_late(self):
+        self.buffer.push(1, 0, "x", now=0.0)
+        # Still in transit from the previous producer run
+        self.assertEqual(self.buffer.push(0, 8, "d", now=0.0), [])
+        self.assertEqual(self.buffer.late, 1)
+        self.assertEqual(self.buffer.push(1, 1, "y", now=0.0), ["y"])
+
+
+class JitterAnalyzer(BaseAnalyzer):
+    """Pass events on after a random delay, so that workers overtake each other."""
+
+    @property
+    def n_outputs(self):
+        return 1
+
+    def run(self, data):
+        # The first event is the slowest, the senders must wait for it
+        if data["macropulse"] == 0:
+            time.sleep(0.5)
+        else:
+            time.sleep(0.3 * (data["macropulse"] % 3) / 2)
+        return [data]
+
+
+class TestOrderedPipeline(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1339
+        self.test_sequence = [
+            {
+                "data": random.random(),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(12)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=JitterAnalyzer(),
+            n_workers=4,
+            ordering=ReorderPolicy(window=16, timeout=2.0),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_ordered_output(self):
+        self.server.event_loop()
+        received = [self.socket.recv_json() for _ in range(12)]
+        self.assertEqual(received, self.test_sequence)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import sys
+import types
+import unittest
+
+
+class FakeTime(object):
+    """Clock that only advances when the connector sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 0.0)
+
+
+class FakePydoocs(types.ModuleType):
+    """Stand-in for pydoocs that delivers one record every `period` seconds."""
+
+    def __init__(self, clock: FakeTime, period: float):
+        super().__init__("pydoocs")
+        self.clock = clock
+        self.period = period
+        self.sent = 0
+        self.polls = 0
+
+    def due(self):
+        return (self.sent + 1) * self.period
+
+    def getdata(self):
+        self.polls += 1
+        if self.clock.monotonic() < self.due():
+            return None
+        self.sent += 1
+        return [{"macropulse": self.sent, "due": self.due() - self.period}]
+
+
+class TestPydoocsSourceConnector(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeTime()
+        self.pd = FakePydoocs(self.clock, period=0.02)
+        sys.modules["pydoocs"] = self.pd
+        sys.modules.pop("ripflow.connectors.source.pydoocs_source_connector", None)
+        from ripflow.connectors.source import pydoocs_source_connector
+
+        pydoocs_source_connector.time = self.clock  # type: ignore
+        self.connector = pydoocs_source_connector.PydoocsSourceConnector(
+            ["TEST/PROPERTY"], timeout=1
+        )
+
+    def tearDown(self):
+        sys.modules.pop("pydoocs", None)
+        sys.modules.pop("ripflow.connectors.source.pydoocs_source_connector", None)
+
+    def test_polls(self):
+        for _ in range(20):
+            self.connector.get_data()
+        polls, sleeps = self.pd.polls, len(self.clock.sleeps)
+        # Steady state, after the connector has learned the event interval
+        for _ in range(20):
+            data = self.connector.get_data()
+            # Found by the backoff, whose steps are at most `wait`
+            self.assertLessEqual(self.clock.now - data[0]["due"], self.connector.wait)
+        steady = self.clock.sleeps[sleeps:]
+        # One sleep until shortly before each event, then the backoff starts
+        # over from `min_wait` instead of polling at a fixed interval
+        long_sleeps = [t for t in steady if t > self.connector.wait]
+        self.assertEqual(len(long_sleeps), 20)
+        self.assertEqual(steady.count(self.connector.min_wait), 20)
+        # A 1 ms polling loop would need about 20 polls per event
+        self.assertLess((self.pd.polls - polls) / 20, 12)
+
+    def test_timeout(self):
+        self.pd.period = 10
+        self.connector.timeout = 0.05
+        with self.assertRaises(TimeoutError):
+            self.connector.get_data()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+import json
+import logging
+import time
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import TestAnalyzer as Analyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.core import RoutingPolicy, ZMQFactory
+from ripflow.core.routing import BYE, READY, HashRing, KeyedRouter, Router
+from ripflow.serializers import JsonSerializer
+
+
+class WorkerTaggingAnalyzer(Analyzer):
+    def setup(self, worker_id):
+        self.worker_id = worker_id
+
+    def run(self, data):
+        return [dict(data, miscellaneous={"worker": self.worker_id})]
+
+
+class TestHashRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = HashRing()
+        for node in (b"a", b"b", b"c"):
+            self.ring.add(node)
+        self.keys = [f"key{i}" for i in range(300)]
+
+    def test_spread(self):
+        owners = [self.ring.get(key) for key in self.keys]
+        for node in (b"a", b"b", b"c"):
+            self.assertGreater(owners.count(node), 50)
+
+    def test_remove_moves_only_its_keys(self):
+        before = {key: self.ring.get(key) for key in self.keys}
+        self.ring.remove(b"b")
+        for key, node in before.items():
+            if node != b"b":
+                self.assertEqual(self.ring.get(key), node)
+            else:
+                self.assertIn(self.ring.get(key), (b"a", b"c"))
+        # A restarted node gets its keys back
+        self.ring.add(b"b")
+        self.assertEqual({key: self.ring.get(key) for key in self.keys}, before)
+
+    def test_empty(self):
+        with self.assertRaises(LookupError):
+            HashRing().get("key")
+
+
+class TestKeyedRouter(unittest.TestCase):
+    def setUp(self):
+        self.context = zmq.Context()
+        self.router = self.context.socket(zmq.ROUTER)
+        self.router.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        self.router.setsockopt(zmq.SNDHWM, 10)
+        self.router.bind("inproc://routing_test")
+        self.dealers = {}
+        for name in (b"worker_0", b"worker_1"):
+            dealer = self.context.socket(zmq.DEALER)
+            dealer.setsockopt(zmq.IDENTITY, name)
+            dealer.setsockopt(zmq.RCVHWM, 10)
+            dealer.connect("inproc://routing_test")
+            dealer.send(READY)
+            self.dealers[name] = dealer
+        self.keyed = KeyedRouter(
+            RoutingPolicy("name"),
+            self.router,
+            ZMQFactory().send_object,
+            logging.getLogger(__name__),
+        )
+
+    def tearDown(self):
+        for dealer in self.dealers.values():
+            dealer.close(linger=0)
+        self.router.close(linger=0)
+        self.context.term()
+
+    def send(self, name, seq=0):
+        self.keyed.send(({"seq": seq}, {"name": name}))
+
+    def receiver(self, name):
+        poller = zmq.Poller()
+        for dealer in self.dealers.values():
+            poller.register(dealer, zmq.POLLIN)
+        ready = dict(poller.poll(1000))
+        for node, dealer in self.dealers.items():
+            if dealer in ready:
+                self.assertEqual(dealer.recv_pyobj()[1]["name"], name)
+                return node
+        self.fail(f"{name} was not received")
+
+    def test_round_robin_until_all_are_full(self):
+        router = Router(self.router, ZMQFactory().send_object, logging.getLogger())
+        sent = 0
+        with self.assertRaises(zmq.Again):
+            while sent < 1000:
+                router.send(({"seq": sent}, {"name": "cam"}), zmq.NOBLOCK)
+                sent += 1
+        received = {}
+        for node, dealer in self.dealers.items():
+            received[node] = 0
+            while dealer.poll(100):
+                dealer.recv_pyobj()
+                received[node] += 1
+        self.assertEqual(sum(received.values()), sent)
+        self.assertTrue(all(received.values()))
+
+    def test_goodbye_is_answered_after_routed_events(self):
+        owners = {}
+        for i in range(20):
+            self.send(f"cam{i}")
+            owners[f"cam{i}"] = self.receiver(f"cam{i}")
+        leaving = self.dealers[b"worker_1"]
+        # Events routed before the producer read BYE still reach the worker
+        keys = [name for name, node in owners.items() if node == b"worker_1"]
+        self.send(keys[0])
+        leaving.send_multipart([BYE, b"token"])
+        time.sleep(0.05)
+        for name in keys:
+            self.send(name)
+        received = []
+        while True:
+            self.assertTrue(leaving.poll(1000))
+            obj = leaving.recv_pyobj()
+            if obj == b"token":
+                break
+            received.append(obj[1]["name"])
+        self.assertEqual(received, [keys[0]])
+        # All later events went to the remaining worker
+        remaining = self.dealers[b"worker_0"]
+        for name in keys:
+            self.assertTrue(remaining.poll(1000))
+            self.assertEqual(remaining.recv_pyobj()[1]["name"], name)
+
+    def test_reroute_when_worker_is_gone(self):
+        owners = {}
+        for i in range(20):
+            self.send(f"cam{i}")
+            owners[f"cam{i}"] = self.receiver(f"cam{i}")
+        self.assertEqual(set(owners.values()), set(self.dealers))
+        # Same keys, same workers
+        for name, node in owners.items():
+            self.send(name)
+            self.assertEqual(self.receiver(name), node)
+        self.dealers.pop(b"worker_1").close(linger=0)
+        time.sleep(0.1)
+        for name in owners:
+            self.send(name)
+            self.assertEqual(self.receiver(name), b"worker_0")
+        self.assertEqual(len(self.keyed.ring), 1)
+
+
+class TestKeyedRouting(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1355
+        self.n_events = 12
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": f"camera_{i % 4}",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=WorkerTaggingAnalyzer(),
+            n_workers=3,
+            routing=RoutingPolicy("name"),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_same_key_same_worker(self):
+        self.server.event_loop()
+        workers = {}
+        for _ in range(self.n_events):
+            msg = json.loads(self.socket.recv())
+            workers.setdefault(msg["name"], set()).add(msg["miscellaneous"]["worker"])
+        self.assertEqual(len(workers), 4)
+        for name, ids in workers.items():
+            self.assertEqual(len(ids), 1, name)
+
+
+class TestProducerRestart(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1357
+        test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(10)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(test_sequence, crash_point=3),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(),
+            n_workers=2,
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 5000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_workers_rejoin_restarted_producer(self):
+        self.server.event_loop()
+        # Every producer run sends the first three events before it crashes
+        for _ in range(6):
+            self.socket.recv()
+
+
+if __name__ == "__main__":
+    unittest.main()
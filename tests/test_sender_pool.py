@@ -0,0 +1,211 @@
+import json
+import time
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import BaseAnalyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.core import ReorderPolicy
+from ripflow.serializers import JsonSerializer
+
+
+class FanOutAnalyzer(BaseAnalyzer):
+    """Emit one message per output, tagged with the output index."""
+
+    def __init__(self, n_outputs: int) -> None:
+        self._n_outputs = n_outputs
+
+    @property
+    def n_outputs(self):
+        return self._n_outputs
+
+    def run(self, data):
+        return [
+            {"macropulse": data["macropulse"], "output": idx}
+            for idx in range(self.n_outputs)
+        ]
+
+
+class TestSenderPool(unittest.TestCase):
+    def setUp(self):
+        self.port = 1341
+        self.n_outputs = 5
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.port, serializer=JsonSerializer()
+            ),
+            analyzer=FanOutAnalyzer(self.n_outputs),
+            n_workers=2,
+            ordering=ReorderPolicy(),
+            sender_pool=2,
+        )
+        self.context = zmq.Context()
+        self.sockets = []
+        for idx in range(self.n_outputs):
+            socket = self.context.socket(zmq.SUB)
+            socket.connect(f"tcp://127.0.0.1:{self.port + idx}")
+            socket.setsockopt(zmq.SUBSCRIBE, b"")
+            socket.setsockopt(zmq.RCVTIMEO, 10000)
+            self.sockets.append(socket)
+
+    def tearDown(self):
+        self.server.stop()
+        for socket in self.sockets:
+            socket.close()
+        self.context.term()
+
+    def test_senders(self):
+        self.assertEqual(len(self.server.senders), 2)
+        self.assertEqual(
+            [sender.outputs for sender in self.server.senders], [[0, 2, 4], [1, 3]]
+        )
+
+    def test_outputs(self):
+        self.server.event_loop()
+        for idx, socket in enumerate(self.sockets):
+            received = [socket.recv_json() for _ in range(self.n_events)]
+            self.assertEqual({msg["output"] for msg in received}, {idx})
+            self.assertEqual(
+                [msg["macropulse"] for msg in received], list(range(self.n_events))
+            )
+
+
+class TestSubscriberGrace(unittest.TestCase):
+    def test_grace_once_per_sender(self):
+        sink_connector = ZMQSinkConnector(
+            port=1363, serializer=JsonSerializer(), subscriber_grace=0.2
+        )
+        copies = [sink_connector.for_output(idx) for idx in range(5)]
+        start = time.monotonic()
+        for idx, copy in enumerate(copies):
+            copy.connect_subprocess(idx)
+        for copy in copies:
+            copy.settle()
+        elapsed = time.monotonic() - start
+        for copy in copies:
+            copy.socket.close()
+            copy.context.term()
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLess(elapsed, 0.5)
+
+
+class TestMultiplexedSink(unittest.TestCase):
+    def setUp(self):
+        self.port = 1346
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.port,
+                serializer=JsonSerializer(),
+                multiplex=True,
+                topics=["spectrum", "profile", "charge"],
+            ),
+            analyzer=FanOutAnalyzer(3),
+            n_workers=2,
+            ordering=ReorderPolicy(),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.port}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"profile")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_single_sender(self):
+        self.assertEqual(len(self.server.senders), 1)
+        with self.assertRaises(ValueError):
+            Ripflow(
+                source_connector=SourceConnector(self.test_sequence),
+                sink_connector=self.server.sink_connector,
+                analyzer=FanOutAnalyzer(3),
+                sender_pool=2,
+            )
+
+    def test_topics(self):
+        self.server.event_loop()
+        received = [self.socket.recv_multipart() for _ in range(self.n_events)]
+        self.assertEqual({topic for topic, _ in received}, {b"profile"})
+        messages = [json.loads(msg) for _, msg in received]
+        self.assertEqual({msg["output"] for msg in messages}, {1})
+        self.assertEqual(
+            [msg["macropulse"] for msg in messages], list(range(self.n_events))
+        )
+
+
+class TestDefaultTopics(unittest.TestCase):
+    def setUp(self):
+        self.port = 1364
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.port, serializer=JsonSerializer(), multiplex=True
+            ),
+            analyzer=FanOutAnalyzer(11),
+            n_workers=2,
+            ordering=ReorderPolicy(),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.port}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"1\0")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_no_prefix_collision(self):
+        self.server.event_loop()
+        received = [self.socket.recv_multipart() for _ in range(self.n_events)]
+        self.assertEqual({topic for topic, _ in received}, {b"1\0"})
+        self.assertEqual({json.loads(msg)["output"] for _, msg in received}, {1})
+        time.sleep(0.5)
+        with self.assertRaises(zmq.Again):
+            self.socket.recv_multipart(zmq.NOBLOCK)
+
+
+if __name__ == "__main__":
+    unittest.main()
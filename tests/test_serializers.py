@@ -1,9 +1,16 @@
 import unittest
 import numpy as np
 import avro.schema
+from avro.errors import AvroTypeException
 from avro.io import BinaryDecoder
 from io import BytesIO
-from ripflow.serializers import JsonSerializer, AvroSerializer
+from ripflow.serializers import (
+    JsonSerializer,
+    AvroSerializer,
+    BinarySerializer,
+    CompressedSerializer,
+)
+from ripflow.serializers.compressed_serializer import decompress
 
 
 class TestSerializers(unittest.TestCase):
@@ -49,9 +56,142 @@ class TestSerializers(unittest.TestCase):
         data["data"] = data["data"].tolist()
         self.assertEqual(decoded_data, data)
 
+    def test_avro_fast_paths(self):
+        schema = """
+        {
+            "type": "record",
+            "name": "Image",
+            "fields": [
+                {"name": "projection", "type": {"type": "array", "items": "double"}},
+                {"name": "pixels", "type": "bytes"},
+                {"name": "roi", "type": {"type": "fixed", "name": "Roi", "size": 8}},
+                {"name": "gain", "type": ["null", "double"]}
+            ]
+        }
+        """
+        data = {
+            "projection": np.linspace(0, 1, 16),
+            "pixels": np.arange(12, dtype=np.uint16).reshape(3, 4),
+            "roi": np.array([1, 2, 3, 4], dtype="<u2"),
+            "gain": np.float64(2.0),
+        }
+        serializer = AvroSerializer(schema)
+        # The writer and its buffer are reused between messages
+        first = serializer.serialize(data)
+        self.assertEqual(serializer.serialize(data), first)
+        decoded = serializer.deserialize(first)
+        self.assertEqual(decoded["projection"], data["projection"].tolist())
+        self.assertEqual(decoded["pixels"], data["pixels"].tobytes())
+        self.assertEqual(decoded["roi"], data["roi"].tobytes())
+        self.assertEqual(decoded["gain"], 2.0)
+
+    def test_avro_validates(self):
+        schema = """
+        {
+            "type": "record",
+            "name": "Event",
+            "fields": [
+                {"name": "count", "type": "int"},
+                {"name": "name", "type": "string"},
+                {"name": "values", "type": {"type": "array", "items": "float"}}
+            ]
+        }
+        """
+        serializer = AvroSerializer(schema)
+        valid = {"count": np.int32(3), "name": "a", "values": np.zeros(2)}
+        serializer.serialize(valid)
+        for field, value in [
+            ("count", 1.9),
+            ("count", 2**40),
+            ("name", 5),
+            ("values", "abc"),
+            ("values", np.array(["a"])),
+        ]:
+            with self.subTest(field=field, value=value):
+                with self.assertRaises(AvroTypeException):
+                    serializer.serialize(dict(valid, **{field: value}))
+        with self.assertRaises(AvroTypeException):
+            serializer.serialize(dict(valid, unknown=1))
+
     def test_serialize(self):
         serializer = JsonSerializer()
         data = self.data.copy()
         expected_result = b'{"data": [1.0, 2.0, 3.0], "type": "A_FLOAT", "timestamp": 1645633217.123456, "macropulse": 12345, "miscellaneous": {"key": "value"}, "name": "test"}'
         result = serializer.serialize(data)
         self.assertEqual(result, expected_result)
+
+    def test_binary_roundtrip(self):
+        serializer = BinarySerializer()
+        data = dict(
+            self.data,
+            image=np.arange(24, dtype=">u2").reshape(4, 6)[:, ::2],
+            empty=np.zeros((0, 3)),
+            scalar=np.array(2.5, dtype=np.float32),
+        )
+        message = serializer.serialize(data)
+        self.assertIsInstance(message, bytes)
+        decoded = serializer.deserialize(message)
+        self.assertEqual(set(decoded), set(data))
+        for key in ("data", "image", "empty", "scalar"):
+            np.testing.assert_array_equal(decoded[key], data[key])
+            self.assertEqual(decoded[key].dtype, data[key].dtype)
+            self.assertEqual(decoded[key].shape, data[key].shape)
+        for key in ("type", "timestamp", "macropulse", "miscellaneous", "name"):
+            self.assertEqual(decoded[key], data[key])
+
+    def test_binary_is_compact(self):
+        data = dict(self.data, data=np.random.rand(2048))
+        binary = BinarySerializer().serialize(data)
+        self.assertLess(len(binary), 2048 * 8 + 256)
+        self.assertLess(len(binary), len(JsonSerializer().serialize(data)) / 2)
+
+    def test_binary_rejects_foreign_messages(self):
+        with self.assertRaises(ValueError):
+            BinarySerializer().deserialize(JsonSerializer().serialize(self.data))
+
+    def test_compressed_roundtrip(self):
+        # An odd number of bytes leaves a tail that is not shuffled
+        data = dict(self.data, image=np.arange(1001, dtype=np.uint16) // 7)
+        for codec in ("zlib", "lzma", "bz2"):
+            for filter in (None, "shuffle", "delta", "shuffle+delta"):
+                serializer = CompressedSerializer(
+                    BinarySerializer(), codec=codec, filter=filter, threshold=0
+                )
+                message = serializer.serialize(data)
+                self.assertLess(len(message), data["image"].nbytes)
+                decoded = serializer.deserialize(message)
+                np.testing.assert_array_equal(decoded["image"], data["image"])
+                self.assertEqual(decoded["name"], data["name"])
+
+    def test_compressed_large_items(self):
+        # Items of 320 bytes do not fit into a byte
+        image = np.zeros(10, dtype=[("frame", "<f8", (40,))])
+        image["frame"] = np.arange(400).reshape(10, 40)
+        for typesize in ("auto", 1 << 16):
+            serializer = CompressedSerializer(
+                BinarySerializer(), filter="shuffle", threshold=0, typesize=typesize
+            )
+            decoded = serializer.deserialize(serializer.serialize({"image": image}))
+            self.assertEqual(decoded["image"].tobytes(), image.tobytes())
+
+    def test_compressed_threshold(self):
+        serializer = CompressedSerializer(JsonSerializer(), threshold=1024)
+        raw = JsonSerializer().serialize(self.data)
+        message = serializer.serialize(self.data)
+        self.assertTrue(message.endswith(raw))
+        self.assertEqual(decompress(message), raw)
+
+    def test_compressed_per_output(self):
+        serializer = CompressedSerializer(
+            JsonSerializer(), outputs={1: {"codec": "bz2", "threshold": 0}}
+        )
+        self.assertIs(serializer.for_output(0), serializer)
+        output = serializer.for_output(1)
+        self.assertEqual(output.codec, "bz2")
+        self.assertEqual(output.deserialize(output.serialize({"a": 1})), {"a": 1})
+
+    def test_compressed_invalid_options(self):
+        with self.assertRaises(ValueError):
+            CompressedSerializer(JsonSerializer(), codec="snappy")
+        with self.assertRaises(ValueError):
+            CompressedSerializer(JsonSerializer(), filter="bitshuffle")
@@ -0,0 +1,127 @@
+import logging
+import multiprocessing
+import time
+import unittest
+from ripflow.core.supervisor import RestartPolicy, Supervisor
+from ripflow.core.utils import Child, ZMQFactory
+
+
+class CrashingChild(Child):
+    def __init__(self, lifetime: float = 0.0) -> None:
+        super().__init__(logging.getLogger(__name__), ZMQFactory())
+        self.lifetime = lifetime
+        # Number of runs, counted by the processes themselves
+        self.runs = multiprocessing.Value("i", 0)
+
+    def main_routine(self):
+        with self.runs.get_lock():
+            self.runs.value += 1
+        time.sleep(self.lifetime)
+        raise SystemExit(1)
+
+
+class SlowStartingChild(Child):
+    def __init__(self, startup: float) -> None:
+        super().__init__(logging.getLogger(__name__), ZMQFactory())
+        self.startup = startup
+
+    def main_routine(self):
+        time.sleep(self.startup)
+        self.ready.set()
+        time.sleep(3600)
+
+
+class TestRestartPolicy(unittest.TestCase):
+    def test_backoff(self):
+        policy = RestartPolicy(3, 0.1, 60, backoff=2.0, max_delay=0.3)
+        self.assertEqual([policy.delay(n) for n in range(4)], [0.1, 0.2, 0.3, 0.3])
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = Supervisor(logging.getLogger(__name__))
+
+    def tearDown(self):
+        self.supervisor.stop()
+
+    def restart_count(self, process):
+        return self.supervisor._processes[process]["restart_count"]
+
+    def wait_for_runs(self, child, runs, start):
+        while child.runs.value < runs:
+            self.assertLess(time.monotonic() - start, 5)
+            time.sleep(0.01)
+
+    def test_restarts_with_backoff(self):
+        child = CrashingChild()
+        self.supervisor.add_process(child, RestartPolicy(3, 0.05, 1.5))
+        start = time.monotonic()
+        self.supervisor.start_all_processes()
+        self.supervisor.monitor_processes()
+        # The first run and three restarts, delayed by 0.05, 0.1 and 0.2 s
+        self.wait_for_runs(child, 4, start)
+        self.assertGreaterEqual(time.monotonic() - start, 0.35)
+        # The restart limit is reached, no restart until the window is over
+        time.sleep(max(start + 1.2 - time.monotonic(), 0))
+        self.assertEqual(child.runs.value, 4)
+        self.wait_for_runs(child, 5, start)
+        self.assertGreaterEqual(time.monotonic() - start, 1.5)
+
+    def test_give_up(self):
+        child = CrashingChild()
+        self.supervisor.add_process(child, RestartPolicy(1, 0.05, 0.5, give_up=True))
+        start = time.monotonic()
+        self.supervisor.start_all_processes()
+        self.supervisor.monitor_processes()
+        while child in self.supervisor._processes:
+            self.assertLess(time.monotonic() - start, 5)
+            time.sleep(0.01)
+        # No restart after the window either
+        time.sleep(1.0)
+        self.assertEqual(child.runs.value, 2)
+        self.assertFalse(child.is_alive())
+
+    def test_crash_detected_immediately(self):
+        child = CrashingChild(lifetime=0.2)
+        self.supervisor.add_process(child, RestartPolicy(1, 0.0, 60))
+        self.supervisor.start_all_processes()
+        self.supervisor.monitor_processes()
+        start = time.monotonic()
+        while self.restart_count(child) < 1:
+            self.assertLess(time.monotonic() - start, 5)
+            time.sleep(0.005)
+        # Well below the former polling interval of one second
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_stages_wait_for_ready(self):
+        first = SlowStartingChild(startup=0.2)
+        second = SlowStartingChild(startup=0.0)
+        for child in (first, second):
+            self.supervisor.add_process(child, RestartPolicy(1, 0.0, 60))
+        start = time.monotonic()
+        self.supervisor.start_stages([[first], [second]])
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(first.ready.is_set() and second.ready.is_set())
+
+    def test_stages_do_not_wait_for_crashed(self):
+        child = CrashingChild()
+        self.supervisor.add_process(child, RestartPolicy(1, 0.0, 60))
+        start = time.monotonic()
+        self.supervisor.start_stages([[child]], timeout=10)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_stop_cancels_restart(self):
+        child = CrashingChild()
+        self.supervisor.add_process(child, RestartPolicy(3, 10.0, 60))
+        self.supervisor.start_all_processes()
+        self.supervisor.monitor_processes()
+        time.sleep(0.2)
+        start = time.monotonic()
+        self.supervisor.stop()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(child.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
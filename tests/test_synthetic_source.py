@@ -0,0 +1,52 @@
+import time
+import unittest
+import numpy as np
+from ripflow.connectors.source import SyntheticSourceConnector
+
+
+class TestSyntheticSource(unittest.TestCase):
+    def _collect(self, source, n):
+        source.connect()
+        start = time.monotonic()
+        times, events = [], []
+        for _ in range(n):
+            events.append(source.get_data())
+            times.append(time.monotonic() - start)
+        return np.array(times), events
+
+    def test_rate(self):
+        source = SyntheticSourceConnector(rate=1000, shape=(16, 8), dtype="uint16")
+        times, events = self._collect(source, 300)
+        # The schedule is absolute, sleeping does not add up
+        self.assertAlmostEqual(times[-1], 0.299, delta=0.03)
+        self.assertEqual([e["macropulse"] for e in events], list(range(300)))
+        data = events[0]["data"]
+        self.assertEqual(data.shape, (16, 8))
+        self.assertEqual(data.dtype, np.uint16)
+        self.assertFalse(data.flags.writeable)
+        self.assertEqual(events[0]["type"], "IMAGE")
+
+    def test_scalars(self):
+        source = SyntheticSourceConnector(rate=1e4, n_buffers=4, seed=1)
+        _, events = self._collect(source, 8)
+        values = [e["data"] for e in events]
+        self.assertIsInstance(values[0], float)
+        self.assertEqual(values[:4], values[4:])
+
+    def test_burst(self):
+        source = SyntheticSourceConnector(rate=100, burst=5)
+        times, _ = self._collect(source, 10)
+        self.assertLess(times[4] - times[0], 0.01)
+        self.assertAlmostEqual(times[5] - times[0], 0.05, delta=0.01)
+
+    def test_jitter(self):
+        source = SyntheticSourceConnector(rate=500, jitter=5e-4, seed=0)
+        times, _ = self._collect(source, 200)
+        intervals = np.diff(times)
+        self.assertGreater(np.std(intervals), 1e-4)
+        # The average rate is not affected
+        self.assertAlmostEqual(times[-1], 199 / 500, delta=0.03)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import time
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import TestAnalyzer as Analyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.core.tracing import STAGES, LatencyHistogram
+from ripflow.serializers import JsonSerializer
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for i in range(1, 1001):
+            histogram.record(i * 1e-4)
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.max, 0.1)
+        self.assertAlmostEqual(histogram.summary()["mean"], 0.05005)
+        # Buckets are a factor of 10 ** 0.1 wide
+        self.assertAlmostEqual(histogram.percentile(50), 0.05, delta=0.01)
+        self.assertAlmostEqual(histogram.percentile(99), 0.099, delta=0.02)
+
+    def test_merge(self):
+        a, b = LatencyHistogram(), LatencyHistogram()
+        a.record(1e-3)
+        b.record(2.0)
+        b.record(1e3)
+        a.merge(b)
+        self.assertEqual(a.count, 3)
+        self.assertEqual(a.max, 1e3)
+        self.assertEqual(a.percentile(100), 1e3)
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1347
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(fake_load=0.02),
+            n_workers=2,
+            tracing=True,
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 10000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_latency_stats(self):
+        self.server.event_loop()
+        for _ in range(self.n_events):
+            self.socket.recv()
+        deadline = time.monotonic() + 5
+        stats = self.server.latency_stats()
+        while stats.get("total", {}).get("count", 0) < self.n_events:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.1)
+            stats = self.server.latency_stats()
+        self.assertEqual(list(stats), list(STAGES))
+        for stage in STAGES:
+            self.assertEqual(stats[stage]["count"], self.n_events)
+        self.assertAlmostEqual(stats["analysis"]["p50"], 0.02, delta=0.01)
+        self.assertGreaterEqual(stats["total"]["max"], stats["analysis"]["max"])
+        per_process = self.server.latency_stats(per_process=True)
+        self.assertEqual(list(per_process), ["sender_0"])
+
+    def test_requires_tracing(self):
+        server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(),
+        )
+        with self.assertRaises(RuntimeError):
+            server.latency_stats()
+
+
+if __name__ == "__main__":
+    unittest.main()
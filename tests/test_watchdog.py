@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+import zmq
+import unittest
+from ripflow import Ripflow
+from ripflow.analyzers import TestAnalyzer as Analyzer
+from ripflow.connectors.source import TestSourceConnector as SourceConnector
+from ripflow.connectors.sink import ZMQSinkConnector
+from ripflow.core import WatchdogPolicy
+from ripflow.core.supervisor import RestartPolicy, Supervisor
+from ripflow.core.utils import Child, ZMQFactory
+from ripflow.core.watchdog import Heartbeat
+from ripflow.serializers import JsonSerializer
+
+
+class HangingChild(Child):
+    def __init__(self) -> None:
+        super().__init__(logging.getLogger(__name__), ZMQFactory())
+
+    def main_routine(self):
+        self.heartbeat.enter("analysis", 42)
+        time.sleep(3600)
+
+
+class TestHeartbeat(unittest.TestCase):
+    def test_read(self):
+        heartbeat = Heartbeat()
+        before = time.monotonic()
+        heartbeat.enter("sink", 7)
+        stage, since, event = heartbeat.read()
+        self.assertEqual((stage, event), ("sink", 7))
+        self.assertGreaterEqual(since, before)
+
+    def test_writer_died_halfway(self):
+        heartbeat = Heartbeat()
+        # A process was killed between the two increments of the sequence
+        heartbeat._record[0] += 1
+        heartbeat.enter("idle")
+        self.assertEqual(heartbeat.read()[0], "idle")
+        # A relaunch starts from a consistent record
+        heartbeat.reset()
+        heartbeat.enter("analysis", 5)
+        self.assertEqual(heartbeat._record[0] % 2, 0)
+        self.assertEqual(heartbeat.read()[::2], ("analysis", 5))
+
+    def test_overdue(self):
+        policy = WatchdogPolicy(timeouts={"analysis": 0.05})
+        heartbeat = Heartbeat()
+        heartbeat.enter("analysis", 3)
+        self.assertIsNone(policy.overdue(heartbeat))
+        time.sleep(0.1)
+        stage, elapsed, event = policy.overdue(heartbeat)
+        self.assertEqual((stage, event), ("analysis", 3))
+        self.assertGreater(elapsed, 0.05)
+        # Waiting for input is never overdue
+        heartbeat.enter("idle")
+        self.assertIsNone(policy.overdue(heartbeat))
+
+    def test_unknown_stage(self):
+        with self.assertRaises(ValueError):
+            WatchdogPolicy(timeouts={"idle": 1.0})
+
+
+class TestWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = Supervisor(logging.getLogger(__name__))
+
+    def tearDown(self):
+        self.supervisor.stop()
+
+    def test_kills_hanging_process(self):
+        child = HangingChild()
+        self.supervisor.add_process(
+            child,
+            RestartPolicy(1, 0.0, 60),
+            WatchdogPolicy(timeouts={"analysis": 0.3}, interval=0.1),
+        )
+        self.supervisor.start_all_processes()
+        self.supervisor.monitor_processes()
+        first = child.process.pid
+        deadline = time.monotonic() + 3
+        while self.supervisor._processes[child]["restart_count"] < 1:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        self.assertNotEqual(child.process.pid, first)
+
+
+class TestRecycling(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1351
+        self.n_events = 10
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(),
+            n_workers=1,
+            watchdog=WatchdogPolicy(max_events=4),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 5000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_recycle_after_max_events(self):
+        self.server.event_loop()
+        worker = self.server.workers[0]
+        pids = {worker.process.pid}
+        received = []
+        while len(received) < self.n_events:
+            try:
+                received.append(self.socket.recv())
+            except zmq.Again:
+                break
+            pids.add(worker.process.pid)
+        self.assertEqual(len(received), self.n_events)
+        self.assertGreaterEqual(len(pids), 2)
+        # Recycling does not count as a restart
+        self.assertEqual(self.server.supervisor._processes[worker]["restart_count"], 0)
+
+
+class TestRecyclingUnderLoad(unittest.TestCase):
+    def setUp(self):
+        self.sink_socket = 1356
+        self.n_events = 30
+        self.test_sequence = [
+            {
+                "data": float(i),
+                "type": "FLOAT",
+                "timestamp": time.time() + i,
+                "macropulse": i,
+                "miscellaneous": {},
+                "name": "test",
+            }
+            for i in range(self.n_events)
+        ]
+        # The workers fall behind the source, events queue up in front of them
+        self.server = Ripflow(
+            source_connector=SourceConnector(self.test_sequence),
+            sink_connector=ZMQSinkConnector(
+                port=self.sink_socket, serializer=JsonSerializer()
+            ),
+            analyzer=Analyzer(fake_load=0.15),
+            n_workers=2,
+            watchdog=WatchdogPolicy(max_events=5),
+        )
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.connect(f"tcp://127.0.0.1:{self.sink_socket}")
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.setsockopt(zmq.RCVTIMEO, 5000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.socket.close()
+        self.context.term()
+
+    def test_no_events_lost(self):
+        self.server.event_loop()
+        pids = set()
+        received = set()
+        while len(received) < self.n_events:
+            try:
+                msg = json.loads(self.socket.recv())
+            except zmq.Again:
+                break
+            received.add(msg["macropulse"])
+            pids.update(worker.process.pid for worker in self.server.workers)
+        self.assertEqual(received, set(range(self.n_events)))
+        self.assertGreater(len(pids), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()